@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+# Copyright (c) 2021, Hyve Design Solutions Corporation.
+# All rights reserved.
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are 
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright 
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright 
+#    notice, this list of conditions and the following disclaimer in the 
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of Hyve Design Solutions Corporation nor the names 
+#    of its contributors may be used to endorse or promote products 
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY HYVE DESIGN SOLUTIONS CORPORATION AND 
+# CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, 
+# BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND 
+# FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL 
+# HYVE DESIGN SOLUTIONS CORPORATION OR CONTRIBUTORS BE LIABLE FOR ANY 
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL 
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS 
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) 
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, 
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING 
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+#
+import sys, os, json, time, platform
+from optparse import OptionParser
+from pyipmi.intf import Intf
+from pyipmi.intf._crypto import *
+from pyipmi.intf._rmcpp_msg import IPMI20_Message
+from pyipmi.mesg.ipmi_app import GetDeviceID
+from pyipmi.mesg.ipmi_se import GetSensorReading
+from pyipmi.sim import BMCSim
+from pyipmi.util import checksum
+from pyipmi.cmds import PY_CMDS
+from pyipmi.intf.replay import Replay_Intf
+from pyipmi.cmds._common import load_sdr_repo, get_sdr_repository, _conv_sensor_reading
+from pyipmi.cmds._sel import get_sel_entries, print_sel_list
+
+# Offline microbenchmarks of the codec, crypto and decoding hot paths
+# The results are in microseconds per operation, the best of the repeats.
+# The timings only compare on the same machine, so no baseline is shipped.
+# --save_baseline writes the one of this machine to micro_baseline.json, which
+# --compare compares with later.
+MICRO_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'micro_baseline.json')
+
+class _LoopIntf(Intf):
+    # Issue the commands to the simulated BMC in process, without the network
+    def __init__(self, bmc):
+        self.bmc = bmc
+
+    def issue_cmd(self, cmd_cls, *args):
+        cmd = cmd_cls(*args)
+        cc, rsp_data = self.bmc.handle(cmd.netfn, cmd.cmd, cmd.req_data or b'')
+        return cmd.unpack([cmd.netfn + 1, cmd.cmd, cc, rsp_data])
+
+class _NullCmds:
+    def __init__(self, intf):
+        self.intf = intf
+
+    def print(self, *objects, sep=' ', end='\n', flush=False):
+        pass
+
+    def print_rsp(self, rsp):
+        pass
+
+def _new_session(sim, cipher):
+    # A session of the simulator and the messages of the client sharing the keys
+    sess = sim._new_session()
+    sess.cipher = RMCPP_CIPHERS[cipher]
+    sess.passwd = b'admin123'.ljust(20, b'\0')
+    sess.k1 = os.urandom(20)
+    sess.k2 = os.urandom(20)
+    sess.active = True
+    sess.rcsid = b'\x11\x22\x33\x44'
+    return sess
+
+def case_ipmi20(sim, cipher):
+    sess = _new_session(sim, cipher)
+    cmd = GetDeviceID()
+    _, rsp_data = sim.bmc.handle(cmd.netfn, cmd.cmd, b'')
+    req = (0x20, cmd.netfn, 0, 0x81, 1 << 2, cmd.cmd, b'')
+    rsp = sim._pack_rmcpp(sess, 0, sim._pack_lan_payload(req, 0, rsp_data))
+
+    def pack():
+        msg = IPMI20_Message(sess.cipher, 1, sess.sid, sess.passwd, sess.k1, sess.k2, 1)
+        msg.pack(cmd)
+
+    def unpack():
+        msg = IPMI20_Message(sess.cipher, 1, sess.sid, sess.passwd, sess.k1, sess.k2, 1)
+        cmd.unpack(msg.unpack(rsp))
+
+    return pack, unpack
+
+def gen_cases(num_sensors, num_sel):
+    sim = BMCSim({'num_sensors': num_sensors, 'num_sel': num_sel})
+    cases = []
+
+    # IPMI v2.0 message codec of every cipher suite
+    for cipher in sorted(RMCPP_CIPHERS.keys()):
+        pack, unpack = case_ipmi20(sim, cipher)
+        cases.append(('ipmi20_pack_c{0}'.format(cipher), pack))
+        cases.append(('ipmi20_unpack_c{0}'.format(cipher), unpack))
+
+    # Crypto
+    key = os.urandom(20)
+    data = os.urandom(64)
+    for name, algo in (('hmac_sha1_96', HMAC_SHA1_96), ('hmac_md5_128', HMAC_MD5_128),
+                       ('md5_128', MD5_128), ('hmac_sha256_128', HMAC_SHA256_128)):
+        cases.append(('inte_check_' + name, lambda algo=algo: cal_inte_check(algo, key, data)))
+
+    enc = encrypt_aes_128_cbc(key, data)
+    cases.append(('aes_128_cbc_encrypt', lambda: encrypt_aes_128_cbc(key, data)))
+    cases.append(('aes_128_cbc_decrypt', lambda: decrypt_aes_128_cbc(key, enc)))
+    cases.append(('checksum', lambda: checksum(data)))
+
+    # SDR decoding
+    cmds = _NullCmds(_LoopIntf(sim.bmc))
+    repo = get_sdr_repository(cmds)
+    def load_sdr():
+        repo.clear()
+        load_sdr_repo(cmds)
+    cases.append(('load_sdr_repo_{0}'.format(num_sensors), load_sdr))
+
+    # Sensor reading conversion of all the full sensors
+    load_sdr()
+    readings = []
+    for sdr1 in repo.sdrs[1]:
+        readings.append((cmds.intf.issue_cmd(GetSensorReading, sdr1[2]), sdr1))
+    def conv_readings():
+        for t1, sdr1 in readings:
+            _conv_sensor_reading(t1, 1, sdr1)
+    cases.append(('conv_sensor_reading_{0}'.format(len(readings)), conv_readings))
+
+    # SEL formatting
+    sel_all = list(get_sel_entries(cmds))
+    for opt in (1, 2, 3):
+        cases.append(('print_sel_list{0}_{1}'.format(opt, num_sel), 
+                      lambda opt=opt: print_sel_list(cmds, sel_all, opt, repo.sensor_map)))
+
+    return cases
+
+def gen_replay_cases(path, commands):
+    # The decoding and formatting of the commands served from a recording
+    cmds = _NullCmds(Replay_Intf(path, 0))
+    cases = []
+    for c in commands:
+        args = c.split()
+
+        def run(args=args):
+            # Decode the SDR repository every time, as the first run does
+            get_sdr_repository(cmds).clear()
+            PY_CMDS[args[0]](cmds, args[1:])
+        cases.append(('replay_' + '_'.join(args), run))
+
+    return cases
+
+def run_case(func, repeat, min_time):
+    # Find the loop count taking at least min_time, then take the best of the repeats
+    loops = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(loops):  func()
+        t = time.perf_counter() - t0
+        if t >= min_time:  break
+        loops = loops * 10 if t == 0 else max(loops * 2, int(loops * min_time / t) + 1)
+
+    best = t
+    for _ in range(repeat - 1):
+        t0 = time.perf_counter()
+        for _ in range(loops):  func()
+        best = min(best, time.perf_counter() - t0)
+
+    return (best / loops * 1e6, loops)
+
+def compare(results, baseline, tolerance, name_filter=''):
+    # Return the names of the cases slower than the baseline by the tolerance
+    regressions = []
+    print('\n{0:32} {1:>12} {2:>12} {3:>8}'.format('Case', 'Baseline', 'Current', 'Change'))
+    for name, base in baseline['results'].items():
+        if name_filter not in name:  continue
+        cur = results['results'].get(name, None)
+        if cur is None:
+            print('{0:32} {1:>12.3f} {2:>12} {3:>8}'.format(name, base['us'], 'missing', ''))
+            continue
+
+        change = (cur['us'] / base['us'] - 1) * 100 if base['us'] else 0
+        flag = ''
+        if change > tolerance:
+            regressions.append(name)
+            flag = '  << REGRESSION'
+        print('{0:32} {1:>12.3f} {2:>12.3f} {3:>+7.1f}%{4}'.format(
+              name, base['us'], cur['us'], change, flag))
+
+    return regressions
+
+if __name__ == '__main__':
+    parser = OptionParser()
+    parser.add_option('-o', '--output', dest='output', default='micro_results.json',
+              help='JSON file to write the results to.  The default is micro_results.json.')
+    parser.add_option('-b', '--baseline', dest='baseline', default=None,
+              help='JSON file of the baseline results to compare with.')
+    parser.add_option('-C', '--compare', action='store_true', dest='compare',
+              help='''Compare with the baseline of this machine saved by --save_baseline, or the 
+one given by -b.  Exit with 1 if any case regressed.''')
+    parser.add_option('-S', '--save_baseline', action='store_true', dest='save_baseline',
+              help='Also write the results as the baseline of this machine.')
+    parser.add_option('-t', '--tolerance', dest='tolerance', type='float', default=20,
+              help='Percentage slower than the baseline counted as a regression.  The default is 20.')
+    parser.add_option('-r', '--repeat', dest='repeat', type='int', default=5,
+              help='Number of the repeats of each case.  The default is 5.')
+    parser.add_option('-m', '--min_time', dest='min_time', type='float', default=0.05,
+              help='Minimum seconds of each repeat.  The default is 0.05.')
+    parser.add_option('-k', '--filter', dest='filter', default='',
+              help='Only run the cases whose names contain this string.')
+    parser.add_option('-n', '--num_sensors', dest='num_sensors', type='int', default=40,
+              help='Number of the sensors in the SDR repository.  The default is 40.')
+    parser.add_option('-e', '--num_sel', dest='num_sel', type='int', default=100,
+              help='Number of the SEL entries.  The default is 100.')
+    parser.add_option('-R', '--replay', dest='replay', default=None,
+              help='''File recorded by pyipmi --record.  Add the cases of the commands replayed 
+from it.''')
+    parser.add_option('-c', '--commands', dest='commands', default='sdr list;sel list;fru print',
+              help='''Commands replayed, separated by semicolons.  The default is 
+"sdr list;sel list;fru print".''')
+    options, _ = parser.parse_args()
+
+    results = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'node': platform.node(),
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'results': {},
+    }
+
+    cases = gen_cases(options.num_sensors, options.num_sel)
+    if options.replay:
+        cases += gen_replay_cases(options.replay, options.commands.split(';'))
+
+    for name, func in cases:
+        if options.filter not in name:  continue
+        us, loops = run_case(func, options.repeat, options.min_time)
+        results['results'][name] = {'us': us, 'loops': loops}
+        print('{0:32} {1:>12.3f} us'.format(name, us))
+
+    with open(options.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    if options.save_baseline:
+        with open(MICRO_BASELINE, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if options.compare and not options.baseline:
+        if not os.path.isfile(MICRO_BASELINE):
+            print('\nNo baseline of this machine.  Run with --save_baseline first.')
+            sys.exit(2)
+        options.baseline = MICRO_BASELINE
+
+    if options.baseline:
+        with open(options.baseline, 'r') as f:
+            baseline = json.load(f)
+
+        for key in ('node', 'machine', 'python'):
+            if baseline.get(key, None) != results[key]:
+                print('\nWarning: the baseline is of {0} {1}, not {2}.  The timings may not compare.'
+                      .format(key, baseline.get(key, None), results[key]))
+
+        regressions = compare(results, baseline, options.tolerance, options.filter)
+        if regressions:
+            print('\n{0} case(s) regressed by more than {1}%: {2}'.format(
+                  len(regressions), options.tolerance, ', '.join(regressions)))
+            sys.exit(1)
+
+        print('\nNo regressions.')
@@ -59,24 +59,31 @@ setuptools.setup(
     packages=[
         'pyipmi',
         'pyipmi.cmds',
+        'pyipmi.fleet',
         'pyipmi.intf',
         'pyipmi.intf.ioctl',
         'pyipmi.mesg',
+        'pyipmi.sim',
         'pyipmi.util',
     ],
     package_dir={
         'pyipmi': 'src/pyipmi',
         'pyipmi.cmds': 'src/pyipmi/cmds',
+        'pyipmi.fleet': 'src/pyipmi/fleet',
         'pyipmi.intf': 'src/pyipmi/intf',
         'pyipmi.intf.ioctl': 'src/pyipmi/intf/ioctl',
         'pyipmi.mesg': 'src/pyipmi/mesg',
+        'pyipmi.sim': 'src/pyipmi/sim',
         'pyipmi.util': 'src/pyipmi/util',
     },
     scripts=[
+        'pybroker',
         'pyipmi',
+        'pyipmi-load',
         'pyipmr',
         'pyping',
         'pysh',
+        'pysim',
     ],
 )
 
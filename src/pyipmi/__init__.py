@@ -32,8 +32,10 @@
 #
 __all__ = [
     'cmds',
+    'fleet',
     'intf',
     'mesg',
+    'sim',
     'util',
 ]
 
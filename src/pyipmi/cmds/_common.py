@@ -30,17 +30,31 @@
 # IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
 # POSSIBILITY OF SUCH DAMAGE.
 #
-import time, sys, builtins
-from collections import defaultdict
+import time, sys, builtins, threading, hashlib, weakref
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping
 from . _consts import *
 from .. mesg.ipmi_se import *
 from .. mesg.ipmi_storage import GetSDRRepoInfo, GetSDR, RevSDR
-from .. util.exception import PyExcept, PyCmdsExcept
+from .. util.exception import PyExcept, PyCmdsExcept, PyMesgCCExcept
+from . _sdr_cache import get_sdr_cache_path, read_sdr_cache, write_sdr_cache
 
-g_add_ts = 0
-g_erase_ts = 0
-g_sdr_repo = defaultdict(list)
-g_sensor_map = {}
+# The GetSDR read sizes tried from the largest.  0xff reads the entire record.
+SDR_READ_SIZES = (0xff, 64, 48, 32, 16)
+
+# Times to reserve the SDR repository again for a record if cancelled
+SDR_RESV_RETRIES = 3
+
+# Guard the creation of the SDR repository objects of the interfaces, and the
+# tables shared among them
+_repo_lock = threading.Lock()
+
+# The decoded SDR tables by the digest of the records.  The repositories of the
+# same content share one table, which lives as long as any of them uses it.
+# The BMCs of one model share it only if all their records are the same, as 
+# the thresholds, names or OEM records may differ per BMC.
+_sdr_tables = weakref.WeakValueDictionary()
 
 conv_time = lambda ts: time.asctime(time.localtime(ts))
 
@@ -339,116 +353,317 @@ def _conv_threshold_values(sdr1, opt=0, argv=None):
 
     return thres
 
-def get_one_sdr(self, resv_id, next_id):
+def _next_sdr_read_size(size):
+    # The next smaller read size to try, or 0 if none
+    for x in SDR_READ_SIZES:
+        if x < size:  return x
+    return 0
+
+def get_one_sdr(self, resv_id, next_id, sdr1=None):
     # Get SDR: Resv ID (2) | Rec ID (2) | offset (1) | bytes_to_read (1)
-    # First, read the first 5 bytes, sensor record header
-    offset = 0
-    b2read = 5
-    sdr1 = self.intf.issue_cmd(GetSDR, resv_id, next_id, offset, b2read)
-
-    # Then, read the following bytes.  Each time read 32 bytes at most
-    offset = 5
-    b2read = sdr1[6]
-    while b2read > 0:
-        if b2read > 32:
-            to_read = 32
-            b2read -= 32
+    # sdr1: the response of the bytes read already from the offset 0, if any
+    repo = get_sdr_repository(self)
+    if repo.read_size == 0:  repo.read_size = SDR_READ_SIZES[0]
+
+    if sdr1 is None and repo.read_size == 0xff:
+        # Read the header and the body at once
+        try:
+            sdr1 = self.intf.issue_cmd(GetSDR, resv_id, next_id, 0, 0xff)
+        except PyMesgCCExcept as e:
+            if e.cc not in (0xca, 0xff):  raise
+            repo.read_size = _next_sdr_read_size(0xff)
+
+    if sdr1 is None or len(sdr1) < 7:
+        # Read the first 5 bytes, sensor record header
+        sdr1 = self.intf.issue_cmd(GetSDR, resv_id, next_id, 0, 5)
+
+    # Then, read the rest of the record in chunks of the read size at most
+    # Fall back to the smaller sizes if the BMC cannot return that many
+    while True:
+        offset = len(sdr1) - 2
+        b2read = 5 + sdr1[6] - offset
+        reqs = []
+        while b2read > 0:
+            to_read = min(b2read, repo.read_size)
+            reqs.append((GetSDR, (resv_id, next_id, offset, to_read)))
+            offset += to_read
+            b2read -= to_read
+
+        if len(reqs) > 1 and getattr(self.intf, 'window', 1) > 1:
+            # The offsets are known, so read all the chunks in the pipelined mode
+            rsps = self.intf.issue_batch(reqs)
+        else:
+            rsps = []
+            for cmd_cls, args in reqs:
+                try:
+                    rsps.append(self.intf.issue_cmd(cmd_cls, *args))
+                except PyMesgCCExcept as e:
+                    rsps.append(e)
+                    break
+
+        data = sdr1
+        for rsp1 in rsps:
+            if isinstance(rsp1, PyMesgCCExcept) and rsp1.cc in (0xca, 0xff):
+                size = _next_sdr_read_size(repo.read_size)
+                if size:
+                    repo.read_size = size
+                    data = None
+                    break
+            if isinstance(rsp1, Exception): raise rsp1
+            data += rsp1[2:]
+
+        if data is not None:  return data
+
+def _conv_sensor_entry(rec_type, idx, sdr2):
+    # The sensor map entry of a sensor record without the header
+    # idx: the index of the record in the SdrTable
+    sensor_name = _conv_sensor_name(rec_type, sdr2)
+
+    entity_str, entity_name, units, sensor_type = '', '', '', ''
+    thres = ['na'] * 11
+    mask_r, mask_s, asserts, deasserts = [], [], [], []
+    mask = sdr2[13] & 0x3f
+
+    if rec_type in (1, 2):
+        event_reading_type = sdr2[8]
+        entity_str, entity_name = _conv_entity(sdr2)
+        units = _conv_units(sdr2)
+        sensor_type = _conv_sensor_type_and_er(sdr2)
+        asserts = _conv_event_mask(sdr2, 0)
+        deasserts = _conv_event_mask(sdr2, 1)
+
+        if event_reading_type == 1:
+            mask_r = _conv_threshold(sdr2, mask, 1)
+            mask_s = _conv_threshold(sdr2, sdr2[14] & 0x3f, 1)
+
+            if rec_type == 1:
+                thres = _conv_threshold_values(sdr2)
         else:
-            to_read = b2read
-            b2read = 0
-        rsp1 = self.intf.issue_cmd(GetSDR, resv_id, next_id, offset, to_read)
-        sdr1 += rsp1[2:]
-        offset += to_read
+            mask_r = _conv_discrete(sdr2, ((sdr2[14] & 0x7f) << 8) + sdr2[13], 1)
+
+    return (sensor_name, rec_type, idx, entity_str, entity_name, units, thres, 
+            mask_r, mask_s, sensor_type, asserts, deasserts)
+
+class SdrTable:
+    # The records of an SDR repository.  Shared by the repositories of the 
+    # same content, so never modified once built.
+    # The records are kept in one buffer, and the fields looked up often in
+    # the typed arrays.  The strings are converted on demand.
+    def __init__(self, recs):
+        self.count = len(recs)
+        self.buf = b''.join(recs)
+        self.offsets = array('L', [0])  # the offsets of the records in the buffer, and the end
+        self.rec_type = array('B')
+        self.sensor_num = array('H')    # (LUN << 8) + number, 0xffff if not a sensor record
+        self.sensor_type = array('B')
+        self.entity = array('H')        # (entity ID << 8) + instance
+
+        pos = 0
+        for rec in recs:
+            pos += len(rec)
+            self.offsets.append(pos)
+
+            rec_type = rec[3]
+            self.rec_type.append(rec_type)
+            if rec_type in (1, 2, 3):
+                self.sensor_num.append(((rec[6] & 3) << 8) + rec[7])
+                self.sensor_type.append(rec[10] if rec_type == 3 else rec[12])
+                self.entity.append((rec[8] << 8) + (rec[9] & 0x7f))
+            else:
+                self.sensor_num.append(0xffff)
+                self.sensor_type.append(0)
+                self.entity.append(0)
+
+        # The index by sensor number: the indexes of the sensor records sorted
+        # by the sensor numbers, in the repository order for the same number
+        idx = sorted((i for i in range(self.count) if self.sensor_num[i] != 0xffff),
+                     key=lambda i: self.sensor_num[i])
+        self.sensor_idx = array('H', idx)
+        self.sensor_keys = array('H', (self.sensor_num[i] for i in idx))
+
+    @property
+    def recs(self):
+        # The records with the headers in the repository order
+        return [self.get_rec(i) for i in range(self.count)]
+
+    def get_rec(self, i):
+        return self.buf[self.offsets[i]:self.offsets[i+1]]
+
+    def get_sdr(self, i):
+        # The record without the header
+        return self.buf[self.offsets[i]+5:self.offsets[i+1]]
+
+    def get_sensor_recs(self, sensor_num):
+        # The indexes of the records of the sensor number
+        i = bisect_left(self.sensor_keys, sensor_num)
+        ret = []
+        while i < len(self.sensor_keys) and self.sensor_keys[i] == sensor_num:
+            ret.append(self.sensor_idx[i])
+            i += 1
 
-    return sdr1
+        return ret
 
-def load_sdr_repo(self):
+class SdrView:
+    # record type => [the records without the headers], built on demand
+    def __init__(self, table):
+        self.table = table
+
+    def __len__(self):
+        return self.table.count
+
+    def __getitem__(self, rec_type):
+        table = self.table
+        return [table.get_sdr(i) for i in range(table.count) if table.rec_type[i] == rec_type]
+
+class SensorMap(Mapping):
+    # sensor number => [(sensor name, record type, index, ...)], built on demand
+    def __init__(self, table):
+        self.table = table
+
+    def __len__(self):
+        return len(set(self.table.sensor_keys))
+
+    def __iter__(self):
+        return iter(dict.fromkeys(self.table.sensor_keys))
+
+    def __contains__(self, sensor_num):
+        return len(self.table.get_sensor_recs(sensor_num)) > 0
+
+    def __getitem__(self, sensor_num):
+        table = self.table
+        ret = [_conv_sensor_entry(table.rec_type[i], i, table.get_sdr(i)) 
+               for i in table.get_sensor_recs(sensor_num)]
+        if not ret:  raise KeyError(sensor_num)
+        return ret
+
+    def get_name(self, sensor_num, default=None):
+        # Only the name of the first record of the sensor
+        table = self.table
+        recs = table.get_sensor_recs(sensor_num)
+        if not recs:  return default
+        return _conv_sensor_name(table.rec_type[recs[0]], table.get_sdr(recs[0]))
+
+def get_sdr_table(recs):
+    # The table of the records, built only if no repository has the same ones
+    # The records carry their lengths in the headers, so the joined bytes 
+    # identify them.
+    key = hashlib.sha1(b''.join(recs)).digest()
+    with _repo_lock:
+        table = _sdr_tables.get(key, None)
+    if table is not None:  return table
+
+    table = SdrTable(recs)
+    with _repo_lock:
+        return _sdr_tables.setdefault(key, table)
+
+class SdrRepository:
+    # The SDR repository of a BMC and the sensor map decoded from it
+    # Each interface keeps its own, see get_sdr_repository().
+    def __init__(self):
+        self.lock = threading.Lock()    # held while loading
+        self.read_size = 0      # the largest GetSDR read size accepted, 0 if not probed
+        self.clear()
+
+    def clear(self):
+        self.add_ts = 0
+        self.erase_ts = 0
+        self.table = SdrTable(())       # the SdrTable shared, empty if not loaded
+        self.sdrs = SdrView(self.table)
+        self.sensor_map = SensorMap(self.table)
+
+    def decode(self, recs, add_ts, erase_ts):
+        # Switch to the table of the records.  The readers of the previous one
+        # are not disturbed by the reloading.
+        table = get_sdr_table(recs)
+
+        self.add_ts = add_ts
+        self.erase_ts = erase_ts
+        self.table = table
+        self.sdrs = SdrView(table)
+        self.sensor_map = SensorMap(table)
+
+def get_sdr_repository(self):
+    # The SDR repository kept by the interface
+    intf = self.intf
+    if getattr(intf, 'sdr_repo', None) is None:
+        with _repo_lock:
+            if getattr(intf, 'sdr_repo', None) is None:
+                intf.sdr_repo = SdrRepository()
+
+    return intf.sdr_repo
+
+def walk_sdr_repo(self, rec, cached=None):
+    # Yield the records of the SDR repository with their 5-byte headers
+    # One reservation serves the whole walk.  Reserve again and resume from 
+    # the same record only if the BMC cancels it.
+    # cached: {rec ID: record} known.  Only the headers are read for them, and
+    # the rest only if the version, type or length differs.  Not worth it if
+    # the BMC returns a whole record in one read.
     next_id = b'\0'
     sdr_count = 0
 
-    def load_one_sdr():
-        nonlocal next_id, sdr_count
-
-        resv_id, = self.intf.issue_cmd(RevSDR)
-        sdr1 = get_one_sdr(self, resv_id, next_id)
-        next_id = sdr1[:2]
-        rec_type = sdr1[5]
-        g_sdr_repo[rec_type].append(sdr1[7:])
-        sdr_count += 1
+    resv_id, = self.intf.issue_cmd(RevSDR)
+    while next_id != b'\xff\xff':
+        if sdr_count > rec: break   # already got more SDRs than the total # 
 
-        # Handle sensor map
-        if rec_type in (1, 2, 3):
-            sdr2 = sdr1[7:]
-            sensor_lun = sdr2[1] & 3                         # Sensor owner LUN
-            sensor_num = (sensor_lun << 8) + sdr2[2]         # Sensor number
-            sensor_name = _conv_sensor_name(rec_type, sdr2)  # Sensor name
-
-            entity_str, entity_name, units, sensor_type = '', '', '', ''
-            thres = ['na'] * 11
-            mask_r, mask_s, asserts, deasserts = [], [], [], []
-            mask = sdr2[13] & 0x3f
-
-            if rec_type in (1, 2):
-                event_reading_type = sdr2[8]
-                entity_str, entity_name = _conv_entity(sdr2)
-                units = _conv_units(sdr2)
-                sensor_type = _conv_sensor_type_and_er(sdr2)
-                asserts = _conv_event_mask(sdr2, 0)
-                deasserts = _conv_event_mask(sdr2, 1)
-
-                if event_reading_type == 1:
-                    mask_r = _conv_threshold(sdr2, mask, 1)
-                    mask_s = _conv_threshold(sdr2, sdr2[14] & 0x3f, 1)
-
-                    if rec_type == 1:
-                        thres = _conv_threshold_values(sdr2)
+        retries = 0
+        while True:
+            try:
+                if cached and get_sdr_repository(self).read_size != 0xff:
+                    sdr1 = self.intf.issue_cmd(GetSDR, resv_id, next_id, 0, 5)
+                    rec1 = cached.get(sdr1[2:4], None)
+                    if rec1 is not None and rec1[:5] == sdr1[2:7]:
+                        sdr1 = sdr1[:2] + rec1
+                    else:
+                        sdr1 = get_one_sdr(self, resv_id, next_id, sdr1)
                 else:
-                    mask_r = _conv_discrete(sdr2, ((sdr2[14] & 0x7f) << 8) + sdr2[13], 1)
+                    sdr1 = get_one_sdr(self, resv_id, next_id)
+                break
+            except PyMesgCCExcept as e:
+                if e.cc != 0xc5 or retries >= SDR_RESV_RETRIES:  raise
+                retries += 1
+                resv_id, = self.intf.issue_cmd(RevSDR)
 
-            val = (sensor_name, rec_type, len(g_sdr_repo[rec_type]) - 1, 
-                    entity_str, entity_name, units, thres, mask_r, mask_s,
-                    sensor_type, asserts, deasserts)
-
-            if not g_sensor_map.get(sensor_num, []):
-                g_sensor_map[sensor_num] = [val]
-            else:
-                g_sensor_map[sensor_num].append(val)
+        next_id = sdr1[:2]
+        sdr_count += 1
+        yield sdr1[2:]
 
-    global g_add_ts, g_erase_ts, g_sensor_map
-    _, rec, _, add_ts, erase_ts, _ = self.intf.issue_cmd(GetSDRRepoInfo)
-    if rec == 0:  
-        raise PyCmdsExcept('SDR repository is empty.', -1)
+def load_sdr_repo(self):
+    repo = get_sdr_repository(self)
+    with repo.lock:
+        _, rec, _, add_ts, erase_ts, _ = self.intf.issue_cmd(GetSDRRepoInfo)
+        if rec == 0:  
+            raise PyCmdsExcept('SDR repository is empty.', -1)
 
-    if g_sdr_repo:
-        if add_ts == g_add_ts and erase_ts == g_erase_ts:
+        if repo.table.count and add_ts == repo.add_ts and erase_ts == repo.erase_ts:
             # no change on the SDR repository
             return False
-        else:
-            # SDR has changes and it's not empty
-            # clear the previous SDRs before getting the new ones
-            g_sdr_repo.clear()
-            g_sensor_map.clear()
 
-    #self.print('Loading {0} SDRs...\n'.format(rec))
+        # The records known, loaded before or in the disk cache
+        # A fresh process loads the SDRs from the disk cache if up to date
+        ts, recs = (repo.add_ts, repo.erase_ts), repo.table.recs
+        path = get_sdr_cache_path(self)
+        if not recs and path:
+            cached = read_sdr_cache(path)
+            if cached:  ts, recs = cached[:2], cached[2]
 
-    load_one_sdr()
-    while next_id != b'\xff\xff':
-        if sdr_count > rec: break   # already got more SDRs than the total # 
-        load_one_sdr()
+        if ts != (add_ts, erase_ts) or not recs:
+            # SDR has changes.  Only get the records new or changed.
+            #self.print('Loading {0} SDRs...\n'.format(rec))
+            recs = list(walk_sdr_repo(self, rec, {x[:2]: x for x in recs}))
+            if path:  write_sdr_cache(path, add_ts, erase_ts, recs)
 
-    g_add_ts = add_ts
-    g_erase_ts = erase_ts
-    g_sensor_map = dict(sorted(g_sensor_map.items()))
+        repo.decode(recs, add_ts, erase_ts)
 
     return True
 
 def get_sdr_repo(self):
     load_sdr_repo(self)
-    return g_sdr_repo
+    return get_sdr_repository(self).sdrs
 
 def get_sensor_map(self):
     load_sdr_repo(self)
-    return g_sensor_map    
+    return get_sdr_repository(self).sensor_map    
 
 def get_threshold_status(comp, opt=1):
     ret = 'ok'
@@ -461,37 +676,79 @@ def get_threshold_status(comp, opt=1):
 
     return ret
 
+def _prefetch_sensor_cmds(self, table, keys, opt, filter_sdr, filter_sensor_type, ext):
+    # Issue the per-sensor commands of get_sensor_readings() in the pipelined
+    # mode if the interface supports it.  Return {(cmd_cls, sensor_num): rsp}
+    if getattr(self.intf, 'window', 1) < 2:  return {}
+
+    reqs = []
+    for sensor_num in keys:
+        for idx in table.get_sensor_recs(sensor_num):
+            sdr_type = table.rec_type[idx]
+            if sdr_type == 3:  continue
+            if filter_sdr != 0 and filter_sdr != sdr_type:  continue
+            if filter_sensor_type != 0 and filter_sensor_type != table.sensor_type[idx]:  continue
+
+            reqs.append((GetSensorReading, (sensor_num,)))
+            if opt in (3, 4) and ext and table.get_sdr(idx)[8] == 1 and sdr_type == 1:
+                reqs.append((GetSensorThres, (sensor_num,)))
+                if opt == 4:
+                    reqs.append((GetSensorHys, (sensor_num,)))
+
+    reqs = list(dict.fromkeys(reqs))    # remove the duplicated ones
+    rsps = self.intf.issue_batch(reqs)
+
+    return {(cmd_cls, args[0]): rsp for (cmd_cls, args), rsp in zip(reqs, rsps)}
+
+def _issue_sensor_cmd(self, prefetched, cmd_cls, sensor_num):
+    rsp = prefetched.get((cmd_cls, sensor_num), None)
+    if rsp is None:
+        return self.intf.issue_cmd(cmd_cls, sensor_num)
+
+    if isinstance(rsp, Exception): raise rsp
+    return rsp
+
 def get_sensor_readings(self, opt=1, filter_sdr=0, filter_sensor_type=0, ext=False,
                         filter_sensor_num=-1):
     load_sdr_repo(self)
-    keys = g_sensor_map.keys()
+    repo = get_sdr_repository(self)
+    table = repo.table
+    keys = repo.sensor_map.keys()
     if filter_sensor_num != -1:
         if not filter_sensor_num in keys:
             raise PyCmdsExcept('Sensor number: {0:02X}h was not found.'.format(
                                filter_sensor_num), -1)
         keys = (filter_sensor_num,)
 
-    for sensor_num in keys:
-        for rec in g_sensor_map[sensor_num]:
-            (sensor_name, sdr_type, idx, entity_str, entity_name, units, 
-             thres, mask_r, mask_s, sensor_type, asserts, deasserts) = rec
+    prefetched = _prefetch_sensor_cmds(self, table, keys, opt, filter_sdr, filter_sensor_type, ext)
 
+    for sensor_num in keys:
+        for idx in table.get_sensor_recs(sensor_num):
+            sdr_type = table.rec_type[idx]
             if sdr_type == 3:   continue    # Do not handle Event-Only SDRs here
 
-            sdr1 = g_sdr_repo[sdr_type][idx]
-            event_reading_type = sdr1[8]
-
             # filter SDR type
             if filter_sdr != 0 and filter_sdr != sdr_type:
                 continue
 
             # filter sensor type
-            if filter_sensor_type != 0 and filter_sensor_type != sdr1[7]:
+            if filter_sensor_type != 0 and filter_sensor_type != table.sensor_type[idx]:
                 continue
 
+            # The strings of the sdr list are only the name and entity
+            sdr1 = table.get_sdr(idx)
+            event_reading_type = sdr1[8]
+            if opt in (1, 2):
+                sensor_name = _conv_sensor_name(sdr_type, sdr1)
+                entity_str, _ = _conv_entity(sdr1)
+            else:
+                (sensor_name, _, _, entity_str, entity_name, units, 
+                 thres, mask_r, mask_s, sensor_type, asserts, deasserts) = \
+                    _conv_sensor_entry(sdr_type, idx, sdr1)
+
             # IPMI: Get sensor reading 
             try:
-                t1 = self.intf.issue_cmd(GetSensorReading, sensor_num)
+                t1 = _issue_sensor_cmd(self, prefetched, GetSensorReading, sensor_num)
             except:
                 t1 = None
 
@@ -537,7 +794,7 @@ def get_sensor_readings(self, opt=1, filter_sdr=0, filter_sensor_type=0, ext=Fal
                 # In ext mode, overwrite the thresholds from SDR with the ones from command
                 try:
                     # Get Sensor Thresholds command
-                    argv = self.intf.issue_cmd(GetSensorThres, sensor_num)
+                    argv = _issue_sensor_cmd(self, prefetched, GetSensorThres, sensor_num)
                     thres[:6] = _conv_threshold_values(sdr1, 1, argv[1:])
                 except:
                     pass
@@ -552,7 +809,7 @@ def get_sensor_readings(self, opt=1, filter_sdr=0, filter_sensor_type=0, ext=Fal
                 # In ext mode, overwrite the hysteresis from SDR with the ones from command
                 try:
                     # Get Sensor Hysteresis command
-                    argv = self.intf.issue_cmd(GetSensorHys, sensor_num)
+                    argv = _issue_sensor_cmd(self, prefetched, GetSensorHys, sensor_num)
                     thres[9:] = _conv_threshold_values(sdr1, 2, argv)
                 except:
                     pass
@@ -233,8 +233,10 @@ LAN_PRINT_HDL = {
 def _lan_print(self, argv):
     chnl = get_chnl(argv[1:])
     flag = False
-    for key in LAN_PRINT_HDL.keys():
-        rsp = self.intf.issue_cmd(GetLanConfig, chnl, key, 0, 0)
+    keys = list(LAN_PRINT_HDL.keys())
+    rsps = self.intf.issue_batch([(GetLanConfig, (chnl, key, 0, 0)) for key in keys])
+    for key, rsp in zip(keys, rsps):
+        if isinstance(rsp, Exception): raise rsp
         if not rsp:  continue
 
         print_func = LAN_PRINT_HDL[key][0]
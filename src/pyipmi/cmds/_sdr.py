@@ -36,7 +36,7 @@ from .. mesg.ipmi_storage import GetSDRRepoInfo, GetSDRRepoAllocInfo, RevSDR, \
 from . _common import get_sensor_readings, print_sensor_list1, print_sensor_list2, \
                     print_sensor_list3, print_sensor_list4, conv_time, do_command, \
                     bcd2str, str2int, get_sdr_repo, conv_sensor_type, conv_entity_id, \
-                    print_sensor_type_list, get_one_sdr
+                    print_sensor_type_list, walk_sdr_repo
 from . _consts import TupleExt, ENTITY_DEVICE_CODES
 from .. util.exception import PyCmdsArgsExcept, PyCmdsExcept
 
@@ -297,22 +297,14 @@ def _sdr_dump(self, argv):
     if len(argv) < 2:
         raise PyCmdsArgsExcept(1)
 
-    next_id = b'\0'
-    sdr_count = 0
-
     _, rec, *_ = self.intf.issue_cmd(GetSDRRepoInfo)
     if rec == 0:  
         raise PyCmdsExcept('SDR repository is empty.', -1)
 
-    resv_id, = self.intf.issue_cmd(RevSDR)
     with open(argv[1], 'wb') as out_file:
         self.print('Dumping Sensor Data Repository to \'' + argv[1] + '\'.')
-        while next_id != b'\xff\xff':
-            if sdr_count > rec: break   # already got more SDRs than the total # 
-            sdr1 = get_one_sdr(self, resv_id, next_id)
-            next_id = sdr1[:2]
-            out_file.write(sdr1[2:])
-            sdr_count += 1
+        for rec1 in walk_sdr_repo(self, rec):
+            out_file.write(rec1)
 
 def _sdr_fill(self, argv):
     if len(argv) < 2:
@@ -0,0 +1,109 @@
+#
+# Copyright (c) 2021, Hyve Design Solutions Corporation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are 
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright 
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright 
+#    notice, this list of conditions and the following disclaimer in the 
+#    documentation and/or other materials provided with the distribution.
+#
+# 3. Neither the name of Hyve Design Solutions Corporation nor the names 
+#    of its contributors may be used to endorse or promote products 
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY HYVE DESIGN SOLUTIONS CORPORATION AND 
+# CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, 
+# BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND 
+# FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL 
+# HYVE DESIGN SOLUTIONS CORPORATION OR CONTRIBUTORS BE LIABLE FOR ANY 
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL 
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS 
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) 
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, 
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING 
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+#
+import os, struct
+
+# Persistent cache of the SDR repositories, one file per BMC
+#   magic (8) | add ts (4) | erase ts (4) | count (2) | count x (len (2) | record)
+# A record is the SDR with its 5-byte header.  The file is up to date as long
+# as the add and erase timestamps of the repository are unchanged.
+SDR_CACHE_MAGIC = b'PYIPMIS\x01'
+
+def sdr_cache_allowed(self):
+    # False if recording or replaying.  The SDR traffic replayed must be the
+    # same as recorded, so neither may skip any by the cached records.
+    opts = getattr(self, 'opts', None)
+    if not opts:  return True
+
+    g = opts['global']
+    return not g.get('record', '') and not g.get('replay', '')
+
+def _get_sdr_cache_dir(self):
+    # Return None if the cache is disabled
+    opts = getattr(self, 'opts', None)
+    if not opts or not opts['global'].get('sdr_cache', False):
+        return None
+    if not sdr_cache_allowed(self):  return None
+
+    return os.path.join(os.getenv('HOME'), '.config', 'pyipmi', 'sdr')
+
+def get_sdr_cache_path(self):
+    # Return None if the cache is disabled
+    cache_dir = _get_sdr_cache_dir(self)
+    if cache_dir is None:  return None
+
+    opts = self.opts
+    g = opts['global']
+    if g.get('interface', 'lanplus') == 'kcs':
+        name = 'kcs{0}'.format(opts.get('kcs', {}).get('dev_num', 0))
+    else:
+        name = '{0}_{1}'.format(g.get('host', 'localhost'), g.get('port', 623))
+    name = name.replace(os.sep, '_')
+
+    return os.path.join(cache_dir, name + '.sdr')
+
+def read_sdr_cache(path):
+    # Return (add ts, erase ts, records), or None if not cached
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+
+    if len(data) < 18 or data[:8] != SDR_CACHE_MAGIC:
+        return None
+    add_ts, erase_ts, count = struct.unpack('<LLH', data[8:18])
+
+    recs = []
+    pos = 18
+    for _ in range(count):
+        if pos + 2 > len(data):  return None
+        rec_len, = struct.unpack('<H', data[pos:pos+2])
+        rec = data[pos+2:pos+2+rec_len]
+        if len(rec) != rec_len or rec_len < 5:  return None
+        recs.append(rec)
+        pos += 2 + rec_len
+
+    return (add_ts, erase_ts, recs)
+
+def write_sdr_cache(path, add_ts, erase_ts, recs):
+    # Write to a temporary file first, so the readers never see a partial one
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = '{0}.{1}'.format(path, os.getpid())
+        with open(tmp, 'wb') as f:
+            f.write(SDR_CACHE_MAGIC + struct.pack('<LLH', add_ts, erase_ts, len(recs)))
+            for rec in recs:
+                f.write(struct.pack('<H', len(rec)) + rec)
+        os.replace(tmp, path)
+    except OSError:
+        pass    # the cache is only an optimization
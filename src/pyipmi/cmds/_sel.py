@@ -102,37 +102,51 @@ def _conv_sel_event(event, event_reading_type, sensor_type):
 
     return ret
 
+def conv_sel_entry(sel1, sensor_map=None):
+    # Decode a SEL entry in the format of the 16-byte SEL record, i.e.
+    # (rec_id, rec_type, ts, gen_id, evm_rev, sensor_type, sensor_num,
+    #  event_dir | event_type, event_data1, event_data2, event_data3)
+    rec_id = sel1[0]
+    rec_type = sel1[1]
+    if rec_type >= 0xe0:  ts = '(OEM Non-Timestamped)'
+    else:  ts = conv_time(sel1[2])
+
+    sensor_lun = (sel1[3] >> 8) & 3
+    sensor_type = sel1[5]
+    sensor_num = (sensor_lun << 8) + sel1[6]
+    event_dir = 'Deassertion' if (sel1[7] & 0x80) >> 7 else 'Assertion'
+    event_type = sel1[7] & 0x7f
+    event = sel1[8] & 0x0f
+
+    sensor_type_str = conv_sensor_type(sel1[5])
+    event_str = _conv_sel_event(event, event_type, sensor_type)
+
+    # Not the truth value, which counts all the sensors of a SensorMap
+    sensor_name = '#{0:02X}h'.format(sensor_num)
+    if sensor_map is not None:
+        if hasattr(sensor_map, 'get_name'):
+            sensor_name = sensor_map.get_name(sensor_num, sensor_name)
+        else:
+            # A plain mapping of sensor number => [(sensor name, ...)]
+            sdr_entries = sensor_map.get(sensor_num, None)
+            if sdr_entries:  sensor_name = sdr_entries[0][0]
+
+    return (rec_id, rec_type, ts, sensor_type_str, sensor_num, sensor_name,
+            event_type, event_str, event_dir)
+
 def print_sel_list(self, sel_all, opt=1, sensor_map=None):
     if not sel_all:
         self.print('No SEL entries.')
         return
 
     for sel1 in sel_all:
-        rec_id = sel1[0]
-        rec_type = sel1[1]
-        if rec_type >= 0xe0:  ts = '(OEM Non-Timestamped)'
-        else:  ts = conv_time(sel1[2])
-
-        sensor_lun = (sel1[3] >> 8) & 3
-        sensor_type = sel1[5]
-        sensor_num = (sensor_lun << 8) + sel1[6]
-        event_dir = 'Deassertion' if (sel1[7] & 0x80) >> 7 else 'Assertion'
-        event_type = sel1[7] & 0x7f
-        event = sel1[8] & 0x0f
-
-        sensor_type_str = conv_sensor_type(sel1[5])
-        event_str = _conv_sel_event(event, event_type, sensor_type)
+        (rec_id, rec_type, ts, sensor_type_str, sensor_num, sensor_name,
+         event_type, event_str, event_dir) = conv_sel_entry(sel1, sensor_map)
 
         if opt == 1:
             self.print('{0:>4x} | {1} | {2} #{3:02X}h | {4} | {5}'.format(
                   rec_id, ts, sensor_type_str, sensor_num, event_str, event_dir))
         else:
-            sdr_entries = sensor_map.get(sensor_num, None)
-            if sdr_entries:
-                sensor_name, *_ = sdr_entries[0]
-            else:
-                sensor_name = '#{0:02X}h'.format(sensor_num)
-
             if opt == 2:
                 self.print('{0:>4x} | {1} | {2}: {3} | {4} | {5}'.format(
                       rec_id, ts, sensor_type_str, sensor_name, event_str, event_dir))
@@ -54,9 +54,15 @@ def _user_list(self, argv):
     user_enabled.append((enabled & 0xc0) >> 6)
     user_acc.append(acc)
     
-    for i in range(2, max_user + 1):
+    # The rest of the commands are independent of each other
+    reqs = [(GetUserAccess, (chnl, i)) for i in range(2, max_user + 1)]
+    reqs += [(GetUserName, (i,)) for i in range(1, max_user + 1)]
+    rsps = self.intf.issue_batch(reqs)
+
+    for rsp in rsps[:max_user - 1]:
         try:
-            _, enabled, _, acc = self.intf.issue_cmd(GetUserAccess, chnl, i)
+            if isinstance(rsp, Exception): raise rsp
+            _, enabled, _, acc = rsp
         except:
             enabled = 0
             acc = 0x0f
@@ -64,9 +70,10 @@ def _user_list(self, argv):
             user_enabled.append((enabled & 0xc0) >> 6)
             user_acc.append(acc)
 
-    for i in range(1, max_user + 1):
+    for rsp in rsps[max_user - 1:]:
         try:
-            name, = self.intf.issue_cmd(GetUserName, i)
+            if isinstance(rsp, Exception): raise rsp
+            name, = rsp
             name = name.decode('latin_1')
             name = name.replace('\x00', '\x20')
         except:
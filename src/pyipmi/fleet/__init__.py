@@ -0,0 +1,205 @@
+#
+# Copyright (c) 2021, Hyve Design Solutions Corporation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are 
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright 
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright 
+#    notice, this list of conditions and the following disclaimer in the 
+#    documentation and/or other materials provided with the distribution.
+#
+# 3. Neither the name of Hyve Design Solutions Corporation nor the names 
+#    of its contributors may be used to endorse or promote products 
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY HYVE DESIGN SOLUTIONS CORPORATION AND 
+# CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, 
+# BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND 
+# FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL 
+# HYVE DESIGN SOLUTIONS CORPORATION OR CONTRIBUTORS BE LIABLE FOR ANY 
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL 
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS 
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) 
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, 
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING 
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+#
+import asyncio
+from collections import deque
+from .. intf.aiormcp import AsyncRMCP, AsyncRMCPP
+from .. mesg import IPMI_Raw
+from .. util.exception import PyIntfExcept
+
+__all__ = [
+    'Fleet',
+]
+
+# Per-host session states
+HOST_IDLE = 0       # no session
+HOST_OPENING = 1    # session being established
+HOST_OPEN = 2       # session established
+HOST_FAILED = 3     # failed to establish the session
+
+class _Host:
+    def __init__(self, host, port, opts):
+        self.host = host
+        self.port = port
+        self.opts = opts
+        self.intf = None
+        self.state = HOST_IDLE
+        self.error = None
+        self.queue = deque()    # (cmd_cls, args)
+        self.workers = 0
+        self.opened = None      # asyncio.Event set when the session is ready
+
+class Fleet:
+    # Drive the sessions to many BMCs on one event loop
+    #   opts (dict): default options of the interface section, e.g. opts['lanplus']
+    #   interface (str): lan or lanplus
+    #   limit (int): max number of requests in flight of the whole fleet
+    #   keep_open (bool): keep the session after the queue of a host is drained
+    # The hosts are keyed by (host, port), so the BMCs behind one address on
+    # different ports are separate.  A host name alone means the port 623.
+    def __init__(self, opts=None, interface='lanplus', limit=256, keep_open=False,
+                 keep_alive=False):
+        self.opts = opts if opts else {}
+        self.intf_cls = AsyncRMCPP if interface == 'lanplus' else AsyncRMCP
+        self.limit = limit
+        self.keep_open = keep_open
+        self.keep_alive = keep_alive
+
+        self.hosts = {}
+        self.sem = None
+        self.results = None
+        self.pending = 0        # commands submitted but not reported yet
+
+    def add_host(self, host, port=623, opts=None):
+        # Return the key of the host
+        opts2 = dict(self.opts)
+        if opts: opts2.update(opts)
+        self.hosts[(host, port)] = _Host(host, port, opts2)
+        return (host, port)
+
+    def submit(self, host, cmd_cls, *args):
+        # host: the key returned by add_host(), or a host name of the port 623
+        key = host if isinstance(host, tuple) else (host, 623)
+        if key not in self.hosts:  self.add_host(*key)
+        h = self.hosts[key]
+        h.queue.append((cmd_cls, args))
+        self.pending += 1
+        if self.results is not None:  self._kick(h)
+
+    def submit_raw(self, host, req, lun=0):
+        self.submit(host, IPMI_Raw, req, lun)
+
+    def submit_all(self, cmd_cls, *args):
+        for host in self.hosts.keys():
+            self.submit(host, cmd_cls, *args)
+
+    def _kick(self, h):
+        # Start the workers of the host.  Up to the session window of them
+        # after the session is established.
+        n = 1 if h.state != HOST_OPEN else h.intf.window
+        while h.workers < n and h.workers < len(h.queue):
+            h.workers += 1
+            asyncio.ensure_future(self._host_worker(h))
+
+    async def _open(self, h):
+        h.state = HOST_OPENING
+        h.opened = asyncio.Event()
+        h.error = None
+        intf = self.intf_cls({'host': h.host, 'port': h.port}, self.keep_alive)
+
+        try:
+            async with self.sem:
+                await intf.open(h.opts)
+            h.intf = intf
+            h.state = HOST_OPEN
+        except Exception as e:
+            h.error = e
+            try:
+                await intf.close()
+            except Exception:
+                pass
+        finally:
+            # Never leave the host opening, or its other workers wait forever
+            if h.state != HOST_OPEN:
+                h.state = HOST_FAILED
+                if h.error is None:
+                    h.error = PyIntfExcept('Failed to open the session.')
+            h.opened.set()
+
+    async def _close(self, h):
+        intf, h.intf = h.intf, None
+        h.state = HOST_IDLE
+        async with self.sem:
+            await intf.close()
+
+    async def _host_worker(self, h):
+        try:
+            while h.queue:
+                if h.state == HOST_IDLE:
+                    await self._open(h)
+                    self._kick(h)
+                elif h.state == HOST_OPENING:
+                    await h.opened.wait()
+                    continue
+
+                # HOST_OPEN or HOST_FAILED here
+                item = h.queue.popleft()
+                cmd_cls, args = item
+                if h.state != HOST_OPEN:
+                    rsp = h.error
+                else:
+                    try:
+                        async with self.sem:
+                            rsp = await h.intf.issue_cmd(cmd_cls, *args)
+                    except Exception as e:
+                        rsp = e
+
+                await self.results.put(((h.host, h.port), item, rsp))
+        finally:
+            h.workers -= 1
+
+        if h.workers == 0 and h.state == HOST_OPEN and not self.keep_open:
+            await self._close(h)
+
+    async def stream(self):
+        # Yield ((host, port), (cmd_cls, args), response or exception) in the
+        # order of completion until all the submitted commands are done
+        self.sem = asyncio.Semaphore(self.limit)
+        self.results = asyncio.Queue()
+        for h in self.hosts.values():
+            # Retry the hosts failed in the last stream.  Their BMCs may be back.
+            if h.state == HOST_FAILED:  h.state = HOST_IDLE
+            self._kick(h)
+
+        try:
+            while self.pending > 0:
+                rsp = await self.results.get()
+                self.pending -= 1
+                yield rsp
+        finally:
+            self.results = None
+
+    def run(self, loop=None):
+        # Blocking version of stream()
+        if loop is None:  loop = asyncio.get_event_loop()
+        agen = self.stream()
+        while True:
+            try:
+                yield loop.run_until_complete(agen.__anext__())
+            except StopAsyncIteration:
+                break
+
+    async def close(self):
+        for h in self.hosts.values():
+            if h.state == HOST_OPEN:
+                await self._close(h)
+            h.state = HOST_IDLE
@@ -0,0 +1,237 @@
+#
+# Copyright (c) 2021, Hyve Design Solutions Corporation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are 
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright 
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright 
+#    notice, this list of conditions and the following disclaimer in the 
+#    documentation and/or other materials provided with the distribution.
+#
+# 3. Neither the name of Hyve Design Solutions Corporation nor the names 
+#    of its contributors may be used to endorse or promote products 
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY HYVE DESIGN SOLUTIONS CORPORATION AND 
+# CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, 
+# BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND 
+# FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL 
+# HYVE DESIGN SOLUTIONS CORPORATION OR CONTRIBUTORS BE LIABLE FOR ANY 
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL 
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS 
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) 
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, 
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING 
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+#
+import asyncio, random, time
+from collections import Counter
+from .. intf.aiormcp import AsyncRMCP, AsyncRMCPP
+from .. intf._stats import HIST_BUCKETS, hist_bucket, hist_percentile
+from .. util.exception import PyExcept, PyIntfTimeoutExcept
+
+__all__ = [
+    'LoadGen',
+    'parse_mix',
+]
+
+# Default command mix, from the requests of benchmarks/bmp1-5
+# (raw request, weight)
+DEFAULT_MIX = [
+    ([6, 1], 4),            # Get Device ID
+    ([6, 0x46, 2], 2),      # Get User Name 2
+    ([0xa, 0x48], 2),       # Get SEL Time
+    ([0xa, 0x20], 1),       # Get SDR Repository Info
+    ([4, 0x2d, 1], 4),      # Get Sensor Reading 1
+    ([4, 0x2d, 2], 4),      # Get Sensor Reading 2
+]
+
+def _str2int(s):
+    if s[:2] == '0x' or s[:2] == '0X':
+        return int(s, base=16)
+    return int(s)
+
+def parse_mix(mix_str):
+    # "6 1@5; 0xa 0x48@2; 4 0x2d 8" => [([6, 1], 5), ([10, 72], 2), ([4, 45, 8], 1)]
+    mix = []
+    for item in mix_str.split(';'):
+        item = item.strip()
+        if not item:  continue
+
+        req, _, weight = item.partition('@')
+        req = [_str2int(x) for x in req.split()]
+        if len(req) < 2:
+            raise PyExcept('Missing NetFn or CMD in the command mix: ' + item)
+
+        mix.append((req, int(weight) if weight else 1))
+
+    return mix
+
+class _Stats:
+    def __init__(self):
+        self.sent = 0
+        self.skipped = 0        # not sent due to too many requests outstanding
+        self.done = 0
+        # The latencies in the log2 buckets of intf._stats, so a long run 
+        # takes no more memory than a short one
+        self.hist = [0] * HIST_BUCKETS
+        self.lat_max = 0        # in seconds
+        self.ccs = Counter()
+        self.timeouts = 0
+        self.errors = 0
+
+    def add_latency(self, lat):
+        self.done += 1
+        self.hist[hist_bucket(lat)] += 1
+        if lat > self.lat_max:  self.lat_max = lat
+
+    def summary(self, elapsed):
+        ms = lambda x: round(min(x, self.lat_max) * 1000, 3)
+        return {
+            'sent': self.sent,
+            'done': self.done,
+            'skipped': self.skipped,
+            'throughput': round(self.done / elapsed, 1) if elapsed > 0 else 0,
+            'p50': ms(hist_percentile(self.hist, 50)),
+            'p90': ms(hist_percentile(self.hist, 90)),
+            'p99': ms(hist_percentile(self.hist, 99)),
+            'max': ms(self.lat_max),
+            'timeouts': self.timeouts,
+            'errors': self.errors,
+            'ccs': {'{0:02x}'.format(cc): n for cc, n in sorted(self.ccs.items())},
+        }
+
+class LoadGen:
+    # Drive the BMCs with a weighted command mix on one event loop
+    #   hosts: list of (host, port)
+    #   opts (dict): options of the interface section, e.g. opts['lanplus']
+    #   mix: list of (raw request, weight)
+    #   sessions (int): number of the sessions per BMC
+    #   rate (float): target requests per second of all the BMCs.  0 to issue
+    #                 the requests back to back, up to the window per session
+    #   duration, interval (float): in seconds
+    def __init__(self, hosts, opts=None, interface='lanplus', mix=None, sessions=1,
+                 rate=0, duration=10, interval=1, max_outstanding=1024):
+        self.hosts = hosts
+        self.opts = opts if opts else {}
+        self.intf_cls = AsyncRMCPP if interface == 'lanplus' else AsyncRMCP
+        self.mix = mix if mix else DEFAULT_MIX
+        self.sessions = sessions
+        self.rate = rate
+        self.duration = duration
+        self.interval = interval
+        self.max_outstanding = max_outstanding
+
+        self.intfs = []
+        self.failed = []        # (host, port, exception)
+        self.outstanding = 0
+        self.cur = _Stats()
+        self.total = _Stats()
+
+    async def _open(self, host, port):
+        intf = self.intf_cls({'host': host, 'port': port})
+        try:
+            await intf.open(self.opts)
+            self.intfs.append(intf)
+        except Exception as e:
+            self.failed.append((host, port, e))
+            try:
+                await intf.close()
+            except Exception:
+                pass
+
+    async def _issue(self, intf, req):
+        t0 = time.time()
+        try:
+            rsp = await intf.issue_raw_cmd(req)
+            lat = time.time() - t0
+            for st in (self.cur, self.total):
+                st.add_latency(lat)
+                st.ccs[rsp[0]] += 1
+        except PyIntfTimeoutExcept:
+            for st in (self.cur, self.total):  st.timeouts += 1
+        except Exception:
+            for st in (self.cur, self.total):  st.errors += 1
+        finally:
+            self.outstanding -= 1
+
+    def _next_req(self):
+        return random.choices(self.reqs, self.weights)[0]
+
+    def _start(self, intf):
+        for st in (self.cur, self.total):  st.sent += 1
+        self.outstanding += 1
+        return asyncio.ensure_future(self._issue(intf, self._next_req()))
+
+    async def _open_loop(self, end):
+        # Issue at the target rate regardless of the responses
+        loop = asyncio.get_event_loop()
+        tasks = set()
+        next_t = loop.time()
+        i = 0
+
+        while next_t < end:
+            delay = next_t - loop.time()
+            if delay > 0:  await asyncio.sleep(delay)
+            next_t += 1 / self.rate
+
+            if self.outstanding >= self.max_outstanding:
+                for st in (self.cur, self.total):  st.skipped += 1
+                continue
+
+            task = self._start(self.intfs[i % len(self.intfs)])
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            i += 1
+
+        if tasks:  await asyncio.wait(tasks)
+
+    async def _closed_loop(self, intf, end):
+        loop = asyncio.get_event_loop()
+        while loop.time() < end:
+            await self._start(intf)
+
+    async def _report(self, report):
+        loop = asyncio.get_event_loop()
+        t0 = t1 = loop.time()
+        while True:
+            await asyncio.sleep(self.interval)
+            now = loop.time()
+            cur, self.cur = self.cur, _Stats()
+            if report:  report(now - t0, cur.summary(now - t1))
+            t1 = now
+
+    async def run(self, report=None):
+        # report(t, summary) is called every interval
+        # Return the summary of the whole run
+        self.reqs = [x[0] for x in self.mix]
+        self.weights = [x[1] for x in self.mix]
+
+        await asyncio.gather(*(self._open(host, port) for host, port in self.hosts 
+                               for _ in range(self.sessions)))
+        if not self.intfs:
+            return None
+
+        loop = asyncio.get_event_loop()
+        t0 = loop.time()
+        end = t0 + self.duration
+        reporter = asyncio.ensure_future(self._report(report))
+
+        try:
+            if self.rate > 0:
+                await self._open_loop(end)
+            else:
+                await asyncio.gather(*(self._closed_loop(intf, end) 
+                                       for intf in self.intfs for _ in range(intf.window)))
+        finally:
+            reporter.cancel()
+            elapsed = loop.time() - t0
+            await asyncio.gather(*(intf.close() for intf in self.intfs))
+
+        return self.total.summary(elapsed)
@@ -30,17 +30,38 @@
 # IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
 # POSSIBILITY OF SUCH DAMAGE.
 #
-from .. util.exception import PyIntfExcept
+import threading, queue
+from concurrent.futures import Future
+from .. util.exception import PyExcept, PyIntfExcept
 
 __all__ = [
     'kcs',
     'rmcp',
     'rmcpp',
+    'aiormcp',
+    'broker',
+    'replay',
     'ioctl',
     'init',    
 ]
 
 def init(opts, ping_only, keep_alive):
+    replay = opts['global'].get('replay', '')
+    if replay and not ping_only:
+        # Serve the responses recorded instead of connecting to the BMC
+        from . replay import Replay_Intf
+        return Replay_Intf(replay, opts['global'].get('replay_speed', 1))
+
+    intf = _init_intf(opts, ping_only, keep_alive)
+
+    record = opts['global'].get('record', '')
+    if record and not ping_only:
+        from . replay import Record_Intf
+        intf = Record_Intf(intf, record)
+
+    return intf
+
+def _init_intf(opts, ping_only, keep_alive):
     if ping_only:
         from . rmcp import RMCP_Ping
         intf = RMCP_Ping(opts['global'])
@@ -52,6 +73,14 @@ def init(opts, ping_only, keep_alive):
     else:
         intf_name = opts['global']['interface']
 
+    if intf_name in ('lan', 'lanplus') and opts['global'].get('broker', ''):
+        # Forward the commands to the session broker if it is running
+        from . broker import BrokerClient
+        intf = BrokerClient(opts['global'])
+        if intf.connect():
+            intf.open(opts[intf_name])
+            return intf
+
     if intf_name == 'lan':
         from . rmcp import RMCP
         intf = RMCP(opts['global'], keep_alive)
@@ -72,7 +101,23 @@ def init(opts, ping_only, keep_alive):
 
     raise PyIntfExcept('Invalid interface specified: ' + intf_name)
 
+# Guard the starting and stopping of the background I/O threads
+_io_lock = threading.Lock()
+
 class Intf:
+    # Max number of queued requests issued in one batch by the I/O thread
+    MAX_IO_BATCH = 64
+
+    # The background I/O thread of the non-blocking calls, started on demand
+    io_q = None
+    io_thread = None
+
+    # The per-command instrumentation, None if disabled
+    stats = None
+
+    # The SDR repository of the BMC loaded by the commands, see cmds._common
+    sdr_repo = None
+
     def open(self, opts):
         pass
 
@@ -87,3 +132,98 @@ class Intf:
 
     def issue_bridging_cmd(self, dest, target, req, lun=0):
         pass
+
+    def enable_stats(self, enable=True):
+        # Record the per-command counters and latency histograms
+        if not enable:
+            self.stats = None
+        elif self.stats is None:
+            from . _stats import Intf_Stats
+            self.stats = Intf_Stats()
+
+    def get_stats(self):
+        # Return {(netfn, cmd): dict of the counters}
+        return self.stats.snapshot() if self.stats else {}
+
+    def reset_stats(self):
+        if self.stats:  self.stats.reset()
+
+    def issue_batch(self, reqs):
+        # reqs: a list of (cmd_cls, args) or raw requests
+        # Return the responses in the same order.  A failed request has the
+        # exception in its place instead.
+        rsps = []
+        for cmd_cls, args in self.conv_batch(reqs):
+            try:
+                rsps.append(self.issue_cmd(cmd_cls, *args))
+            except PyExcept as e:
+                rsps.append(e)
+
+        return rsps
+
+    def conv_batch(self, reqs):
+        # Convert the raw requests of a batch into (IPMI_Raw, (req, lun))
+        from .. mesg import IPMI_Raw
+
+        cmds = []
+        for req in reqs:
+            if isinstance(req, tuple) and len(req) == 2 and isinstance(req[0], type):
+                cmds.append(req)
+            else:
+                cmds.append((IPMI_Raw, (req, 0)))
+
+        return cmds
+
+    def issue_cmd_nowait(self, cmd_cls, *args):
+        # Queue the command to the I/O thread and return a future of its response
+        fut = Future()
+        with _io_lock:
+            if self.io_thread is None:
+                self.io_q = queue.Queue()
+                self.io_thread = threading.Thread(target=self.io_cb, args=(self.io_q,))
+                self.io_thread.daemon = True
+                self.io_thread.start()
+
+            self.io_q.put((fut, (cmd_cls, args)))
+
+        return fut
+
+    def issue_raw_cmd_nowait(self, req, lun=0):
+        from .. mesg import IPMI_Raw
+        return self.issue_cmd_nowait(IPMI_Raw, req, lun)
+
+    def stop_io(self):
+        # Stop the I/O thread after the requests already queued are done
+        with _io_lock:
+            th = self.io_thread
+            if th is None:  return
+            self.io_q.put(None)
+            self.io_thread = None
+
+        if th is not threading.current_thread():  th.join()
+
+    def io_cb(self, io_q):
+        stop = False
+        while not stop:
+            # Issue the requests queued meanwhile in one batch
+            items = [io_q.get()]
+            while len(items) < self.MAX_IO_BATCH:
+                try:
+                    items.append(io_q.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = None in items
+            items = [x for x in items if x and x[0].set_running_or_notify_cancel()]
+            if not items:  continue
+
+            try:
+                rsps = self.issue_batch([x[1] for x in items])
+            except Exception as e:
+                rsps = [e] * len(items)
+
+            for (fut, _), rsp in zip(items, rsps):
+                if isinstance(rsp, Exception):
+                    fut.set_exception(rsp)
+                else:
+                    fut.set_result(rsp)
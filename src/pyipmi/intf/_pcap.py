@@ -0,0 +1,131 @@
+#
+# Copyright (c) 2021, Hyve Design Solutions Corporation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are 
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright 
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright 
+#    notice, this list of conditions and the following disclaimer in the 
+#    documentation and/or other materials provided with the distribution.
+#
+# 3. Neither the name of Hyve Design Solutions Corporation nor the names 
+#    of its contributors may be used to endorse or promote products 
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY HYVE DESIGN SOLUTIONS CORPORATION AND 
+# CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, 
+# BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND 
+# FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL 
+# HYVE DESIGN SOLUTIONS CORPORATION OR CONTRIBUTORS BE LIABLE FOR ANY 
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL 
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS 
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) 
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, 
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING 
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+#
+import socket, struct, threading, time
+from .. util.exception import PyIntfExcept
+
+# Packet capture of the RMCP/RMCP+ datagrams in the pcap format
+# Each datagram gets synthetic IPv4/UDP headers, so Wireshark dissects it as
+# RMCP.  The records are buffered and written in batches, and by a timer, so
+# an idle session does not keep them buffered.
+LINKTYPE_RAW = 101          # raw IPv4 packets, no link layer header
+PCAP_SNAPLEN = 65535
+
+BUF_SIZE = 65536            # write once the buffer grows beyond
+FLUSH_INTERVAL = 5          # seconds, the data buffered at most
+
+_REC_HDR = struct.Struct('<LLLL')
+_IP_UDP_HDR = struct.Struct('!BBHHHBBH4s4sHHHH')
+
+def _sum16(data):
+    # One's complement sum of the 16-bit words, not folded
+    return sum(struct.unpack('!%dH' % (len(data) >> 1), data))
+
+class Pcap_Writer:
+    def __init__(self, path, local, remote):
+        # local and remote: the (ip, port) of the UDP socket
+        try:
+            src = socket.inet_pton(socket.AF_INET, local[0])
+            dst = socket.inet_pton(socket.AF_INET, remote[0])
+        except OSError:
+            raise PyIntfExcept('Packet capture supports IPv4 only, not {0}.'.format(remote[0]))
+
+        self.lock = threading.Lock()
+        self.timer = None
+        self.file = open(path, 'wb')
+        self.buf = bytearray(struct.pack('<LHHlLLL', 0xa1b2c3d4, 2, 4, 0, 0, 
+                                         PCAP_SNAPLEN, LINKTYPE_RAW))
+        self.ip_id = 0
+        with self.lock:
+            self._arm()
+
+        # The sum of the constant header words of both directions is taken
+        # once, so the checksum of a packet only adds the length and ID
+        self.hdrs = {}
+        for out, (a, b, sp, dp) in ((True, (src, dst, local[1], remote[1])), 
+                                    (False, (dst, src, remote[1], local[1]))):
+            ip = _IP_UDP_HDR.pack(0x45, 0, 0, 0, 0x4000, 64, 17, 0, a, b, 0, 0, 0, 0)
+            self.hdrs[out] = (a, b, sp, dp, _sum16(ip[:20]))
+
+    def write(self, data, outbound, ts=None):
+        if ts is None:  ts = time.time()
+        src, dst, sport, dport, ip_sum = self.hdrs[outbound]
+        udp_len = len(data) + 8
+        ip_len = udp_len + 20
+
+        with self.lock:
+            if self.file is None:  return
+            ip_id = self.ip_id = (self.ip_id + 1) & 0xffff
+            csum = ip_sum + ip_len + ip_id
+            csum = (csum & 0xffff) + (csum >> 16)
+            csum = ~((csum & 0xffff) + (csum >> 16)) & 0xffff
+
+            usec = int(ts * 1000000)
+            buf = self.buf
+            buf += _REC_HDR.pack(usec // 1000000, usec % 1000000, ip_len, ip_len)
+            # UDP checksum 0: not computed
+            buf += _IP_UDP_HDR.pack(0x45, 0, ip_len, ip_id, 0x4000, 64, 17, csum, 
+                                    src, dst, sport, dport, udp_len, 0)
+            buf += data
+
+            if len(buf) >= BUF_SIZE:
+                self._flush()
+            else:
+                self._arm()
+
+    def _arm(self):
+        # Flush the data buffered in FLUSH_INTERVAL.  The caller holds the lock.
+        if self.timer is not None:  return
+        self.timer = threading.Timer(FLUSH_INTERVAL, self.flush)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def _flush(self):
+        # The caller holds the lock
+        if self.buf:
+            self.file.write(self.buf)
+            self.file.flush()
+            self.buf.clear()
+
+    def flush(self):
+        with self.lock:
+            self.timer = None
+            if self.file:  self._flush()
+
+    def close(self):
+        with self.lock:
+            timer, self.timer = self.timer, None
+            if self.file:
+                self._flush()
+                self.file.close()
+                self.file = None
+        if timer:  timer.cancel()
@@ -33,7 +33,7 @@
 import os, struct
 from .. util.exception import PyIntfExcept, PyIntfCCExcept
 from . _rmcpp_msg import IPMI20_Message
-from . _crypto import RAKP_NONE, cal_auth_code, map_auth2inte, cal_inte_check
+from . _crypto import RAKP_NONE, MD5_128, cal_auth_code, map_auth2inte, cal_inte_check
 
 class RAKP_Message:
     def __init__(self, rcsid):
@@ -202,3 +202,27 @@ class RAKP_3_4(RAKP_Message):
 
             if auth_code != auth_code_expected:
                 raise PyIntfExcept('Key Exchange Authentication Code is not valid in RAKP 4.')           
+
+def cal_sik(auth, key, rcrn, msrn, priv, user=None):
+    # SIK = H(rcrn, msrn, priv, len(user), user)
+    # key = KG => user password
+    if key is None:  return None
+
+    data = rcrn + msrn
+    if user is None:
+        data += struct.pack('BB', priv, 0)
+    else:
+        data += struct.pack('BB', priv, len(user))
+        data += user
+
+    return cal_auth_code(auth, key, data)
+
+def cal_k1_k2(cipher, sik):
+    # Calculate K1 & K2 by need
+    k1, k2 = None, None
+    if cipher[1] != RAKP_NONE and cipher[1] != MD5_128:
+        k1 = cal_auth_code(cipher[0], sik, b'\x01' * 20)
+    if cipher[2] != RAKP_NONE:
+        k2 = cal_auth_code(cipher[0], sik, b'\x02' * 20)
+
+    return (k1, k2)
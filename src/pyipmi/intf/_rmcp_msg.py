@@ -54,16 +54,11 @@ class RMCP_Message:
         return rsp[4:]
 
 class ASF_Ping(RMCP_Message):
-    seq_num = 1
-    def __init__(self):
+    def __init__(self, seq_num=1):
         # Generate the RMCP header
-        self.seq_num = ASF_Ping.seq_num        
+        # The message tag is allocated by the session, from 0 to 0xfe
+        self.seq_num = seq_num
         super(ASF_Ping, self).__init__(seq_num=self.seq_num)
-        
-        seq_num = self.seq_num
-        seq_num += 1
-        if seq_num == 0xff: seq_num = 0
-        RMCP_Message.seq_num = seq_num
 
     def pack(self):
         msg = super(ASF_Ping, self).pack()
@@ -76,20 +71,18 @@ class ASF_Ping(RMCP_Message):
         pass
 
 class IPMI15_Message(RMCP_Message):
-    seq_num = 1
-
-    def __init__(self, auth=AUTH_NONE, sseq=0, sid=b'\0', pwd=''):
-        # Get this seq_num
-        if isinstance(self, IPMI15_Message):
-            self.seq_num = IPMI15_Message.seq_num
-            IPMI15_Message.seq_num += 1
-            if IPMI15_Message.seq_num == 64: IPMI15_Message.seq_num = 0
-
+    def __init__(self, auth=AUTH_NONE, sseq=0, sid=b'\0', pwd='', seq_num=1):
+        # The rqSeq is allocated by the session, from 0 to 63
+        self.seq_num = seq_num
         self.auth = auth
         self.sseq = sseq
         self.sid = sid
         self.pwd = pwd
         self.rs_addr = RMCP_Message.BMC_ADDR
+        self.rsp_addr = -1
+        self.rsp_seq = -1
+        self.rsp_cc = None      # None until a response is unpacked
+        self.any_seq = False    # accept any rsAddr & rqSeq, e.g. in the pipelined mode
         
         # Generate the RMCP header
         super(IPMI15_Message, self).__init__(msg_cls=7)
@@ -152,6 +145,13 @@ class IPMI15_Message(RMCP_Message):
             raise PyIntfExcept('Invalid rq_addr: {0:02X}h in response.  Expected {1:02X}h.'.format(
                                rq_addr, RMCP_Message.SOFT_ID)) 
 
+        # In the any_seq mode, the caller routes the response by the fields saved
+        self.rsp_addr = rs_addr
+        self.rsp_seq = rq_seq
+        self.rsp_cc = cc
+        if self.any_seq:
+            return (netfn, cmd, cc, rsp_data)
+
         if rs_addr != self.rs_addr:
             raise PyIntfExcept('Invalid rs_addr: {0:02X}h in response.  Expected {1:02X}h.'.format(
                                rs_addr, self.rs_addr)) 
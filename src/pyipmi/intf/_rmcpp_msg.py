@@ -38,20 +38,13 @@ from . _crypto import *
 from .. util.exception import PyIntfExcept
 
 class IPMI20_Message(IPMI15_Message):
-    seq_num = 1
-
-    def __init__(self, cipher, sseq=0, sid=0, pwd='', k1=None, k2=None):
+    def __init__(self, cipher, sseq=0, sid=0, pwd='', k1=None, k2=None, seq_num=1):
         self.cipher = cipher
         self.k1 = k1
         self.k2 = k2
+        self.clear = None   # (payload type, sid, sseq, payload) in plain text
         
-        # Get this seq_num
-        if isinstance(self, IPMI20_Message):
-            self.seq_num = IPMI20_Message.seq_num
-            IPMI20_Message.seq_num += 1
-            if IPMI20_Message.seq_num == 64: IPMI20_Message.seq_num = 0
-
-        super(IPMI20_Message, self).__init__(AUTH_RMCPP, sseq, sid, pwd)
+        super(IPMI20_Message, self).__init__(AUTH_RMCPP, sseq, sid, pwd, seq_num)
 
     def _pack_lan_header(self, payload, payload_type):
         payload_len = len(payload)
@@ -89,6 +82,7 @@ class IPMI20_Message(IPMI15_Message):
 
         # pack the IPMI LAN 2.0 header
         payload_type = cmd.payload_type
+        self.clear = (payload_type, self.sid, self.sseq, payload)
         if self.cipher[2] != RAKP_NONE:
             # bit 7 = 1b: payload is encrypted
             payload_type = 0x80
@@ -149,6 +143,7 @@ class IPMI20_Message(IPMI15_Message):
         # Decrypt if necessary
         if self.cipher[2] == AES_CBC_128:
             payload = decrypt_aes_128_cbc(self.k2, payload)
+        self.clear = (t1[1] & 0x3f, rsp[2:6], t1[3], payload)
                     
         # unpack IPMI LAN package
         if t1[1] & 0x3f == 0:
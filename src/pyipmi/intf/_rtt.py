@@ -0,0 +1,75 @@
+#
+# Copyright (c) 2021, Hyve Design Solutions Corporation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are 
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright 
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright 
+#    notice, this list of conditions and the following disclaimer in the 
+#    documentation and/or other materials provided with the distribution.
+#
+# 3. Neither the name of Hyve Design Solutions Corporation nor the names 
+#    of its contributors may be used to endorse or promote products 
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY HYVE DESIGN SOLUTIONS CORPORATION AND 
+# CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, 
+# BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND 
+# FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL 
+# HYVE DESIGN SOLUTIONS CORPORATION OR CONTRIBUTORS BE LIABLE FOR ANY 
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL 
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS 
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) 
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, 
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING 
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# Retransmission timeout estimator, based on RFC 6298
+#   SRTT <- (1 - alpha) * SRTT + alpha * R
+#   RTTVAR <- (1 - beta) * RTTVAR + beta * |SRTT - R|
+#   RTO <- SRTT + K * RTTVAR, bounded by [floor, ceiling]
+# The timeout doubles on each retransmission of the same request.  Only the
+# requests answered without retransmission are sampled (Karn's algorithm).
+# The floor is 1 s, the minimum of RFC 6298.  Slow commands of a BMC, e.g.
+# FRU, SEL or SDR reads, take much longer than the fast ones learned.
+class RTT_Estimator:
+    ALPHA = 0.125
+    BETA = 0.25
+    K = 4
+
+    def __init__(self, init=1500, floor=1000, ceiling=6000):
+        # All the values in milliseconds
+        self.floor = floor / 1000
+        self.ceiling = max(ceiling, floor) / 1000
+        self.srtt = None
+        self.rttvar = None
+        self.rto = self._bound(init / 1000)
+
+    def _bound(self, val):
+        return min(max(val, self.floor), self.ceiling)
+
+    def timeout(self, attempt=0):
+        # Timeout in seconds of the nth attempt of a request
+        return min(self.rto * (2 ** attempt), self.ceiling)
+
+    def update(self, rtt):
+        # rtt in seconds
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - self.BETA) * self.rttvar + self.BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - self.ALPHA) * self.srtt + self.ALPHA * rtt
+
+        self.rto = self._bound(self.srtt + self.K * self.rttvar)
+
+def new_rtt_estimator(opts, init=1500, floor=1000, ceiling=6000):
+    # Create the estimator from the timeout options in milliseconds
+    return RTT_Estimator(opts.get('timeout', init), opts.get('timeout_min', floor), 
+                         opts.get('timeout_max', ceiling))
@@ -0,0 +1,64 @@
+#
+# Copyright (c) 2021, Hyve Design Solutions Corporation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are 
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright 
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright 
+#    notice, this list of conditions and the following disclaimer in the 
+#    documentation and/or other materials provided with the distribution.
+#
+# 3. Neither the name of Hyve Design Solutions Corporation nor the names 
+#    of its contributors may be used to endorse or promote products 
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY HYVE DESIGN SOLUTIONS CORPORATION AND 
+# CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, 
+# BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND 
+# FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL 
+# HYVE DESIGN SOLUTIONS CORPORATION OR CONTRIBUTORS BE LIABLE FOR ANY 
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL 
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS 
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) 
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, 
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING 
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+#
+import threading
+
+# Sequence number allocator owned by a session
+# The numbers of the requests in flight are tracked, so they are skipped
+# until released.  Safe to share among the threads of a session.
+class Seq_Allocator:
+    def __init__(self, size=64, start=1):
+        # Allocate the numbers from 0 to size - 1
+        self.lock = threading.Lock()
+        self.size = size
+        self.next = start % size
+        self.in_use = {}    # seq => None, in the order of the allocation
+
+    def alloc(self):
+        with self.lock:
+            if len(self.in_use) >= self.size:
+                # All are in use.  Reuse the oldest one, whose response is
+                # the least likely to come still.
+                seq = next(iter(self.in_use))
+                del self.in_use[seq]
+            else:
+                seq = self.next
+                while seq in self.in_use:
+                    seq = (seq + 1) % self.size
+                self.next = (seq + 1) % self.size
+
+            self.in_use[seq] = None
+            return seq
+
+    def release(self, seq):
+        with self.lock:
+            self.in_use.pop(seq, None)
@@ -0,0 +1,117 @@
+#
+# Copyright (c) 2021, Hyve Design Solutions Corporation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are 
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright 
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright 
+#    notice, this list of conditions and the following disclaimer in the 
+#    documentation and/or other materials provided with the distribution.
+#
+# 3. Neither the name of Hyve Design Solutions Corporation nor the names 
+#    of its contributors may be used to endorse or promote products 
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY HYVE DESIGN SOLUTIONS CORPORATION AND 
+# CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, 
+# BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND 
+# FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL 
+# HYVE DESIGN SOLUTIONS CORPORATION OR CONTRIBUTORS BE LIABLE FOR ANY 
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL 
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS 
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) 
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, 
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING 
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+#
+import threading
+from collections import Counter
+
+# Per-command instrumentation of an interface
+# The latency histogram has log2 buckets in microseconds.  Bucket n counts
+# the latencies in [2^(n-1), 2^n) us, and bucket 0 the ones below 1 us.
+HIST_BUCKETS = 32
+
+def hist_bucket(lat):
+    # The bucket of the latency in seconds
+    return min(int(lat * 1000000).bit_length(), HIST_BUCKETS - 1)
+
+def hist_percentile(hist, p):
+    # The pth percentile in seconds by the nearest rank, interpolated linearly
+    # in its bucket
+    count = sum(hist)
+    if not count:  return 0
+
+    rank = min(max(int(count * p / 100 + 0.5), 1), count)
+    for n, c in enumerate(hist):
+        if rank <= c:
+            lo = (1 << (n - 1)) if n else 0
+            return (lo + ((1 << n) - lo) * rank / c) / 1000000
+        rank -= c
+
+class _Cmd_Stats:
+    def __init__(self):
+        self.count = 0
+        self.ccs = Counter()
+        self.retries = 0
+        self.seq_errs = 0
+        self.timeouts = 0
+        self.errors = 0         # other failures without a response
+        self.lat_sum = 0
+        self.lat_max = 0
+        self.hist = [0] * HIST_BUCKETS
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'ccs': dict(self.ccs),
+            'retries': self.retries,
+            'seq_mismatches': self.seq_errs,
+            'timeouts': self.timeouts,
+            'errors': self.errors,
+            'lat_avg': self.lat_sum / self.count if self.count else 0,
+            'lat_max': self.lat_max,
+            # (upper bound in us, count) of the non-empty buckets
+            'hist': [(1 << n, c) for n, c in enumerate(self.hist) if c],
+        }
+
+class Intf_Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cmds = {}      # (netfn, cmd) => _Cmd_Stats
+
+    def record(self, netfn, cmd, lat, cc=None, retries=0, seq_errs=0, timeout=False):
+        # lat in seconds.  cc is None if no response received.
+        with self.lock:
+            st = self.cmds.get((netfn, cmd), None)
+            if st is None:
+                st = self.cmds[(netfn, cmd)] = _Cmd_Stats()
+
+            st.count += 1
+            st.retries += retries
+            st.seq_errs += seq_errs
+            if timeout:
+                st.timeouts += 1
+            elif cc is None:
+                st.errors += 1
+            else:
+                st.ccs[cc] += 1
+
+            st.lat_sum += lat
+            if lat > st.lat_max:  st.lat_max = lat
+            st.hist[hist_bucket(lat)] += 1
+
+    def snapshot(self):
+        # Return {(netfn, cmd): dict of the counters}
+        with self.lock:
+            return {key: st.to_dict() for key, st in sorted(self.cmds.items())}
+
+    def reset(self):
+        with self.lock:
+            self.cmds.clear()
@@ -0,0 +1,424 @@
+#
+# Copyright (c) 2021, Hyve Design Solutions Corporation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are 
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright 
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright 
+#    notice, this list of conditions and the following disclaimer in the 
+#    documentation and/or other materials provided with the distribution.
+#
+# 3. Neither the name of Hyve Design Solutions Corporation nor the names 
+#    of its contributors may be used to endorse or promote products 
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY HYVE DESIGN SOLUTIONS CORPORATION AND 
+# CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, 
+# BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND 
+# FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL 
+# HYVE DESIGN SOLUTIONS CORPORATION OR CONTRIBUTORS BE LIABLE FOR ANY 
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL 
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS 
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) 
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, 
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING 
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+#
+import os, struct, time, asyncio
+from .. util.exception import PyExcept, PyIntfExcept, PyIntfTimeoutExcept
+
+from . import Intf
+from . rmcp import RMCP
+from . rmcpp import RMCPP
+
+from . _rmcp_msg import ASF_Ping, RMCP_Message
+from . _rtt import RTT_Estimator, new_rtt_estimator
+from . _seq import Seq_Allocator
+from . _crypto import RMCP_AUTHS, AUTH_NONE, RAKP_NONE, get_cipher_tuple, conv_str2bytes
+from . _rakp import RMCPP_OpenSess, RAKP_1_2, RAKP_3_4, cal_sik, cal_k1_k2
+
+from .. mesg import IPMI_Raw
+from .. mesg.ipmi_app import GetChnlAuthCap, GetSessChallenge, ActivateSess, \
+        SetSessPriv, CloseSess
+
+class _RMCP_Protocol(asyncio.DatagramProtocol):
+    def __init__(self, intf):
+        self.intf = intf
+
+    def datagram_received(self, data, addr):
+        self.intf._datagram_received(data)
+
+    def error_received(self, exc):
+        self.intf._fail_all(PyIntfExcept('Socket exception occurred.  Stopped.'))
+
+    def connection_lost(self, exc):
+        self.intf._fail_all(PyIntfExcept('Socket closed.'))
+
+class AsyncRMCP(Intf):
+    KEEP_ALIVE_PERIOD = RMCP.KEEP_ALIVE_PERIOD
+    MAX_WINDOW = RMCP.MAX_WINDOW
+
+    # Share the message generation with the blocking interface
+    gen_msg = RMCP.gen_msg
+
+    def __init__(self, opts, keep_alive=False):
+        self.host = opts.get('host', 'localhost')
+        self.port = opts.get('port', 623)
+        self.transport = None
+
+        self.auth = AUTH_NONE
+        self.sseq = 0
+        self.sid = b'\0'
+        self.passwd = None
+        self.sess_act = False
+
+        self.keep_alive = keep_alive
+        self.wd_count = AsyncRMCP.KEEP_ALIVE_PERIOD
+        self.wd_task = None
+
+        self.window = 1
+        self.sem = None
+        self.pending = {}   # routing key => (future, msg, rs_addr)
+
+        self.rtt = RTT_Estimator()
+        self.rtt_bridge = RTT_Estimator()
+        self.rq_seq = Seq_Allocator(64)
+        self.ping_seq = Seq_Allocator(0xff)
+
+        # No packet capture, but the shared gen_msg() checks them
+        self.cap = None
+        self.cap_clear = None
+
+    async def _connect(self, opts):
+        self.window = min(max(opts.get('window', 1), 1), self.MAX_WINDOW)
+        self.sem = asyncio.Semaphore(self.window)
+        self.set_timeouts(opts)
+
+        loop = asyncio.get_event_loop()
+        try:
+            self.transport, _ = await loop.create_datagram_endpoint(
+                lambda: _RMCP_Protocol(self), remote_addr=(self.host, self.port))
+        except OSError:
+            raise PyIntfExcept("Failed to connect to host.")
+
+        if not opts.get('no_ping', False):
+            # rmcp ping
+            await self.ping()
+
+    def _start_keep_alive(self):
+        if self.keep_alive:
+            self.wd_task = asyncio.ensure_future(self.keep_alive_cb())
+
+    async def open(self, opts):
+        if 'auth' in opts.keys() and opts['auth'] not in RMCP_AUTHS.keys():
+            raise PyIntfExcept('Authentication algorithm {0} is not supported.'
+                                 .format(opts['auth']))
+
+        await self._connect(opts)
+
+        user = conv_str2bytes(opts.get('user', None))
+        self.passwd = conv_str2bytes(opts.get('password', None))
+        priv = opts.get('priv', 4)        
+
+        # open session
+        # Get Channel Authentication Capabilities Command
+        await self.issue_cmd(GetChnlAuthCap, priv)
+
+        # Get Session Challenge Command
+        auth = RMCP_AUTHS[opts.get('auth', 'md5')]
+        self.sid, chg_data = await self.issue_cmd(GetSessChallenge, auth, user)
+
+        # Activate Session Command
+        self.auth = auth
+        ioseq = 0
+        while ioseq == 0:
+            ioseq, = struct.unpack('<L', os.urandom(4))
+        self.auth, self.sid, self.sseq, priv = await self.issue_cmd(
+                                     ActivateSess, auth, priv, chg_data, ioseq)
+
+        self.sess_act = True  # Mark the session as activated
+
+        # Set Session Privilege Level Command
+        priv, = await self.issue_cmd(SetSessPriv, priv)
+
+        self._start_keep_alive()
+
+    async def close(self):
+        if self.wd_task:
+            self.wd_task.cancel()
+            self.wd_task = None
+
+        try:
+            if self.sess_act:
+                # Close Session Command
+                await self.issue_cmd(CloseSess, self.sid) # close session
+        except PyExcept:
+            pass
+        finally:
+            self.sess_act = False
+            if self.transport:
+                self.transport.close()
+                self.transport = None
+
+    def _fail_all(self, exc):
+        for fut, _, _ in list(self.pending.values()):
+            if not fut.done():  fut.set_exception(exc)
+
+    def _datagram_received(self, data):
+        if data[3:4] == b'\x06':
+            # ASF message, i.e. pong
+            fut, _, _ = self.pending.get(('ping',), (None, None, 0))
+            if fut and not fut.done():  fut.set_result(data)
+            return
+
+        if not self.pending:  return    # nobody is waiting for it
+
+        # Any message in flight can decode the response since they share 
+        # the same session, then route it by (rqSeq, netfn, cmd)
+        for _, msg, _ in self.pending.values():
+            if msg is not None: break
+        else:
+            return
+
+        try:
+            pkt1 = msg.unpack(data)
+        except PyIntfExcept:
+            return
+
+        if len(pkt1) == 2:
+            # RMCP+ Open Session Response or RAKP 2, 4
+            key = ('rakp', pkt1[0] & 0x3f)
+        else:
+            key = (msg.rsp_seq, pkt1[0], pkt1[1])
+
+        fut, _, rs_addr = self.pending.get(key, (None, None, 0))
+        if fut is None or fut.done():  return   # stale or duplicated response
+        if len(pkt1) == 4 and msg.rsp_addr != rs_addr:  return
+
+        fut.set_result(pkt1)
+
+    def set_timeouts(self, opts):
+        self.rtt = new_rtt_estimator(opts)
+        self.rtt_bridge = new_rtt_estimator(opts)
+
+    async def _wait_rsp(self, fut, data, retries, rtt=None):
+        # data is None: wait without retransmission
+        # Return (the response, the number of the retransmissions)
+        if rtt is None:  rtt = self.rtt
+        t0 = time.time()
+
+        for attempt in range(retries):
+            if data is not None:  self.transport.sendto(data)
+            try:
+                rsp = await asyncio.wait_for(asyncio.shield(fut), rtt.timeout(attempt))
+            except asyncio.TimeoutError:
+                continue
+
+            # Only sample the RTT of the requests not retransmitted
+            if attempt == 0 or data is None:  rtt.update(time.time() - t0)
+            return rsp, attempt
+
+        raise PyIntfTimeoutExcept('Times out.  Host has no response.')
+
+    def _record_stats(self, cmd, t0, pkt1, retries, timeout):
+        # pkt1: (netfn, cmd, cc, rsp data) of the response, or None
+        cc = pkt1[2] if pkt1 is not None and len(pkt1) == 4 else None
+        self.stats.record(cmd.netfn, cmd.cmd, time.time() - t0, cc, retries, 0, timeout)
+
+    def _add_pending(self, key, msg, rs_addr=RMCP_Message.BMC_ADDR):
+        if key in self.pending:
+            raise PyIntfExcept('Duplicated request in flight.')
+
+        fut = asyncio.get_event_loop().create_future()
+        self.pending[key] = (fut, msg, rs_addr)
+        return fut
+
+    def _next_sseq(self):
+        if self.keep_alive: self.wd_count = AsyncRMCP.KEEP_ALIVE_PERIOD
+        if self.sess_act:
+            self.sseq += 1
+            if self.sseq > 0xffffffff:
+                self.sseq = 1
+
+    def _req_key(self, msg, cmd):
+        if cmd.payload_type != 0:
+            return ('rakp', cmd.payload_type + 1)
+
+        # The netfn of the response is the one of the request + 1
+        msg.any_seq = True
+        return (msg.seq_num, cmd.netfn + 1, cmd.cmd)
+
+    def _unpack_cmd(self, pkt1, cmd):
+        if cmd.payload_type != 0:
+            return cmd.unpack(*pkt1)
+        return cmd.unpack(pkt1)
+
+    async def ping(self):
+        ping = ASF_Ping(self.ping_seq.alloc())
+        fut = self._add_pending(('ping',), None)
+        try:
+            rsp, _ = await self._wait_rsp(fut, ping.pack(), 3)
+        finally:
+            del self.pending[('ping',)]
+            self.ping_seq.release(ping.seq_num)
+
+        if len(rsp) != 28:
+            raise PyIntfExcept('Host responded improperly.')
+
+    async def issue_cmd(self, cmd_cls, *args):
+        cmd = cmd_cls(*args)
+
+        async with self.sem:
+            self._next_sseq()
+            msg, data = self.gen_msg(cmd)
+            t0 = time.time()
+            pkt1, retries, timeout = None, 0, False
+            try:
+                key = self._req_key(msg, cmd)
+                fut = self._add_pending(key, msg)
+                try:
+                    pkt1, retries = await self._wait_rsp(fut, data, 3)
+                except PyIntfTimeoutExcept:
+                    retries, timeout = 2, True
+                    raise
+                finally:
+                    del self.pending[key]
+            finally:
+                self.rq_seq.release(msg.seq_num)
+                if self.stats:  self._record_stats(cmd, t0, pkt1, retries, timeout)
+
+        return self._unpack_cmd(pkt1, cmd)
+
+    async def issue_raw_cmd(self, req, lun=0):
+        return await self.issue_cmd(IPMI_Raw, req, lun)
+    
+    async def issue_bridging_cmd(self, dest, target, req, lun=0):
+        cmd = IPMI_Raw(req, lun)
+
+        async with self.sem:
+            self._next_sseq()
+            msg, data, cmd_sm = self.gen_msg(cmd, True, dest, target)
+            t0 = time.time()
+            pkt2, timeout = None, False
+            try:
+                pkt2 = await self._issue_bridging_imp(msg, data, cmd, cmd_sm, target)
+            except PyIntfTimeoutExcept:
+                timeout = True
+                raise
+            finally:
+                self.rq_seq.release(msg.seq_num)
+                if self.stats:  self._record_stats(cmd, t0, pkt2, 0, timeout)
+
+        return cmd.unpack(pkt2)
+
+    async def _issue_bridging_imp(self, msg, data, cmd, cmd_sm, target):
+        key1 = self._req_key(msg, cmd_sm)
+        key2 = (msg.seq_num, cmd.netfn + 1, cmd.cmd)
+        fut1 = self._add_pending(key1, msg)
+        try:
+            # The inner response comes from the target
+            fut2 = self._add_pending(key2, msg, target)
+        except PyIntfExcept:
+            del self.pending[key1]
+            raise
+
+        try:
+            # The 1st response of send message received
+            try:
+                pkt1, _ = await self._wait_rsp(fut1, data, 1)
+                cmd_sm.unpack(pkt1)
+            except PyIntfExcept:
+                # Some BMCs return the wrong seq number in the 1st response.
+                # Wait for the inner one anyway.
+                pass
+
+            # The 2nd response of the inner bridged message received
+            try:
+                pkt2, _ = await self._wait_rsp(fut2, None, 3, self.rtt_bridge)
+            except PyIntfExcept:
+                raise PyIntfTimeoutExcept('Message Bridging times out.')        
+        finally:
+            del self.pending[key1]
+            del self.pending[key2]
+
+        return pkt2
+
+    async def keep_alive_cb(self):
+        while True:
+            if self.wd_count == 0 and self.sess_act:
+                try:
+                    await self.issue_raw_cmd([6, 1])
+                except PyExcept:
+                    pass
+            self.wd_count -= 1
+            await asyncio.sleep(1)
+
+class AsyncRMCPP(AsyncRMCP):
+    MAX_WINDOW = RMCPP.MAX_WINDOW
+
+    # Share the message generation with the blocking interface
+    gen_msg = RMCPP.gen_msg
+
+    def __init__(self, opts, keep_alive=False):
+        super(AsyncRMCPP, self).__init__(opts, keep_alive)
+        self.cipher = (RAKP_NONE, RAKP_NONE, RAKP_NONE)
+        self.k1 = None
+        self.k2 = None
+
+    async def open(self, opts):
+        cipher_suite = opts.get('cipher_suite', 3)        
+        cipher = get_cipher_tuple(cipher_suite)
+        if cipher is None:
+            raise PyIntfExcept('Cipher suite {0} is not supported.'.format(cipher))
+
+        await self._connect(opts)
+
+        user = conv_str2bytes(opts.get('user', None))
+        self.passwd = conv_str2bytes(opts.get('password', None))
+        if self.passwd is not None: self.passwd = struct.pack('20s', self.passwd)
+        priv = opts.get('priv', 4)        
+        self.rcsid = os.urandom(4)
+
+        # Get Channel Authentication Capabilities Command
+        await self.issue_cmd(GetChnlAuthCap, priv)
+
+        # Open Session Request
+        mssid, cipher = await self.issue_cmd(RMCPP_OpenSess, self.rcsid, cipher, priv)
+
+        # RAKP 1, 2
+        rcrn = os.urandom(16)
+        msrn, msguid = await self.issue_cmd(RAKP_1_2, self.rcsid, mssid, rcrn, 
+                                            priv, user, self.passwd, cipher[0])
+
+        # Calculate SIK        
+        if 'kg' not in opts.keys() or opts['kg'] == '':
+            key = self.passwd
+        else:
+            key = conv_str2bytes(opts['kg'])
+            key = struct.pack('20s', key)
+        
+        sik = cal_sik(cipher[0], key, rcrn, msrn, priv, user)
+
+        # RAKP 3, 4
+        await self.issue_cmd(RAKP_3_4, 
+                             self.rcsid, mssid, msrn, rcrn, msguid,
+                             priv, user, self.passwd, cipher[0], sik)
+        
+        self.cipher = cipher
+        self.cipher_suite = cipher_suite
+        self.sess_act = True
+        self.sid = mssid
+
+        # Calculate K1 & K2 by need
+        self.k1, self.k2 = cal_k1_k2(cipher, sik)
+
+        # Set Session Privilege Level Command
+        priv, = await self.issue_cmd(SetSessPriv, priv)
+
+        self._start_keep_alive()
@@ -0,0 +1,310 @@
+#
+# Copyright (c) 2021, Hyve Design Solutions Corporation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are 
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright 
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright 
+#    notice, this list of conditions and the following disclaimer in the 
+#    documentation and/or other materials provided with the distribution.
+#
+# 3. Neither the name of Hyve Design Solutions Corporation nor the names 
+#    of its contributors may be used to endorse or promote products 
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY HYVE DESIGN SOLUTIONS CORPORATION AND 
+# CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, 
+# BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND 
+# FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL 
+# HYVE DESIGN SOLUTIONS CORPORATION OR CONTRIBUTORS BE LIABLE FOR ANY 
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL 
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS 
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) 
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, 
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING 
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+#
+import os, json, socket, socketserver, threading, time
+from .. util import exception
+from .. util.exception import PyExcept, PyIntfExcept, PyIntfSeqExcept, PyIntfTimeoutExcept
+
+from . import Intf
+from .. mesg import IPMI_Raw
+
+# The session parameters.  A session is shared by the requests of the same ones.
+SESS_KEYS = ('interface', 'host', 'port', 'user', 'password', 'auth', 
+             'cipher_suite', 'priv', 'kg')
+
+# Seconds between the keep-alive commands of an idle session
+KEEP_ALIVE_PERIOD = 55
+
+# Command timeouts in a row taken as the session is broken
+SESS_MAX_TIMEOUTS = 3
+
+def get_broker_path():
+    return os.path.join(os.getenv('HOME'), '.config', 'pyipmi', 'broker.sock')
+
+def _send_msg(wfile, obj):
+    wfile.write(json.dumps(obj).encode() + b'\n')
+    wfile.flush()
+
+def _recv_msg(rfile):
+    line = rfile.readline()
+    if not line:  return None
+    return json.loads(line.decode())
+
+def _conv_except(err):
+    # Rebuild the exception raised in the broker
+    cls = getattr(exception, err.get('type', ''), None)
+    if not isinstance(cls, type) or not issubclass(cls, PyExcept):
+        return PyIntfExcept(err.get('msg', 'Unknown error in the session broker.'))
+    return cls(*err.get('args', []))
+
+class BrokerClient(Intf):
+    # Forward the IPMI commands to the session broker
+    def __init__(self, opts):
+        self.path = opts.get('broker', '') or get_broker_path()
+        self.sess = {k: opts[k] for k in SESS_KEYS if k in opts.keys()}
+        self.socket = None
+        self.lock = threading.Lock()
+
+    def __del__(self):
+        self.close()
+
+    def connect(self):
+        # Return False if the session broker is not running
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.socket.connect(self.path)
+        except OSError:
+            self.socket.close()
+            self.socket = None
+            return False
+
+        self.rfile = self.socket.makefile('rb')
+        self.wfile = self.socket.makefile('wb')
+        return True
+
+    def open(self, opts):
+        self.sess.update({k: opts[k] for k in SESS_KEYS if k in opts.keys()})
+
+        if self.socket is None and not self.connect():
+            raise PyIntfExcept('Failed to connect to the session broker.')
+
+        # Bind this connection to a warm session, or open a new one
+        self._call({'op': 'open', 'sess': self.sess})
+
+    def close(self):
+        self.stop_io()
+        try:
+            if self.socket:
+                self.rfile.close()
+                self.wfile.close()
+                self.socket.close()
+                self.socket = None
+        except:
+            pass
+
+    def _call(self, req):
+        with self.lock:
+            _send_msg(self.wfile, req)
+            rsp = _recv_msg(self.rfile)
+
+        if rsp is None:
+            raise PyIntfExcept('The session broker closed the connection.')
+        if 'error' in rsp.keys():
+            raise _conv_except(rsp['error'])
+
+        return rsp.get('rsp', None)
+
+    def _issue(self, netfn, cmd, req):
+        # The latency includes the round trip to the broker
+        t0 = time.time()
+        rsp, timeout = None, False
+        try:
+            rsp = self._call(req)
+            return rsp
+        except PyIntfTimeoutExcept:
+            timeout = True
+            raise
+        finally:
+            if self.stats:
+                cc = rsp[0] if rsp else None
+                self.stats.record(netfn, cmd, time.time() - t0, cc, 0, 0, timeout)
+
+    def issue_cmd(self, cmd_cls, *args):
+        cmd = cmd_cls(*args)
+        req = [cmd.netfn, cmd.cmd]
+        if cmd.req_data is not None:  req += list(cmd.req_data)
+
+        # The broker returns [cc] + rsp_data like IPMI_Raw does
+        rsp = self._issue(cmd.netfn, cmd.cmd, {'op': 'cmd', 'req': req, 'lun': cmd.lun})
+        return cmd.unpack((cmd.netfn + 1, cmd.cmd, rsp[0], bytes(rsp[1:])))
+
+    def issue_raw_cmd(self, req, lun=0):
+        return self.issue_cmd(IPMI_Raw, req, lun)
+
+    def issue_bridging_cmd(self, dest, target, req, lun=0):
+        return self._issue(req[0], req[1], {'op': 'bridge', 'dest': dest, 
+                           'target': target, 'req': list(req), 'lun': lun})
+
+class _Session:
+    def __init__(self):
+        self.intf = None
+        self.last_used = time.time()    # by the clients
+        self.last_sent = time.time()    # by the clients or the keep-alive
+        self.timeouts = 0               # command timeouts in a row
+        self.lock = threading.Lock()    # serialize the open of the session
+
+class BrokerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path=None, idle=600):
+        self.path = path if path else get_broker_path()
+        self.idle = idle
+        self.sessions = {}      # session key => _Session
+        self.sess_lock = threading.Lock()
+
+        path = os.path.dirname(self.path)
+        if path and not os.path.exists(path):
+            os.makedirs(path, 0o755)
+
+        if os.path.exists(self.path):  os.unlink(self.path)
+
+        # Create the socket accessible by the owner only
+        umask = os.umask(0o177)
+        try:
+            super(BrokerServer, self).__init__(self.path, _BrokerHandler)
+        finally:
+            os.umask(umask)
+
+        th = threading.Thread(target=self.reap_cb)
+        th.daemon = True
+        th.start()
+
+    def server_close(self):
+        super(BrokerServer, self).server_close()
+        with self.sess_lock:
+            sessions = list(self.sessions.values())
+            self.sessions.clear()
+
+        for sess in sessions:
+            if sess.intf:  sess.intf.close()
+
+        if os.path.exists(self.path):  os.unlink(self.path)
+
+    def get_session(self, sess_opts):
+        key = tuple(sess_opts.get(k, None) for k in SESS_KEYS)
+        with self.sess_lock:
+            sess = self.sessions.setdefault(key, _Session())
+
+        with sess.lock:
+            if sess.intf is None:
+                # Lazy import to avoid the circular import
+                from . import init
+                intf_name = sess_opts.get('interface', 'lanplus')
+                opts = {'global': {'interface': intf_name}, intf_name: {}}
+                for k, v in sess_opts.items():
+                    if k in ('interface', 'host', 'port'):  opts['global'][k] = v
+                    else:  opts[intf_name][k] = v
+
+                # No keep-alive thread, see reap_cb()
+                sess.intf = init(opts, False, False)
+
+            sess.last_used = sess.last_sent = time.time()
+
+        return key, sess
+
+    def drop_session(self, key, sess=None):
+        # sess: only drop it if still the session of the key
+        with self.sess_lock:
+            cur = self.sessions.get(key, None)
+            if cur is None or (sess is not None and cur is not sess):  return
+            del self.sessions[key]
+
+        if cur.intf:  cur.intf.close()
+
+    def check_session(self, key, sess, e, bridging=False):
+        # Drop the session on the session level errors, so the next request
+        # opens a new one.  A command timeout alone is not, but several in a 
+        # row are.  The bridging timeouts are of the target, not the session.
+        if isinstance(e, PyIntfTimeoutExcept):
+            if bridging:  return
+            sess.timeouts += 1
+            if sess.timeouts < SESS_MAX_TIMEOUTS:  return
+        elif not isinstance(e, PyIntfExcept) or isinstance(e, PyIntfSeqExcept):
+            return
+
+        self.drop_session(key, sess)
+
+    def reap_cb(self):
+        # Close the sessions idle for too long, and keep the others alive
+        while True:
+            time.sleep(10)
+            now = time.time()
+            with self.sess_lock:
+                items = [(k, v) for k, v in self.sessions.items() if v.intf]
+
+            for key, sess in items:
+                if now - sess.last_used > self.idle:
+                    self.drop_session(key, sess)
+                elif now - sess.last_sent >= KEEP_ALIVE_PERIOD:
+                    sess.last_sent = now
+                    try:
+                        sess.intf.issue_raw_cmd([6, 1])     # Get Device ID
+                    except PyExcept as e:
+                        self.check_session(key, sess, e)
+
+class _BrokerHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        # The options of the session bound to the connection.  The session is
+        # fetched for each request, so a dropped one is opened again.
+        sess_opts = None
+
+        while True:
+            try:
+                req = _recv_msg(self.rfile)
+            except ValueError:
+                break
+            if req is None:  break
+
+            key, sess = None, None
+            try:
+                op = req.get('op', '')
+                if op == 'open':
+                    self.server.get_session(req['sess'])
+                    sess_opts = req['sess']
+                    rsp = None
+                elif sess_opts is None:
+                    raise PyIntfExcept('No session is bound to the connection.')
+                elif op == 'cmd':
+                    key, sess = self.server.get_session(sess_opts)
+                    rsp = sess.intf.issue_raw_cmd(req['req'], req.get('lun', 0))
+                    sess.timeouts = 0
+                elif op == 'bridge':
+                    key, sess = self.server.get_session(sess_opts)
+                    rsp = sess.intf.issue_bridging_cmd(req['dest'], req['target'],
+                                                       req['req'], req.get('lun', 0))
+                else:
+                    raise PyIntfExcept('Unknown broker request: {0}.'.format(op))
+
+                _send_msg(self.wfile, {'rsp': rsp})
+
+            except PyExcept as e:
+                if sess is not None:
+                    self.server.check_session(key, sess, e, op == 'bridge')
+
+                args = [x for x in e.args if isinstance(x, (int, str))]
+                if len(args) != len(e.args):  args = [str(e)]
+                err = {'type': type(e).__name__, 'args': args, 'msg': str(e)}
+                _send_msg(self.wfile, {'error': err})
+
+            except (KeyError, TypeError):
+                err = {'type': 'PyIntfExcept', 'args': ['Invalid broker request.']}
+                _send_msg(self.wfile, {'error': err})
@@ -30,12 +30,13 @@
 # IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
 # POSSIBILITY OF SUCH DAMAGE.
 #
-import ctypes, fcntl, os, select, struct, sys
+import ctypes, fcntl, os, select, struct, time, threading, queue
+from concurrent.futures import Future, TimeoutError as FutureTimeout
 from . ioctl import IOR, IOWR
 from . import Intf
+from . _rtt import new_rtt_estimator
 from .. mesg import IPMI_Raw
-from .. mesg.ipmi_app import IPMI_SendMsg
-from .. util.exception import PyIntfExcept, PyIntfSeqExcept
+from .. util.exception import PyExcept, PyIntfExcept, PyIntfTimeoutExcept
 
 class ipmi_addr(ctypes.Structure):
     _fields_ = [
@@ -84,20 +85,64 @@ class ipmi_recv(ctypes.Structure):
             ('msg', ipmi_msg),
     ]
 
+# recv_type of ipmi_recv
+IPMI_RESPONSE_RECV_TYPE = 1
+IPMI_ASYNC_EVENT_RECV_TYPE = 2
+
+IPMI_SYSTEM_INTERFACE_ADDR_TYPE = 0x0c
+IPMI_IPMB_ADDR_TYPE	= 0x01
+IPMI_BMC_CHANNEL = 0x0f
+IPMI_MAX_ADDR_SIZE = 0x20
+IPMI_BUF_SIZE = 1024
+
+# ioctl commands
+IPMICTL_RECEIVE_MSG_TRUNC = IOWR('i', 11, ctypes.sizeof(ipmi_recv))
+IPMICTL_SEND_COMMAND = IOR('i', 13, ctypes.sizeof(ipmi_req))
+IPMICTL_SET_GETS_EVENTS_CMD = IOR('i', 16, ctypes.c_int)
+IPMICTL_SET_MY_ADDRESS_CMD = IOR('i', 17, ctypes.c_uint)
+
 class KCS(Intf):
+    MAX_EVENTS = 1024
+    # Max number of msgids outstanding in a batch
+    MAX_WINDOW = 16
     def __init__(self, opts):
         self.fd = None
         self.msgid = 1
+        self.window = 1
+        self.set_window(opts.get('window', 1))
         self.my_addr = opts.get('bmc_addr', 0x20)
         self.dev_num = opts.get('dev_num', 0)
+        self.rtt = new_rtt_estimator(opts, 3000, 1000, 10000)
+
+        # The requests in flight: msgid => future of the response
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.reading = False
+        self.reader = None
+
+        # The asynchronous events received, in the 16-byte SEL record format
+        self.events_q = queue.Queue(KCS.MAX_EVENTS)
+
+        # Reuse the ctypes buffers of the requests.  Guarded by send_lock.
+        self.send_lock = threading.Lock()
+        self.si_addr = ipmi_si_addr(IPMI_SYSTEM_INTERFACE_ADDR_TYPE, IPMI_BMC_CHANNEL, 0)
+        self.ipmb_addr = ipmi_ipmb_addr(IPMI_IPMB_ADDR_TYPE, 0, 0, 0)
+        self.req_buf = (ctypes.c_ubyte * IPMI_BUF_SIZE)()
+        self.req = ipmi_req(0, 0, 0, ipmi_msg(0, 0, 0, ctypes.addressof(self.req_buf)))
+        self.req_msg = self.req.msg
+
+        # Reuse the ctypes buffers of the responses.  Only used by the reader.
+        self.recv_addr = ctypes.create_string_buffer(IPMI_MAX_ADDR_SIZE)
+        self.recv_buf = (ctypes.c_ubyte * IPMI_BUF_SIZE)()
+        self.recv_view = memoryview(self.recv_buf).cast('B')
+        self.recv_req = ipmi_recv(0, ctypes.addressof(self.recv_addr), IPMI_MAX_ADDR_SIZE, 0, 
+                                  ipmi_msg(0, 0, IPMI_BUF_SIZE, ctypes.addressof(self.recv_buf)))
+        self.recv_msg = self.recv_req.msg
 
     def __del__(self):
         self.close()
 
     def open(self):
-        IPMICTL_SET_GETS_EVENTS_CMD = IOR('i', 16, ctypes.c_int)
-        IPMICTL_SET_MY_ADDRESS_CMD = IOR('i', 17, ctypes.c_uint)
-
         DEV_STRS = ('/dev/ipmi', '/dev/ipmi/', '/dev/ipmidev/')
         ipmi_devs = ['{0}{1}'.format(dev, self.dev_num) for dev in DEV_STRS]
 
@@ -129,97 +174,257 @@ class KCS(Intf):
                 print('Could not set IPMB address')
                 return -1
 
+        self._start_reader()
         return 0
 
     def close(self):
+        self.stop_io()
         try:
+            self._stop_reader()
+            self._fail_all(PyIntfExcept('The device is closed.'))
             if self.fd:
                 os.close(self.fd)
                 self.fd = None
         except:
             pass
 
-    def sendrecv(self, req):
-        IPMICTL_SEND_COMMAND = IOR('i', 13, ctypes.sizeof(ipmi_req))
-        IPMICTL_RECEIVE_MSG_TRUNC = IOWR('i', 11, ctypes.sizeof(ipmi_recv))
+    def _start_reader(self):
+        self.reading = True
+        self.reader = threading.Thread(target=self.reader_cb)
+        self.reader.daemon = True
+        self.reader.start()
+
+    def _stop_reader(self):
+        self.reading = False
+        if self.reader and self.reader is not threading.current_thread():
+            self.reader.join()
+        self.reader = None
+
+    def _fail_all(self, exc):
+        with self.lock:
+            futs = list(self.pending.values())
+            self.pending.clear()
+
+        for fut in futs:
+            if not fut.done():  fut.set_exception(exc)
+
+    def recv(self):
+        # receive command response
+        recv, msg = self.recv_req, self.recv_msg
+        recv.addr_len = IPMI_MAX_ADDR_SIZE
+        msg.data_len = IPMI_BUF_SIZE
+        fcntl.ioctl(self.fd, IPMICTL_RECEIVE_MSG_TRUNC, recv)
+
+        # The buffer is reused.  Copy the data out once.
+        data_len = msg.data_len
+        if recv.recv_type == IPMI_ASYNC_EVENT_RECV_TYPE:
+            # The event message has no completion code
+            return (recv.recv_type, recv.msgid, bytes(self.recv_view[:data_len]))
+
+        # compose the response message
+        cc = self.recv_view[0]
+        if data_len > 0:
+            rsp_data = bytes(self.recv_view[1:data_len])
+            rsp = [msg.netfn, msg.cmd, cc, rsp_data]
+        else:
+            rsp = [msg.netfn, msg.cmd, cc]
+
+        return (recv.recv_type, recv.msgid, rsp)
+
+    def reader_cb(self):
+        # The only reader of the device.  Route the responses by msgid.
+        while self.reading:
+            try:
+                r, _, x = select.select([self.fd], [], [], 0.2)
+                if x:  raise OSError('select() exception occurred.')
+                if not r:  continue
+
+                recv_type, msgid, rsp = self.recv()
+            except (OSError, ValueError, TypeError) as e:
+                if not self.reading:  break
+                self._fail_all(PyIntfExcept('Failed to receive the response: {0}'.format(e)))
+                time.sleep(0.2)
+                continue
+
+            if recv_type == IPMI_ASYNC_EVENT_RECV_TYPE:
+                if len(rsp) < 16:  continue
+                if self.events_q.full():
+                    # Drop the oldest one
+                    try:
+                        self.events_q.get_nowait()
+                    except queue.Empty:
+                        pass
+                self.events_q.put_nowait(rsp[:16])
+                continue
+
+            with self.lock:
+                fut = self.pending.pop(msgid, None)
+
+            # Drop the messages nobody is waiting for, e.g. events
+            if fut and not fut.done():  fut.set_result(rsp)
+
+    def send(self, cmd, bridging=False, dest=0, target=0):
+        # Send the request and return (msgid, future of its response)
+        if self.reader is None:
+            raise PyIntfExcept('The device is not opened.')
+
+        fut = Future()
+        with self.send_lock:
+            req = self.gen_msg(cmd, bridging, dest, target)
+            msgid = req.msgid
+            with self.lock:
+                self.pending[msgid] = fut
+
+            try:
+                # send command request
+                fcntl.ioctl(self.fd, IPMICTL_SEND_COMMAND, req)
+            except:
+                with self.lock:
+                    self.pending.pop(msgid, None)
+                raise
+
+        return (msgid, fut)
 
-        # send command request
-        fcntl.ioctl(self.fd, IPMICTL_SEND_COMMAND, req)
+    def sendrecv(self, cmd, bridging=False, dest=0, target=0):
+        t0 = time.time()
+        msgid, fut = self.send(cmd, bridging, dest, target)
+        return self.wait_rsp(cmd, msgid, fut, t0)
 
+    def wait_rsp(self, cmd, msgid, fut, t0):
         # wait for response
-        while True:
-            r, _, x = select.select([self.fd], [], [], 3)
-            if x: raise PyIntfExcept('select() exception occurred.')
-            if r: 
-                # receive response
-                IPMI_MAX_ADDR_SIZE = 0x20
-                IPMI_BUF_SIZE = 1024
-
-                addr = ipmi_addr(0, 0, ctypes.addressof(ctypes.create_string_buffer(IPMI_MAX_ADDR_SIZE)))
-                addr_len = ctypes.sizeof(addr) + IPMI_MAX_ADDR_SIZE - ctypes.sizeof(ctypes.c_char_p)
-                data = ctypes.create_string_buffer(IPMI_BUF_SIZE)
-                recv = ipmi_recv(0, ctypes.addressof(addr), addr_len, 0, 
-                                 ipmi_msg(0, 0, IPMI_BUF_SIZE, ctypes.addressof(data)))
-
-                # receive command response
-                fcntl.ioctl(self.fd, IPMICTL_RECEIVE_MSG_TRUNC, recv)
-
-                # check message ID
-                if recv.msgid != req.msgid:
+        # The driver handles the retries.  Just back off once before giving up.
+        rsp = None
+        try:
+            for attempt in range(2):
+                try:
+                    rsp = fut.result(self.rtt.timeout(attempt))
+                except FutureTimeout:
                     continue
 
-                # compose the response message
-                cc = data.raw[0]
-                if recv.msg.data_len > 0:
-                    rsp_data = data.raw[1:recv.msg.data_len]
-                    rsp = [recv.msg.netfn, recv.msg.cmd, cc, rsp_data]
-                else:
-                    rsp = [recv.msg.netfn, recv.msg.cmd, cc]
-
+                with self.lock:
+                    self.rtt.update(time.time() - t0)
                 return rsp
 
-            else:
-                # select() times out
-                raise PyIntfExcept('Times out.  Host has no response.')
+            with self.lock:
+                self.pending.pop(msgid, None)
+            raise PyIntfTimeoutExcept('Times out.  Host has no response.')
 
-    def gen_msg(self, cmd, bridging=False, dest=0, target=0):        
-        IPMI_SYSTEM_INTERFACE_ADDR_TYPE = 0x0c
-        IPMI_IPMB_ADDR_TYPE	= 0x01
-        IPMI_BMC_CHANNEL = 0x0f
+        finally:
+            if self.stats:
+                cc = rsp[2] if rsp else None
+                self.stats.record(cmd.netfn, cmd.cmd, time.time() - t0, cc, 0, 0, 
+                                  not fut.done())
 
-        if not bridging:
-            bmc_addr = ipmi_si_addr(IPMI_SYSTEM_INTERFACE_ADDR_TYPE, IPMI_BMC_CHANNEL, cmd.lun)
-        else:
-            bmc_addr = ipmi_ipmb_addr(IPMI_IPMB_ADDR_TYPE, dest, target, cmd.lun)
+    def events(self, timeout=None, sensor_map=None):
+        # Yield the platform events from the BMC as they are received, as 
+        # (sel1, decoded).  Stop if no event in timeout seconds.
+        # sel1: the event in the format of Get SEL Entry
+        # decoded: the event decoded by cmds._sel.conv_sel_entry()
+        from .. cmds._sel import conv_sel_entry
 
-        if cmd.req_data:
-            req_len = len(cmd.req_data)
-            req_data = cmd.req_data
-        else:
-            req_len = 0
-            req_data = bytes([])
+        while True:
+            try:
+                data = self.events_q.get(timeout=timeout)
+            except queue.Empty:
+                return
+
+            sel1 = struct.unpack('<HBLHBBBBBBB', data)
+            yield (sel1, conv_sel_entry(sel1, sensor_map))
 
-        msg = ipmi_msg(cmd.netfn, cmd.cmd, req_len, req_data)
-        req = ipmi_req(ctypes.addressof(bmc_addr), ctypes.sizeof(bmc_addr), self.msgid, msg)
-        self.msgid += 1
-        if self.msgid == 0xffff:    self.msgid = 1
+    async def async_events(self, timeout=None, sensor_map=None):
+        # Async generator version of events()
+        import asyncio
+        loop = asyncio.get_event_loop()
+        events = self.events(timeout, sensor_map)
+
+        while True:
+            event = await loop.run_in_executor(None, next, events, None)
+            if event is None:  return
+            yield event
+
+    def gen_msg(self, cmd, bridging=False, dest=0, target=0):        
+        # Fill the request buffers.  The caller holds send_lock.
+        if not bridging:
+            bmc_addr = self.si_addr
+        else:
+            bmc_addr = self.ipmb_addr
+            bmc_addr.channel = dest
+            bmc_addr.slave_addr = target
+        bmc_addr.lun = cmd.lun
+
+        req_len = len(cmd.req_data) if cmd.req_data else 0
+        if req_len > IPMI_BUF_SIZE:
+            raise PyIntfExcept('Request data exceeds max length.')
+        if req_len:  ctypes.memmove(self.req_buf, cmd.req_data, req_len)
+
+        req, msg = self.req, self.req_msg
+        req.addr = ctypes.addressof(bmc_addr)
+        req.addr_len = ctypes.sizeof(bmc_addr)
+        msg.netfn = cmd.netfn
+        msg.cmd = cmd.cmd
+        msg.data_len = req_len
+
+        with self.lock:
+            # Skip the msgids still in flight
+            while self.msgid in self.pending:
+                self.msgid += 1
+                if self.msgid == 0xffff:    self.msgid = 1
+
+            req.msgid = self.msgid
+            self.msgid += 1
+            if self.msgid == 0xffff:    self.msgid = 1
 
         return req
 
     def issue_bridging_cmd(self, dest, target, req, lun=0):
         cmd = IPMI_Raw(req, lun)
-        msg = self.gen_msg(cmd, True, dest, target)
-        rsp = self.sendrecv(msg)
+        rsp = self.sendrecv(cmd, True, dest, target)
 
         return cmd.unpack(rsp)
 
     def issue_cmd(self, cmd_cls, *args):
         cmd = cmd_cls(*args)
-        msg = self.gen_msg(cmd)
-        rsp = self.sendrecv(msg)
+        rsp = self.sendrecv(cmd)
 
         return cmd.unpack(rsp)
 
+    def set_window(self, window):
+        self.window = min(max(window, 1), self.MAX_WINDOW)
+
+    def issue_batch(self, reqs):
+        # reqs: a list of (cmd_cls, args) or raw requests
+        # Keep up to self.window msgids outstanding.  Return the responses in
+        # the same order.  A failed request has the exception in its place.
+        cmds = self.conv_batch(reqs)
+        rsps = [None] * len(cmds)
+        sent = []    # [index, cmd, msgid, future, t0]
+
+        i = 0
+        while i < len(cmds) or sent:
+            while i < len(cmds) and len(sent) < self.window:
+                cmd_cls, args = cmds[i]
+                try:
+                    cmd = cmd_cls(*args)
+                    t0 = time.time()
+                    msgid, fut = self.send(cmd)
+                    sent.append([i, cmd, msgid, fut, t0])
+                except PyExcept as e:
+                    rsps[i] = e
+                except OSError as e:
+                    rsps[i] = PyIntfExcept('Failed to send the request: {0}'.format(e))
+                i += 1
+
+            if not sent:  continue
+
+            # Responses complete in any order, but they are collected in order
+            idx, cmd, msgid, fut, t0 = sent.pop(0)
+            try:
+                rsps[idx] = cmd.unpack(self.wait_rsp(cmd, msgid, fut, t0))
+            except PyExcept as e:
+                rsps[idx] = e
+
+        return rsps
+
     def issue_raw_cmd(self, req, lun=0):        
         return self.issue_cmd(IPMI_Raw, req, lun)
 
@@ -0,0 +1,281 @@
+#
+# Copyright (c) 2021, Hyve Design Solutions Corporation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are 
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright 
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright 
+#    notice, this list of conditions and the following disclaimer in the 
+#    documentation and/or other materials provided with the distribution.
+#
+# 3. Neither the name of Hyve Design Solutions Corporation nor the names 
+#    of its contributors may be used to endorse or promote products 
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY HYVE DESIGN SOLUTIONS CORPORATION AND 
+# CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, 
+# BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND 
+# FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL 
+# HYVE DESIGN SOLUTIONS CORPORATION OR CONTRIBUTORS BE LIABLE FOR ANY 
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL 
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS 
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) 
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, 
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING 
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+#
+import gzip, json, struct, threading, time
+from .. util import exception
+from .. util.exception import PyExcept, PyIntfExcept, PyIntfTimeoutExcept
+
+from . import Intf
+from .. mesg import IPMI_Raw
+
+# Record the IPMI traffic of a session and replay it later without the BMC
+# The file has a header and the entries of the requests in the order issued:
+#   magic (8) | meta len (2) | meta (JSON)
+#   kind | netfn | cmd | lun | dest | target | latency in us (4) | status |
+#   req len (2) | rsp len (2) | req data | rsp
+# rsp is cc + rsp data, or the exception raised in JSON if status is not 0.
+# A file named *.gz is compressed.
+REPLAY_MAGIC = b'PYIPMIR\x01'
+
+KIND_CMD = 0
+KIND_BRIDGING = 1
+
+STATUS_OK = 0
+STATUS_EXCEPT = 1
+
+_ENTRY = struct.Struct('<BBBBBBLBHH')
+
+def _open_file(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode)
+    return open(path, mode)
+
+def _conv_except(err):
+    # Rebuild the exception recorded
+    cls = getattr(exception, err.get('type', ''), None)
+    if not isinstance(cls, type) or not issubclass(cls, PyExcept):
+        return PyIntfExcept(err.get('msg', 'Unknown error recorded.'))
+    try:
+        return cls(*err.get('args', []))
+    except TypeError:
+        # The args were stringified when recorded
+        return PyIntfExcept(err.get('msg', 'Unknown error recorded.'))
+
+def _raw_req(cmd):
+    # The raw request of a command object
+    return [cmd.netfn, cmd.cmd] + list(cmd.req_data or b'')
+
+def _unpack_raw(cmd, rsp):
+    # Let the command object decode the response of its raw request
+    return cmd.unpack((cmd.netfn + 1, cmd.cmd, rsp[0], bytes(rsp[1:])))
+
+class Record_Intf(Intf):
+    # Forward the commands to intf and record the responses to path
+    def __init__(self, intf, path):
+        self.intf = intf
+        self.lock = threading.Lock()
+        self.file = None
+        self.file = _open_file(path, 'wb')
+
+        meta = {
+            'version': 1, 
+            'interface': type(intf).__name__, 
+            'cipher_suite': getattr(intf, 'cipher_suite', None),
+            'time': time.time(),
+        }
+        meta = json.dumps(meta).encode()
+        self.file.write(REPLAY_MAGIC + struct.pack('<H', len(meta)) + meta)
+
+    def __del__(self):
+        self.close()
+
+    def __getattr__(self, name):
+        # The other attributes are the ones of the interface recorded
+        if name == 'intf':  raise AttributeError(name)
+        return getattr(self.intf, name)
+
+    def open(self, opts):
+        self.intf.open(opts)
+
+    def close(self):
+        self.stop_io()
+        with self.lock:
+            if self.file:
+                self.file.close()
+                self.file = None
+        self.intf.close()
+
+    def ping(self):
+        self.intf.ping()
+
+    # The stats are of the interface recorded
+    def enable_stats(self, enable=True):
+        self.intf.enable_stats(enable)
+
+    def get_stats(self):
+        return self.intf.get_stats()
+
+    def reset_stats(self):
+        self.intf.reset_stats()
+
+    def record(self, kind, req, lun, dest, target, lat, rsp):
+        # rsp: the raw response, or the exception raised
+        if isinstance(rsp, PyExcept):
+            # Only the args of int or str are kept, as the broker does
+            status = STATUS_EXCEPT
+            args = [x for x in rsp.args if isinstance(x, (int, str))]
+            if len(args) != len(rsp.args):  args = [str(rsp)]
+            rsp = json.dumps({'type': type(rsp).__name__, 'args': args,
+                              'msg': str(rsp)}).encode()
+        else:
+            status = STATUS_OK
+            rsp = bytes(rsp)
+
+        req_data = bytes(req[2:])
+        hdr = _ENTRY.pack(kind, req[0], req[1], lun, dest, target, 
+                          min(int(lat * 1000000), 0xffffffff), status, 
+                          len(req_data), len(rsp))
+        with self.lock:
+            if self.file:  self.file.write(hdr + req_data + rsp)
+
+    def _issue_raw(self, kind, req, lun, dest=0, target=0):
+        t0 = time.time()
+        try:
+            if kind == KIND_BRIDGING:
+                rsp = self.intf.issue_bridging_cmd(dest, target, req, lun)
+            else:
+                rsp = self.intf.issue_raw_cmd(req, lun)
+        except PyExcept as e:
+            self.record(kind, req, lun, dest, target, time.time() - t0, e)
+            raise
+
+        self.record(kind, req, lun, dest, target, time.time() - t0, rsp)
+        return rsp
+
+    def issue_cmd(self, cmd_cls, *args):
+        cmd = cmd_cls(*args)
+        rsp = self._issue_raw(KIND_CMD, _raw_req(cmd), cmd.lun)
+        return _unpack_raw(cmd, rsp)
+
+    def issue_raw_cmd(self, req, lun=0):
+        return self._issue_raw(KIND_CMD, list(req), lun)
+
+    def issue_bridging_cmd(self, dest, target, req, lun=0):
+        return self._issue_raw(KIND_BRIDGING, list(req), lun, dest, target)
+
+    def issue_batch(self, reqs):
+        # Issue the batch to the interface as raw requests.  The latency of
+        # each one is the share of the batch.
+        cmds = []
+        for cmd_cls, args in self.conv_batch(reqs):
+            try:
+                cmds.append(cmd_cls(*args))
+            except PyExcept as e:
+                cmds.append(e)
+
+        raw_reqs = [(IPMI_Raw, (_raw_req(x), x.lun)) for x in cmds 
+                    if not isinstance(x, PyExcept)]
+        t0 = time.time()
+        raw_rsps = iter(self.intf.issue_batch(raw_reqs))
+        lat = (time.time() - t0) / max(len(raw_reqs), 1)
+
+        rsps = []
+        for cmd in cmds:
+            if isinstance(cmd, PyExcept):
+                rsps.append(cmd)
+                continue
+
+            rsp = next(raw_rsps)
+            self.record(KIND_CMD, _raw_req(cmd), cmd.lun, 0, 0, lat, rsp)
+            try:
+                rsps.append(rsp if isinstance(rsp, PyExcept) else _unpack_raw(cmd, rsp))
+            except PyExcept as e:
+                rsps.append(e)
+
+        return rsps
+
+class Replay_Intf(Intf):
+    # Serve the responses recorded by Record_Intf
+    # speed: 1 at the recorded latencies, N times faster, or 0 without delay
+    # The same requests get their responses in the recorded order, and from
+    # the first one again after all are served.
+    def __init__(self, path, speed=1):
+        self.speed = speed
+        self.lock = threading.Lock()
+        self.rsps = {}      # (kind, netfn, cmd, lun, dest, target, req data) => [next, entries]
+        self.meta = {}
+        self.load(path)
+
+        # The lan print command compares the cipher suite of the session
+        self.cipher_suite = self.meta.get('cipher_suite', None)
+
+    def load(self, path):
+        with _open_file(path, 'rb') as f:
+            data = f.read()
+
+        if data[:8] != REPLAY_MAGIC:
+            raise PyIntfExcept('Invalid replay file: ' + path)
+
+        meta_len, = struct.unpack('<H', data[8:10])
+        self.meta = json.loads(data[10:10 + meta_len].decode())
+
+        pos = 10 + meta_len
+        while pos < len(data):
+            if pos + _ENTRY.size > len(data):
+                raise PyIntfExcept('Truncated replay file: ' + path)
+            kind, netfn, cmd, lun, dest, target, lat, status, req_len, rsp_len = \
+                    _ENTRY.unpack_from(data, pos)
+            pos += _ENTRY.size
+            req_data = data[pos:pos + req_len]
+            pos += req_len
+            rsp = data[pos:pos + rsp_len]
+            pos += rsp_len
+
+            if status != STATUS_OK:
+                rsp = json.loads(rsp.decode())
+            key = (kind, netfn, cmd, lun, dest, target, req_data)
+            self.rsps.setdefault(key, [0, []])[1].append((lat / 1000000, status, rsp))
+
+    def ping(self):
+        pass
+
+    def replay(self, kind, req, lun, dest=0, target=0):
+        key = (kind, req[0], req[1], lun, dest, target, bytes(req[2:]))
+        with self.lock:
+            ent = self.rsps.get(key, None)
+            if ent is None:
+                raise PyIntfExcept('No response recorded: NetFn={0:02X}h, CMD={1:02X}h.'
+                                   .format(req[0], req[1]))
+            lat, status, rsp = ent[1][ent[0]]
+            ent[0] = (ent[0] + 1) % len(ent[1])
+
+        if self.speed:  time.sleep(lat / self.speed)
+        if status != STATUS_OK:
+            e = _conv_except(rsp)
+            if self.stats:
+                self.stats.record(req[0], req[1], lat, None, 0, 0, 
+                                  isinstance(e, PyIntfTimeoutExcept))
+            raise e
+
+        # The latencies recorded, regardless of the replay speed
+        if self.stats:  self.stats.record(req[0], req[1], lat, rsp[0])
+        return list(rsp)
+
+    def issue_cmd(self, cmd_cls, *args):
+        cmd = cmd_cls(*args)
+        return _unpack_raw(cmd, self.replay(KIND_CMD, _raw_req(cmd), cmd.lun))
+
+    def issue_raw_cmd(self, req, lun=0):
+        return self.replay(KIND_CMD, req, lun)
+
+    def issue_bridging_cmd(self, dest, target, req, lun=0):
+        return self.replay(KIND_BRIDGING, req, lun, dest, target)
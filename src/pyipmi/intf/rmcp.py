@@ -31,11 +31,13 @@
 # POSSIBILITY OF SUCH DAMAGE.
 #
 import os, struct, socket, select, threading, time
-from .. util.exception import PyIntfExcept, PyIntfSeqExcept
+from .. util.exception import PyExcept, PyIntfExcept, PyIntfSeqExcept, PyIntfTimeoutExcept
 
 from . import Intf
 
 from . _rmcp_msg import ASF_Ping, IPMI15_Message
+from . _rtt import RTT_Estimator, new_rtt_estimator
+from . _seq import Seq_Allocator
 from . _crypto import RMCP_AUTHS, AUTH_NONE, conv_str2bytes
 
 from .. mesg import IPMI_Raw
@@ -45,8 +47,17 @@ from .. mesg.ipmi_app import IPMI_SendMsg, GetChnlAuthCap,\
 class RMCP_Ping(Intf):
     def __init__(self, opts):
         self.socket = None
+        self.attempt = 0    # the retries of the last request
         self.host = opts.get('host', 'localhost')
         self.port = opts.get('port', 623)
+        self.rtt = RTT_Estimator()
+        self.ping_seq = Seq_Allocator(0xff)
+
+        # Packet capture
+        self.cap_path = ''
+        self.cap_clear_path = ''
+        self.cap = None
+        self.cap_clear = None
 
     def __del__(self):
         self.close()
@@ -58,6 +69,9 @@ class RMCP_Ping(Intf):
         except:
             raise PyIntfExcept("Failed to connect to host.")
 
+        if self.cap_path or self.cap_clear_path:
+            self.open_capture()
+
     def close(self):
         try:
             if self.socket:
@@ -65,27 +79,84 @@ class RMCP_Ping(Intf):
                 self.socket = None
         except:
             pass
+        finally:
+            self.close_capture()
+
+    def set_capture(self, path, clear_path=''):
+        # Capture the datagrams to the pcap file path, and the decrypted 
+        # RMCP+ messages to clear_path.  Either can be empty.
+        # Takes effect when the socket is opened.
+        self.cap_path = path
+        self.cap_clear_path = clear_path
+        if self.socket:
+            self.close_capture()
+            self.open_capture()
+
+    def open_capture(self):
+        from . _pcap import Pcap_Writer
+        local = self.socket.getsockname()
+        remote = self.socket.getpeername()
+        try:
+            if self.cap_path:
+                self.cap = Pcap_Writer(self.cap_path, local, remote)
+            if self.cap_clear_path:
+                self.cap_clear = Pcap_Writer(self.cap_clear_path, local, remote)
+        except PyIntfExcept:
+            self.close_capture()
+            raise
+        except OSError as e:
+            self.close_capture()
+            raise PyIntfExcept('Failed to open the capture file: {0}'.format(e))
+
+    def close_capture(self):
+        cap, cap_clear = self.cap, self.cap_clear
+        self.cap = self.cap_clear = None
+        if cap:  cap.close()
+        if cap_clear:  cap_clear.close()
+
+    def send_pkt(self, data):
+        self.socket.send(data)
+        if self.cap:  self.cap.write(data, True)
+
+    def recv_pkt(self):
+        rsp = self.socket.recv(4096)
+        if self.cap:  self.cap.write(rsp, False)
+        return rsp
+
+    def set_timeouts(self, opts):
+        self.rtt = new_rtt_estimator(opts)
 
     def sendrecv(self, data, retries=3):
-        while retries:
-            self.socket.send(data)
-            r, _, x = select.select([self.socket], [], [], 1.5)
+        for attempt in range(retries):
+            self.attempt = attempt
+            t0 = time.time()
+            self.send_pkt(data)
+            r, _, x = select.select([self.socket], [], [], self.rtt.timeout(attempt))
             if x:  raise PyIntfExcept('Socket exception occurred.  Stopped.')
-            if r:  return self.socket.recv(4096)
-            retries -= 1
+            if r:  
+                # Only sample the RTT of the requests not retransmitted
+                if attempt == 0:  self.rtt.update(time.time() - t0)
+                return self.recv_pkt()
 
-        raise PyIntfExcept('Times out.  Host has no response.')
+        raise PyIntfTimeoutExcept('Times out.  Host has no response.')
 
     def ping(self):
-        ping = ASF_Ping()
+        ping = ASF_Ping(self.ping_seq.alloc())
         msg = ping.pack()
-        rsp = self.sendrecv(msg)
+        try:
+            rsp = self.sendrecv(msg)
+        finally:
+            self.ping_seq.release(ping.seq_num)
         if len(rsp) != 28:
             raise PyIntfExcept('Host responded improperly.')
 
 class RMCP(RMCP_Ping):
     KEEP_ALIVE_PERIOD = 55
 
+    # The BMC accepts session sequence numbers up to 8 lower than the highest
+    # one received in IPMI v1.5, which bounds the requests out of order
+    MAX_WINDOW = 8
+
     def __init__(self, opts, keep_alive):
         self.auth = AUTH_NONE
         self.sseq = 0
@@ -95,8 +166,11 @@ class RMCP(RMCP_Ping):
         self.keep_alive = keep_alive
         self.wd_count = RMCP.KEEP_ALIVE_PERIOD
         self.lock = threading.Lock()
+        self.window = 1
+        self.rq_seq = Seq_Allocator(64)
         
         super(RMCP, self).__init__(opts)
+        self.rtt_bridge = RTT_Estimator()
 
     def __del__(self):
         self.close()
@@ -106,12 +180,15 @@ class RMCP(RMCP_Ping):
             raise PyIntfExcept('Authentication algorithm {0} is not supported.'
                                  .format(opts['auth']))
 
+        self.set_capture(opts.get('capture', ''))
         super(RMCP, self).open()
 
         user = conv_str2bytes(opts.get('user', None))
         self.passwd = conv_str2bytes(opts.get('password', None))
         priv = opts.get('priv', 4)        
         self.ioseq = 0
+        self.set_window(opts.get('window', 1))
+        self.set_timeouts(opts)
 
         no_ping = opts.get('no_ping', False)
         if not no_ping:        
@@ -145,6 +222,7 @@ class RMCP(RMCP_Ping):
             th.start()
 
     def close(self):
+        self.stop_io()
         try:
             if self.sess_act:
                 # Close Session Command
@@ -155,25 +233,38 @@ class RMCP(RMCP_Ping):
         finally:
             super(RMCP, self).close() # close socket
 
-    def recv(self):
-        r, _, x = select.select([self.socket], [], [], 1.5)
+    def set_timeouts(self, opts):
+        super(RMCP, self).set_timeouts(opts)
+
+        # The responses of bridged requests have their own RTT
+        self.rtt_bridge = new_rtt_estimator(opts)
+
+    def recv(self, timeout=None):
+        if timeout is None:  timeout = self.rtt.timeout()
+        r, _, x = select.select([self.socket], [], [], timeout)
         if x:   raise PyIntfExcept('Socket exception occurred.  Stopped.')
-        if r:   return self.socket.recv(4096)
+        if r:   return self.recv_pkt()
         return None
 
     def gen_msg(self, cmd, bridging=False, dest=0, target=0):
-        msg = IPMI15_Message(self.auth, self.sseq, self.sid, self.passwd)
-
-        if bridging:
-            # Message bridging
-            inner = msg._pack_lan_payload(cmd, target)
-            sm = IPMI_SendMsg(dest, inner)
-            data = msg.pack(sm)
-            ret = (msg, data, sm)
-        else:
-            # Common IPMI commands
-            data = msg.pack(cmd)
-            ret = (msg, data)
+        # The caller releases msg.seq_num after the response is received
+        msg = IPMI15_Message(self.auth, self.sseq, self.sid, self.passwd, 
+                             self.rq_seq.alloc())
+
+        try:
+            if bridging:
+                # Message bridging
+                inner = msg._pack_lan_payload(cmd, target)
+                sm = IPMI_SendMsg(dest, inner)
+                data = msg.pack(sm)
+                ret = (msg, data, sm)
+            else:
+                # Common IPMI commands
+                data = msg.pack(cmd)
+                ret = (msg, data)
+        except:
+            self.rq_seq.release(msg.seq_num)
+            raise
 
         return ret
 
@@ -192,25 +283,40 @@ class RMCP(RMCP_Ping):
                 self.sseq = 1
 
         msg, data = self.gen_msg(cmd)
-        rsp = self.sendrecv(data)
-
+        t0 = time.time()
+        seq_errs = 0
+        timeout = False
         try:
-            return self.unpack(rsp, msg, cmd)   
+            rsp = self.sendrecv(data)
+
+            try:
+                return self.unpack(rsp, msg, cmd)   
+
+            except PyIntfSeqExcept:
+                # The response mismatches the request
+                # Check the next response message
+                seq_errs += 1
+                retries = 2
+                while retries:
+                    try:
+                        rsp = self.recv()
+                        if rsp: return self.unpack(rsp, msg, cmd)
 
-        except PyIntfSeqExcept:
-            # The response mismatches the request
-            # Check the next response message
-            retries = 2
-            while retries:
-                try:
-                    rsp = self.recv()
-                    if rsp: return self.unpack(rsp, msg, cmd)
+                    except PyIntfSeqExcept:
+                        seq_errs += 1
 
-                except PyIntfSeqExcept:
-                    pass
+                    finally:
+                        retries -= 1
 
-                finally:
-                    retries -= 1
+        except PyIntfTimeoutExcept:
+            timeout = True
+            raise
+
+        finally:
+            self.rq_seq.release(msg.seq_num)
+            if self.stats:
+                self.stats.record(cmd.netfn, cmd.cmd, time.time() - t0, msg.rsp_cc, 
+                                  self.attempt, seq_errs, timeout)
 
         raise PyIntfExcept('Could not match the request with the response message.')        
 
@@ -224,29 +330,148 @@ class RMCP(RMCP_Ping):
                 self.sseq = 1
 
         msg, data, cmd_sm = self.gen_msg(cmd, True, dest, target)
-        rsp = self.sendrecv(data, 1)
+        t0 = time.time()
+        seq_errs = 0
+        timeout = False
+        try:
+            rsp = self.sendrecv(data, 1)
+
+            # The 1st response of send message received
+            try:
+                self.unpack(rsp, msg, cmd_sm)   
+            except PyIntfSeqExcept:
+                # The version of HS9216 AMI I tested has a bug of returning the wrong 
+                # seq number in the 1st response.  It occurs around 1%.
+                # Here is for working around the bug
+                seq_errs += 1
+
+            # The inner response has its own completion code
+            msg.rsp_cc = None
+            t1 = time.time()
+            for attempt in range(3):
+                rsp = self.recv(self.rtt_bridge.timeout(attempt)) 
+                if rsp:  break
+        
+            if not rsp:         
+                raise PyIntfTimeoutExcept('Message Bridging times out.')        
+
+            self.rtt_bridge.update(time.time() - t1)
+
+            # The 2nd response of the inner bridged message received
+            msg.rs_addr = target
+            return self.unpack(rsp, msg, cmd)
+
+        except PyIntfTimeoutExcept:
+            timeout = True
+            raise
+
+        finally:
+            self.rq_seq.release(msg.seq_num)
+            if self.stats:
+                self.stats.record(cmd.netfn, cmd.cmd, time.time() - t0, msg.rsp_cc, 
+                                  0, seq_errs, timeout)
+
+    def _issue_pipelined_imp(self, cmds):
+        if self.keep_alive: self.wd_count = RMCP.KEEP_ALIVE_PERIOD
+        rsps = [None] * len(cmds)
+        pending = {}    # (rqSeq, netfn, cmd) => [index, cmd, msg, data, attempt, deadline, t0]
+        i = 0
 
-        # The 1st response of send message received
         try:
-            self.unpack(rsp, msg, cmd_sm)   
-        except PyIntfSeqExcept:
-            # The version of HS9216 AMI I tested has a bug of returning the wrong 
-            # seq number in the 1st response.  It occurs around 1%.
-            # Here is for working around the bug
-            pass
+            while i < len(cmds) or pending:
+                # Keep up to self.window requests in flight
+                while i < len(cmds) and len(pending) < self.window:
+                    cmd_cls, args = cmds[i]
+                    try:
+                        cmd = cmd_cls(*args)
+                        if self.sess_act:
+                            self.sseq += 1
+                            if self.sseq > 0xffffffff:
+                                self.sseq = 1
+
+                        msg, data = self.gen_msg(cmd)
+                    except PyExcept as e:
+                        rsps[i] = e
+                        i += 1
+                        continue
+
+                    # The netfn of the response is the one of the request + 1
+                    msg.any_seq = True
+                    key = (msg.seq_num, cmd.netfn + 1, cmd.cmd)
+                    t0 = time.time()
+                    pending[key] = [i, cmd, msg, data, 0, t0 + self.rtt.timeout(), t0]
+                    self.send_pkt(data)
+                    i += 1
+
+                timeout = min(x[5] for x in pending.values()) - time.time()
+                r, _, x = select.select([self.socket], [], [], max(timeout, 0))
+                if x:  raise PyIntfExcept('Socket exception occurred.  Stopped.')
+
+                if r:
+                    rsp = self.recv_pkt()
+
+                    # Any message in flight can decode the response since they
+                    # share the same session, then route it by (rqSeq, netfn, cmd)
+                    msg = next(iter(pending.values()))[2]
+                    try:
+                        pkt1 = msg.unpack(rsp)
+                        key = (msg.rsp_seq, pkt1[0], pkt1[1])
+                    except PyIntfExcept:
+                        continue
+                    finally:
+                        if self.cap_clear:  self.write_clear(msg, False)
+
+                    req = pending.get(key, None)
+                    if req is None or msg.rsp_addr != req[2].rs_addr:
+                        continue     # stale, duplicated or unexpected response
+                    del pending[key]
+                    self.rq_seq.release(req[2].seq_num)
+
+                    # Only sample the RTT of the requests not retransmitted
+                    if req[4] == 0:  self.rtt.update(time.time() - req[6])
+                    if self.stats:
+                        self.stats.record(req[1].netfn, req[1].cmd, time.time() - req[6], 
+                                          pkt1[2], req[4])
+
+                    try:
+                        rsps[req[0]] = req[1].unpack(pkt1)
+                    except PyExcept as e:
+                        rsps[req[0]] = e
+
+                    continue
+
+                # Retransmit the requests timed out
+                now = time.time()
+                for key, req in list(pending.items()):
+                    if req[5] > now:  continue
+                    req[4] += 1
+                    if req[4] == 3:
+                        rsps[req[0]] = PyIntfTimeoutExcept('Times out.  Host has no response.')
+                        del pending[key]
+                        self.rq_seq.release(req[2].seq_num)
+                        if self.stats:
+                            self.stats.record(req[1].netfn, req[1].cmd, now - req[6], 
+                                              None, 2, 0, True)
+                    else:
+                        self.send_pkt(req[3])
+                        req[5] = now + self.rtt.timeout(req[4])
+        finally:
+            for req in pending.values():
+                self.rq_seq.release(req[2].seq_num)
 
-        retries = 3
-        while retries:
-            rsp = self.recv() 
-            if rsp:  break
-            retries -= 1
-        
-        if not rsp:         
-            raise PyIntfExcept('Message Bridging times out.')        
+        return rsps
 
-        # The 2nd response of the inner bridged message received
-        msg.rs_addr = target
-        return self.unpack(rsp, msg, cmd)
+    def set_window(self, window):
+        self.window = min(max(window, 1), self.MAX_WINDOW)
+
+    def issue_batch(self, reqs):
+        # reqs: a list of (cmd_cls, args) or raw requests
+        # Return the responses in the same order.  A failed request has the
+        # exception in its place instead.
+        cmds = self.conv_batch(reqs)
+        with self.lock:
+            rsps = self._issue_pipelined_imp(cmds)
+        return rsps
 
     def issue_cmd(self, cmd_cls, *args):
         with self.lock:
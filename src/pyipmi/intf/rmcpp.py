@@ -33,13 +33,15 @@
 import os, struct, threading, time
 from . rmcp import RMCP_Ping, RMCP
 from . _rmcpp_msg import IPMI20_Message
-from . _crypto import RAKP_NONE, MD5_128, get_cipher_tuple, \
-                        cal_auth_code, conv_str2bytes
+from . _crypto import AUTH_RMCPP, RAKP_NONE, get_cipher_tuple, conv_str2bytes
 from . _rakp import *
 from .. mesg.ipmi_app import IPMI_SendMsg, GetChnlAuthCap, SetSessPriv, CloseSess
 from .. util.exception import PyIntfExcept, PyIntfSeqExcept
 
 class RMCPP(RMCP):
+    # IPMI v2.0 widens the accepted session sequence window to 16
+    MAX_WINDOW = 16
+
     def __init__(self, opts, keep_alive):
         super(RMCPP, self).__init__(opts, keep_alive)
         self.cipher = (RAKP_NONE, RAKP_NONE, RAKP_NONE)
@@ -54,6 +56,7 @@ class RMCPP(RMCP):
             raise PyIntfExcept('Cipher suite {0} is not supported.'.format(cipher))
 
         # Open socket
+        self.set_capture(opts.get('capture', ''), opts.get('capture_clear', ''))
         RMCP_Ping.open(self)
 
         user = conv_str2bytes(opts.get('user', None))
@@ -61,6 +64,8 @@ class RMCPP(RMCP):
         if self.passwd is not None: self.passwd = struct.pack('20s', self.passwd)
         priv = opts.get('priv', 4)        
         self.rcsid = os.urandom(4)
+        self.set_window(opts.get('window', 1))
+        self.set_timeouts(opts)
 
         no_ping = opts.get('no_ping', False)
         if not no_ping:        
@@ -79,25 +84,13 @@ class RMCPP(RMCP):
                                       priv, user, self.passwd, cipher[0])
 
         # Calculate SIK        
-        # SIK = H(rcrn, msrn, priv, len(user), user)
-        # key = KG => user password
         if 'kg' not in opts.keys() or opts['kg'] == '':
             key = self.passwd
         else:
             key = conv_str2bytes(opts['kg'])
             key = struct.pack('20s', key)
         
-        if key is not None:
-            data = rcrn + msrn
-            if user is None:
-                data += struct.pack('BB', priv, 0)
-            else:
-                data += struct.pack('BB', priv, len(user))
-                data += user
-        
-            sik = cal_auth_code(cipher[0], key, data)
-        else:
-            sik = None
+        sik = cal_sik(cipher[0], key, rcrn, msrn, priv, user)
 
         # RAKP 3, 4
         self.issue_cmd(RAKP_3_4, 
@@ -110,10 +103,7 @@ class RMCPP(RMCP):
         self.sid = mssid
 
         # Calculate K1 & K2 by need
-        if self.cipher[1] != RAKP_NONE and self.cipher[1] != MD5_128:
-            self.k1 = cal_auth_code(cipher[0], sik, b'\x01' * 20)
-        if self.cipher[2] != RAKP_NONE:
-            self.k2 = cal_auth_code(cipher[0], sik, b'\x02' * 20)
+        self.k1, self.k2 = cal_k1_k2(cipher, sik)
 
         # Set Session Privilege Level Command
         priv, = self.issue_cmd(SetSessPriv, priv)
@@ -125,33 +115,54 @@ class RMCPP(RMCP):
             th.start()
 
     def gen_msg(self, cmd, bridging=False, dest=0, target=0):
+        # The caller releases msg.seq_num after the response is received
         msg = IPMI20_Message(self.cipher, self.sseq, self.sid, self.passwd, 
-                             self.k1, self.k2)
+                             self.k1, self.k2, self.rq_seq.alloc())
                              
-        if cmd.payload_type != 0:
-            # RMCP Open Session Request & RAKP 1, 3
-            payload = cmd.pack()
-            data = msg.pack(cmd, payload)
-            ret = (msg, data)
-        elif bridging:
-            # Message bridging
-            inner = msg._pack_lan_payload(cmd, target)
-            sm = IPMI_SendMsg(dest, inner)
-            data = msg.pack(sm)
-            ret = (msg, data, sm)
-        else:
-            # Common IPMI commands
-            data = msg.pack(cmd)
-            ret = (msg, data)
-
+        try:
+            if cmd.payload_type != 0:
+                # RMCP Open Session Request & RAKP 1, 3
+                payload = cmd.pack()
+                data = msg.pack(cmd, payload)
+                ret = (msg, data)
+            elif bridging:
+                # Message bridging
+                inner = msg._pack_lan_payload(cmd, target)
+                sm = IPMI_SendMsg(dest, inner)
+                data = msg.pack(sm)
+                ret = (msg, data, sm)
+            else:
+                # Common IPMI commands
+                data = msg.pack(cmd)
+                ret = (msg, data)
+        except:
+            self.rq_seq.release(msg.seq_num)
+            raise
+
+        # The retransmissions are not in the decrypted capture
+        if self.cap_clear:  self.write_clear(msg, True)
         return ret
 
     def unpack(self, rsp, msg, cmd):
-        if cmd.payload_type != 0:
-            payload_type, pkt1 = msg.unpack(rsp)  
-            pkt2 = cmd.unpack(payload_type, pkt1)
-        else:
-            pkt1 = msg.unpack(rsp)  
-            pkt2 = cmd.unpack(pkt1)
+        try:
+            if cmd.payload_type != 0:
+                payload_type, pkt1 = msg.unpack(rsp)  
+                pkt2 = cmd.unpack(payload_type, pkt1)
+            else:
+                pkt1 = msg.unpack(rsp)  
+                pkt2 = cmd.unpack(pkt1)
+        finally:
+            if self.cap_clear:  self.write_clear(msg, False)
 
         return pkt2
+
+    def write_clear(self, msg, outbound):
+        # Write the message with the payload decrypted and the integrity 
+        # trailer removed, so the dissector decodes it as unprotected
+        if msg.clear is None:  return
+        payload_type, sid, sseq, payload = msg.clear
+        msg.clear = None
+
+        hdr = struct.pack('<BBBBBB4sLH', 6, 0, 0xff, 7, AUTH_RMCPP, payload_type, 
+                          sid, sseq, len(payload))
+        self.cap_clear.write(hdr + payload, outbound)
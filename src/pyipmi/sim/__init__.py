@@ -0,0 +1,505 @@
+#
+# Copyright (c) 2021, Hyve Design Solutions Corporation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are 
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright 
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright 
+#    notice, this list of conditions and the following disclaimer in the 
+#    documentation and/or other materials provided with the distribution.
+#
+# 3. Neither the name of Hyve Design Solutions Corporation nor the names 
+#    of its contributors may be used to endorse or promote products 
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY HYVE DESIGN SOLUTIONS CORPORATION AND 
+# CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, 
+# BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND 
+# FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL 
+# HYVE DESIGN SOLUTIONS CORPORATION OR CONTRIBUTORS BE LIABLE FOR ANY 
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL 
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS 
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) 
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, 
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING 
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+#
+import os, socket, select, struct, threading, time, random, heapq
+from .. util import checksum
+from .. intf._crypto import *
+from . _bmc import SimBMC, NETFN_APP
+
+__all__ = [
+    'BMCSim',
+    'SimBMC',
+]
+
+SOFT_ID = 0x81
+BMC_ADDR = 0x20
+
+class _Session:
+    def __init__(self, sid):
+        self.sid = sid              # managed system session ID
+        self.rcsid = b'\0' * 4      # remote console session ID
+        self.auth = AUTH_NONE
+        self.cipher = (RAKP_NONE, RAKP_NONE, RAKP_NONE)
+        self.priv = 4
+        self.role = 4
+        self.user = b''
+        self.passwd = None
+        self.challenge = None
+        self.rcrn = None
+        self.msrn = None
+        self.k1 = None
+        self.k2 = None
+        self.active = False
+        self.out_seq = 0
+
+    def next_seq(self):
+        if not self.active:  return 0
+        self.out_seq += 1
+        if self.out_seq > 0xffffffff:  self.out_seq = 1
+        return self.out_seq
+
+class BMCSim:
+    def __init__(self, opts=None):
+        if opts is None:  opts = {}
+
+        self.host = opts.get('host', 'localhost')
+        self.port = opts.get('port', 623)
+        self.bmc = SimBMC(opts)
+        self.socket = None
+        self.sessions = {}
+        self.running = False
+        self.thread = None
+
+        # Network impairments
+        #   delay, jitter: added to the round trip of each response in ms
+        #   loss: percentage of the requests and responses dropped each
+        #   dup: percentage of the responses sent twice
+        #   reorder: percentage of the responses held back by reorder_gap ms,
+        #            so the following ones overtake them
+        self.delay = opts.get('delay', 0)
+        self.jitter = opts.get('jitter', 0)
+        self.loss = opts.get('loss', 0)
+        self.dup = opts.get('dup', 0)
+        self.reorder = opts.get('reorder', 0)
+        self.reorder_gap = opts.get('reorder_gap', 20)
+        self.rand = random.Random(opts.get('seed', None))
+
+        self.queue = []     # heap of (due, count, data, addr)
+        self.count = 0
+        self.stats = {'recv': 0, 'sent': 0, 'dropped': 0, 'duplicated': 0, 'reordered': 0}
+
+    def open(self):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((self.host, self.port))
+        self.port = self.socket.getsockname()[1]
+
+    def close(self):
+        self.stop()
+        if self.socket:
+            self.socket.close()
+            self.socket = None
+
+    def start(self):
+        # Serve in a background thread
+        if self.socket is None:  self.open()
+        self.running = True
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.thread = None
+
+    def impaired(self):
+        return bool(self.delay or self.jitter or self.loss or self.dup or self.reorder)
+
+    def serve_forever(self):
+        if self.socket is None:  self.open()
+        self.running = True
+
+        while self.running:
+            timeout = 0.2
+            if self.queue:
+                timeout = min(max(self.queue[0][0] - time.time(), 0), timeout)
+
+            r, _, _ = select.select([self.socket], [], [], timeout)
+            self._flush()
+            if not r:  continue
+
+            try:
+                data, addr = self.socket.recvfrom(4096)
+            except OSError:
+                continue
+
+            self.stats['recv'] += 1
+            if self._lost():  continue
+
+            for rsp in self.process(data):
+                self.send(rsp, addr)
+
+    def send(self, data, addr):
+        if not self.impaired():
+            self._sendto(data, addr)
+            return
+
+        if self._lost():  return
+
+        due = time.time() + (self.delay + self.rand.uniform(-self.jitter, self.jitter)) / 1000
+        if self.reorder and self.rand.random() * 100 < self.reorder:
+            due += self.reorder_gap / 1000
+            self.stats['reordered'] += 1
+        self._schedule(due, data, addr)
+
+        if self.dup and self.rand.random() * 100 < self.dup:
+            self.stats['duplicated'] += 1
+            self._schedule(due, data, addr)
+
+    def _lost(self):
+        if self.loss and self.rand.random() * 100 < self.loss:
+            self.stats['dropped'] += 1
+            return True
+        return False
+
+    def _schedule(self, due, data, addr):
+        self.count += 1
+        heapq.heappush(self.queue, (due, self.count, data, addr))
+
+    def _flush(self):
+        # Send the delayed responses due
+        now = time.time()
+        while self.queue and self.queue[0][0] <= now:
+            _, _, data, addr = heapq.heappop(self.queue)
+            self._sendto(data, addr)
+
+    def _sendto(self, data, addr):
+        self.stats['sent'] += 1
+        try:
+            self.socket.sendto(data, addr)
+        except OSError:
+            pass
+
+    def process(self, data):
+        # Return the list of the response packets
+        if len(data) < 5 or data[0] != 6:
+            return []
+
+        if data[3] == 6:
+            return self._process_asf(data)
+        if data[3] != 7:
+            return []
+
+        try:
+            if data[4] == AUTH_RMCPP:
+                return self._process_rmcpp(data)
+            return self._process_rmcp(data)
+        except (struct.error, IndexError, KeyError):
+            # drop the malformed packets silently like a BMC does
+            return []
+
+    # ASF Ping / Pong
+    def _process_asf(self, data):
+        iana, msg_type, tag = struct.unpack('>LBB', data[4:10])
+        if iana != 4542 or msg_type != 0x80:
+            return []
+
+        pong = struct.pack('BBBB', 6, 0, 0xff, 6)
+        pong += struct.pack('>LBBBB', 4542, 0x40, tag, 0, 16)
+        pong += struct.pack('>LLBB6s', 4542, 0, 0x81, 0, b'\0')
+        return [pong]
+
+    # IPMI LAN message payload
+    def _unpack_lan_payload(self, payload):
+        if (checksum(payload[:2], int) != payload[2] or
+            checksum(payload[3:-1], int) != payload[-1]):
+            return None
+
+        netfn = payload[1] >> 2
+        lun = payload[1] & 3
+        rq_seq = payload[4]
+        cmd = payload[5]
+        return (payload[0], netfn, lun, payload[3], rq_seq, cmd, payload[6:-1])
+
+    def _pack_lan_payload(self, req, cc, rsp_data):
+        rs_addr, netfn, lun, rq_addr, rq_seq, cmd, _ = req
+        p1 = struct.pack('BB', rq_addr, ((netfn + 1) << 2) | (rq_seq & 3))
+        p1 += checksum(p1)
+        p2 = struct.pack('BBBB', rs_addr, (rq_seq & 0xfc) | lun, cmd, cc) + rsp_data
+        p2 += checksum(p2)
+        return p1 + p2
+
+    def _handle_cmd(self, sess, req):
+        # Return a list of (cc, rsp_data, req)
+        # The req of a bridged response is the inner request
+        _, netfn, lun, _, rq_seq, cmd, data = req
+
+        if netfn == NETFN_APP:
+            if cmd == 0x38:     # Get Channel Authentication Capabilities
+                auths = 0x97 if data[0] & 0x80 else 0x17
+                return [(0, struct.pack('BBBB3sB', 1, auths, 0x04, 0x03, b'\0', 0), req)]
+            if cmd == 0x39:     # Get Session Challenge
+                return [self._get_sess_challenge(req, data)]
+            if sess is None:
+                return [(0xd4, b'', req)]
+            if cmd == 0x3a:     # Activate Session
+                return [self._activate_sess(sess, req, data)]
+            if cmd == 0x3b:     # Set Session Privilege Level
+                sess.priv = data[0] & 0x0f
+                return [(0, struct.pack('B', sess.priv), req)]
+            if cmd == 0x3c:     # Close Session
+                self.sessions.pop(sess.sid, None)
+                return [(0, b'', req)]
+            if cmd == 0x34:     # Send Message
+                return self._send_msg(req, data)
+        elif sess is None or not sess.active:
+            return [(0xd4, b'', req)]
+
+        cc, rsp_data = self.bmc.handle(netfn, cmd, data)
+        return [(cc, rsp_data, req)]
+
+    def _send_msg(self, req, data):
+        # Bridge the inner IPMB message to the same model
+        inner = self._unpack_lan_payload(data[1:])
+        if inner is None:
+            return [(0xcc, b'', req)]
+
+        rs_addr, netfn, _, _, _, cmd, req_data = inner
+        cc, rsp_data = self.bmc.handle(netfn, cmd, req_data)
+        return [(0, b'', req), (cc, rsp_data, inner)]
+
+    def _new_session(self):
+        sid = b'\0' * 4
+        while sid == b'\0' * 4 or sid in self.sessions:
+            sid = os.urandom(4)
+
+        sess = _Session(sid)
+        self.sessions[sid] = sess
+        return sess
+
+    # IPMI v1.5 sessions
+    def _get_sess_challenge(self, req, data):
+        auth, user = struct.unpack('B16s', data)
+        name = user.rstrip(b'\0').decode('latin_1')
+        _, user_rec = self.bmc.find_user(name)
+        if user_rec is None:
+            return (0x81, b'', req)
+
+        sess = self._new_session()
+        sess.auth = auth
+        sess.user = user.rstrip(b'\0')
+        sess.passwd = conv_str2bytes(user_rec[1])
+        sess.challenge = os.urandom(16)
+        return (0, sess.sid + sess.challenge, req)
+
+    def _activate_sess(self, sess, req, data):
+        auth, priv, challenge, ioseq = struct.unpack('<BB16sL', data)
+        if challenge != sess.challenge:
+            return (0x83, b'', req)
+
+        sess.active = True
+        sess.priv = priv
+        sess.out_seq = ioseq - 1
+        inseq, = struct.unpack('<L', os.urandom(4))
+        return (0, struct.pack('<B4sLB', auth, sess.sid, inseq | 1, priv), req)
+
+    def _process_rmcp(self, data):
+        auth, sseq, sid = struct.unpack('<BL4s', data[4:13])
+        if auth == AUTH_NONE:
+            auth_code = None
+            payload = data[14:]
+            payload_len = data[13]
+        else:
+            auth_code = data[13:29]
+            payload = data[30:]
+            payload_len = data[29]
+
+        if len(payload) != payload_len or payload_len < 7:
+            return []
+
+        sess = self.sessions.get(sid, None)
+        if sid != b'\0' * 4:
+            if sess is None:  return []
+            if auth != AUTH_NONE:
+                # verify AuthCode
+                if cal_auth_code_15(auth, sess.passwd, sseq, sid, payload) != auth_code:
+                    return []
+
+        req = self._unpack_lan_payload(payload)
+        if req is None:
+            return []
+
+        ret = []
+        for cc, rsp_data, req1 in self._handle_cmd(sess, req):
+            rsp = self._pack_lan_payload(req1, cc, rsp_data)
+            if sess is None or auth == AUTH_NONE:
+                seq = 0 if sess is None else sess.next_seq()
+                hdr = struct.pack('<BL4sB', AUTH_NONE, seq, sid, len(rsp))
+            else:
+                seq = sess.next_seq()
+                code = cal_auth_code_15(auth, sess.passwd, seq, sid, rsp)
+                hdr = struct.pack('<BL4s16sB', auth, seq, sid, code, len(rsp))
+
+            ret.append(struct.pack('BBBB', 6, 0, 0xff, 7) + hdr + rsp)
+
+        return ret
+
+    # IPMI v2.0 RMCP+ sessions
+    def _pack_rmcpp(self, sess, payload_type, payload):
+        if sess is None or not sess.active:
+            hdr = struct.pack('<BB4sLH', AUTH_RMCPP, payload_type, b'\0' * 4, 0,
+                              len(payload))
+            return struct.pack('BBBB', 6, 0, 0xff, 7) + hdr + payload
+
+        cipher = sess.cipher
+        if cipher[2] != RAKP_NONE:
+            payload_type |= 0x80
+            payload = encrypt_aes_128_cbc(sess.k2, payload)
+        if cipher[1] != RAKP_NONE:
+            payload_type |= 0x40
+
+        msg = struct.pack('<BB4sLH', AUTH_RMCPP, payload_type, sess.rcsid,
+                          sess.next_seq(), len(payload)) + payload
+
+        if cipher[1] != RAKP_NONE:
+            rem = (len(msg) + 2) & 3
+            pad_len = 4 - rem if rem != 0 else 0
+            msg += b'\xff' * pad_len + struct.pack('BB', pad_len, 7)
+            key = sess.passwd if cipher[1] == MD5_128 else sess.k1
+            msg += cal_inte_check(cipher[1], key, msg)
+
+        return struct.pack('BBBB', 6, 0, 0xff, 7) + msg
+
+    def _process_rmcpp(self, data):
+        msg = data[4:]
+        _, payload_type, sid, sseq, payload_len = struct.unpack('<BB4sLH', msg[:12])
+        payload = msg[12:12+payload_len]
+        if len(payload) != payload_len:
+            return []
+
+        sess = None
+        if sid != b'\0' * 4:
+            sess = self.sessions.get(sid, None)
+            if sess is None or not sess.active:
+                return []
+
+            if payload_type & 0x40:
+                # verify Integrity Check
+                inte_len = get_inte_len(sess.cipher[1])
+                key = sess.passwd if sess.cipher[1] == MD5_128 else sess.k1
+                if cal_inte_check(sess.cipher[1], key, msg[:-inte_len]) != msg[-inte_len:]:
+                    return []
+            if payload_type & 0x80:
+                payload = decrypt_aes_128_cbc(sess.k2, payload)
+
+        ptype = payload_type & 0x3f
+        if ptype == 0x10:
+            return [self._open_sess(payload)]
+        if ptype == 0x12:
+            return [self._rakp_1_2(payload)]
+        if ptype == 0x14:
+            return [self._rakp_3_4(payload)]
+        if ptype != 0:
+            return []
+
+        req = self._unpack_lan_payload(payload)
+        if req is None:
+            return []
+
+        ret = []
+        for cc, rsp_data, req1 in self._handle_cmd(sess, req):
+            rsp = self._pack_lan_payload(req1, cc, rsp_data)
+            ret.append(self._pack_rmcpp(sess, 0, rsp))
+
+        return ret
+
+    def _open_sess(self, payload):
+        tag, priv, _, rcsid = struct.unpack('<BBH4s', payload[:8])
+        algos = tuple(payload[8 + i * 8 + 4] & 0x3f for i in range(3))
+
+        if get_cipher(algos) is None:
+            # No Cipher Suite match with proposed security algorithms
+            rsp = struct.pack('<BBH4s', tag, 0x11, 0, rcsid)
+            return self._pack_rmcpp(None, 0x11, rsp)
+
+        sess = self._new_session()
+        sess.rcsid = rcsid
+        sess.cipher = algos
+        sess.priv = priv if priv else 4
+
+        rsp = struct.pack('<BBBB4s4s', tag, 0, sess.priv, 0, rcsid, sess.sid)
+        for i in range(3):
+            rsp += struct.pack('<BHBB3s', i, 0, 8, algos[i], b'\0')
+
+        return self._pack_rmcpp(None, 0x11, rsp)
+
+    def _rakp_1_2(self, payload):
+        tag, _, mssid, rcrn, role, _, ulen = struct.unpack('<B3s4s16sBHB', payload[:28])
+        user = payload[28:28+ulen]
+
+        sess = self.sessions.get(mssid, None)
+        if sess is None or sess.active:
+            rsp = struct.pack('<BBH4s', tag, 0x02, 0, b'\0' * 4)
+            return self._pack_rmcpp(None, 0x13, rsp)
+
+        _, user_rec = self.bmc.find_user(user.decode('latin_1'))
+        if user_rec is None:
+            self.sessions.pop(mssid, None)
+            rsp = struct.pack('<BBH4s', tag, 0x0d, 0, sess.rcsid)
+            return self._pack_rmcpp(None, 0x13, rsp)
+
+        sess.user = user
+        sess.role = role
+        sess.rcrn = rcrn
+        sess.msrn = os.urandom(16)
+        sess.passwd = struct.pack('20s', conv_str2bytes(user_rec[1]) or b'')
+
+        data = struct.pack('<4s4s16s16s16sBB', sess.rcsid, sess.sid, rcrn, sess.msrn,
+                           self.bmc.guid, role, ulen) + user
+        auth_code = cal_auth_code(sess.cipher[0], sess.passwd, data) or b''
+
+        rsp = struct.pack('<BBH4s16s16s', tag, 0, 0, sess.rcsid, sess.msrn,
+                          self.bmc.guid) + auth_code
+        return self._pack_rmcpp(None, 0x13, rsp)
+
+    def _rakp_3_4(self, payload):
+        tag, status, _, mssid = struct.unpack('<BBH4s', payload[:8])
+        auth_code = payload[8:]
+
+        sess = self.sessions.get(mssid, None)
+        if sess is None or sess.msrn is None or sess.active:
+            rsp = struct.pack('<BBH4s', tag, 0x02, 0, b'\0' * 4)
+            return self._pack_rmcpp(None, 0x15, rsp)
+
+        auth = sess.cipher[0]
+        data = struct.pack('<16s4sBB', sess.msrn, sess.rcsid, sess.role,
+                           len(sess.user)) + sess.user
+        if auth != RAKP_NONE and cal_auth_code(auth, sess.passwd, data) != auth_code:
+            self.sessions.pop(mssid, None)
+            rsp = struct.pack('<BBH4s', tag, 0x0f, 0, sess.rcsid)
+            return self._pack_rmcpp(None, 0x15, rsp)
+
+        # SIK = H(rcrn, msrn, role, len(user), user)
+        data = sess.rcrn + sess.msrn + struct.pack('BB', sess.role, len(sess.user))
+        sik = cal_auth_code(auth, sess.passwd, data + sess.user)
+        icv = b''
+        if sik is not None:
+            sess.k1 = cal_auth_code(auth, sik, b'\x01' * 20)
+            sess.k2 = cal_auth_code(auth, sik, b'\x02' * 20)
+            data = struct.pack('16s4s16s', sess.rcrn, sess.sid, self.bmc.guid)
+            icv = cal_inte_check(map_auth2inte(auth), sik, data)
+
+        rsp = struct.pack('<BBH4s', tag, 0, 0, sess.rcsid) + icv
+        sess.active = True
+        return self._pack_rmcpp(None, 0x15, rsp)
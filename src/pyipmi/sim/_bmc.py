@@ -0,0 +1,518 @@
+#
+# Copyright (c) 2021, Hyve Design Solutions Corporation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are 
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright 
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright 
+#    notice, this list of conditions and the following disclaimer in the 
+#    documentation and/or other materials provided with the distribution.
+#
+# 3. Neither the name of Hyve Design Solutions Corporation nor the names 
+#    of its contributors may be used to endorse or promote products 
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY HYVE DESIGN SOLUTIONS CORPORATION AND 
+# CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, 
+# BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND 
+# FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL 
+# HYVE DESIGN SOLUTIONS CORPORATION OR CONTRIBUTORS BE LIABLE FOR ANY 
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL 
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS 
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) 
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, 
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING 
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+#
+import struct, time
+from .. util import checksum
+
+NETFN_CHASSIS = 0
+NETFN_SE = 4
+NETFN_APP = 6
+NETFN_STORAGE = 0x0a
+NETFN_TRANS = 0x0c
+
+# Default user table
+# ID: (name, password, privilege, enabled)
+SIM_USERS = {
+    1: ('', '', 4, False),
+    2: ('root', 'root123', 4, True),
+    3: ('admin', 'admin123', 4, True),
+    4: ('hyve', 'hyve123', 3, True),
+}
+
+# Default LAN configuration parameters of channel 1
+# Param: data
+SIM_LAN_PARAMS = {
+    0: b'\x00',
+    1: b'\x17',
+    2: b'\x14\x14\x14\x14\x00',
+    3: bytes((192, 168, 0, 169)),
+    4: b'\x01',
+    5: bytes((0x00, 0x1b, 0x21, 0x3a, 0x4c, 0x5e)),
+    6: bytes((255, 255, 255, 0)),
+    7: b'\x40\x40\x10',
+    10: b'\x02',
+    12: bytes((192, 168, 0, 1)),
+    13: bytes((0x00, 0x1b, 0x21, 0x00, 0x00, 0x01)),
+    14: bytes((0, 0, 0, 0)),
+    15: bytes(6),
+    17: b'\x00',
+    20: b'\x00\x00',
+    21: b'\x00',
+    22: b'\x0e',
+    23: bytes((0, 0, 1, 2, 3, 6, 7, 8, 11, 12, 15, 16, 17, 18, 19)),
+    24: b'\x00\x44\x44\x44\x44\x44\x44\x44\x04',
+}
+
+def _sdr_id_str(name):
+    name = name.encode('latin_1')[:16]
+    return struct.pack('B', 0xc0 | len(name)) + name
+
+def _sdr_record(rec_id, rec_type, body):
+    # Record ID (2) | SDR Version (1) | Record Type (1) | Record Length (1)
+    return struct.pack('<HBBB', rec_id, 0x51, rec_type, len(body)) + body
+
+def gen_full_sdr(rec_id, sensor_num, name, sensor_type, unit, m, k2, thres,
+                 entity=(7, 1)):
+    # Full Sensor Record (type 01h) of a threshold-based sensor
+    # thres = (lnr, lcr, lnc, unc, ucr, unr) in raw values
+    lnr, lcr, lnc, unc, ucr, unr = thres
+    body = struct.pack('<BBBBBBBBB', 0x20, 0, sensor_num, entity[0], entity[1],
+                       0x7f, 0x68, sensor_type, 1)
+    body += struct.pack('<HHH', 0x7a95, 0x7a95, 0x3f3f)   # masks
+    body += struct.pack('<BBBB', 0, unit, 0, 0)            # units, linearization
+    body += struct.pack('<BBBBBB', m & 0xff, (m >> 2) & 0xc0, 0, 0, 0,
+                        (k2 & 0x0f) << 4)                 # M, B, accuracy, R/B exp
+    body += struct.pack('<BBBBB', 7, (unc + lnc) // 2, unc, lnc, 0xff)
+    body += struct.pack('<B', 0)                           # sensor min
+    body += struct.pack('<BBBBBB', unr, ucr, unc, lnr, lcr, lnc)
+    body += struct.pack('<BBHB', 1, 1, 0, 0)               # hysteresis, reserved, OEM
+    body += _sdr_id_str(name)
+
+    return _sdr_record(rec_id, 1, body)
+
+def gen_compact_sdr(rec_id, sensor_num, name, sensor_type, er_type, entity=(7, 1)):
+    # Compact Sensor Record (type 02h) of a discrete sensor
+    body = struct.pack('<BBBBBBBBB', 0x20, 0, sensor_num, entity[0], entity[1],
+                       0x67, 0x40, sensor_type, er_type)
+    body += struct.pack('<HHH', 0x00ff, 0x00ff, 0x00ff)   # masks
+    body += struct.pack('<BBB', 0xc0, 0, 0)                # units
+    body += struct.pack('<BBBB', 1, 0, 0, 0)               # sharing, hysteresis
+    body += struct.pack('<BBBB', 0, 0, 0, 0)               # reserved, OEM
+    body += _sdr_id_str(name)
+
+    return _sdr_record(rec_id, 2, body)
+
+def gen_event_sdr(rec_id, sensor_num, name, sensor_type, er_type, entity=(7, 1)):
+    # Event-Only Sensor Record (type 03h)
+    body = struct.pack('<BBBBBBBBBBB', 0x20, 0, sensor_num, entity[0], entity[1],
+                       sensor_type, er_type, 1, 0, 0, 0)
+    body += _sdr_id_str(name)
+
+    return _sdr_record(rec_id, 3, body)
+
+def gen_fru_sdr(rec_id, fru_id, name, entity=(7, 1)):
+    # FRU Device Locator Record (type 11h) of a logical FRU device
+    body = struct.pack('<BBBBBBBBBB', 0x20, fru_id, 0x80, 0, 0, 0x10, 0,
+                       entity[0], entity[1], 0)
+    body += _sdr_id_str(name)
+
+    return _sdr_record(rec_id, 0x11, body)
+
+def gen_mcloc_sdr(rec_id, name, entity=(7, 1)):
+    # Management Controller Device Locator Record (type 12h)
+    body = struct.pack('<BBBB3sBBB', 0x20, 0, 0, 0xbf, b'\0',
+                       entity[0], entity[1], 0)
+    body += _sdr_id_str(name)
+
+    return _sdr_record(rec_id, 0x12, body)
+
+def gen_default_sdrs(num_sensors=40):
+    # A repository which looks like a typical 2-socket server
+    sdrs = []
+    readings = {}
+    rec_id = 1
+    sensor_num = 1
+
+    kinds = (
+        # (name, sensor type, unit, M, K2, thresholds, nominal reading)
+        ('Temp_CPU{0}', 1, 1, 1, 0, (0, 5, 10, 85, 90, 95), 45),
+        ('Temp_DIMM{0}', 1, 1, 1, 0, (0, 5, 10, 80, 85, 90), 38),
+        ('P12V_{0}', 2, 4, 6, -2, (160, 170, 180, 220, 230, 240), 200),
+        ('FAN{0}', 4, 18, 100, 0, (3, 5, 7, 200, 210, 220), 90),
+    )
+
+    count = 0
+    while count < num_sensors:
+        name, sensor_type, unit, m, k2, thres, nominal = kinds[count % len(kinds)]
+        name = name.format(count // len(kinds))
+        sdrs.append(gen_full_sdr(rec_id, sensor_num, name, sensor_type, unit,
+                                 m, k2, thres))
+        readings[sensor_num] = nominal
+        rec_id += 1
+        sensor_num += 1
+        count += 1
+
+    discretes = (
+        ('PSU{0}_Status', 8, 0x6f),
+        ('CPU{0}_Status', 7, 0x6f),
+    )
+
+    for i in range(4):
+        name, sensor_type, er_type = discretes[i % len(discretes)]
+        sdrs.append(gen_compact_sdr(rec_id, sensor_num, name.format(i // 2),
+                                    sensor_type, er_type))
+        readings[sensor_num] = 1
+        rec_id += 1
+        sensor_num += 1
+
+    sdrs.append(gen_event_sdr(rec_id, sensor_num, 'SEL_Status', 0x10, 0x6f))
+    rec_id += 1
+    sensor_num += 1
+    sdrs.append(gen_fru_sdr(rec_id, 1, 'PSU0_FRU'))
+    rec_id += 1
+    sdrs.append(gen_mcloc_sdr(rec_id, 'BMC'))
+
+    return (sdrs, readings)
+
+def gen_sel_entry(rec_id, ts, sensor_type, sensor_num, event_type, data):
+    # System Event Record (type 02h)
+    return struct.pack('<HBLHBBBBBBB', rec_id, 2, ts, 0x20, 4, sensor_type,
+                       sensor_num, event_type, data[0], data[1], data[2])
+
+def gen_default_sel(num=20):
+    sel = []
+    ts = int(time.time()) - num * 60
+    for i in range(num):
+        if i & 1:
+            sel.append(gen_sel_entry(i + 1, ts, 1, 1, 1, (0x59, 0xff, 0xff)))
+        else:
+            sel.append(gen_sel_entry(i + 1, ts, 0x0c, 0x40, 0x6f, (0, 0xff, 0xff)))
+        ts += 60
+
+    return sel
+
+def _fru_area(fields, prefix=b''):
+    data = prefix
+    for field in fields:
+        field = field.encode('latin_1')
+        data += struct.pack('B', 0xc0 | len(field)) + field
+    data += b'\xc1'
+
+    # Area Format Version | Area Length | ... | pad | checksum
+    area_len = (len(data) + 3 + 7) // 8
+    data = struct.pack('BB', 1, area_len) + data
+    data += b'\0' * (area_len * 8 - len(data) - 1)
+    data += checksum(data)
+
+    return data
+
+def gen_fru(board='Hyve Sim Board', product='Hyve Sim', serial='SIM0001'):
+    board_area = _fru_area(('Hyve', board, serial, 'PN-0001', ''), b'\x00\x80\x74\x8c')
+    product_area = _fru_area(('Hyve', product, 'PN-0001', '1.0', serial, '', ''),
+                             b'\x00')
+
+    # Common Header
+    offset_b = 1
+    offset_p = offset_b + len(board_area) // 8
+    hdr = struct.pack('BBBBBBB', 1, 0, 0, offset_b, offset_p, 0, 0)
+    hdr += checksum(hdr)
+
+    return hdr + board_area + product_area
+
+class SimBMC:
+    def __init__(self, opts=None):
+        if opts is None:  opts = {}
+
+        self.users = opts.get('users', SIM_USERS)
+        self.lan_params = dict(opts.get('lan_params', SIM_LAN_PARAMS))
+
+        if 'sdrs' in opts:
+            self.sdrs = list(opts['sdrs'])
+            self.readings = dict(opts.get('readings', {}))
+        else:
+            self.sdrs, self.readings = gen_default_sdrs(opts.get('num_sensors', 40))
+
+        self.sel = list(opts.get('sel', gen_default_sel(opts.get('num_sel', 20))))
+        self.frus = dict(opts.get('frus', {0: gen_fru(), 1: gen_fru('PSU Board', 'PSU')}))
+        self.guid = opts.get('guid', bytes(range(16)))
+        self.dev_id = opts.get('dev_id', (0x22, 0x81, 1, 0x23, 0x02, 0xbf,
+                                          b'\x07\xdb\x00', 0x0559, b'\0\0\0\0'))
+
+        # The largest count of a Get SDR request, or completion code CAh
+        self.sdr_max_read = opts.get('sdr_max_read', 0xff)
+
+        now = int(time.time())
+        self.sdr_add_ts = now
+        self.sdr_erase_ts = now
+        self.sdr_resv = 0
+        self.sel_add_ts = now
+        self.sel_erase_ts = now
+        self.sel_resv = 0
+
+        self.handlers = {
+            (NETFN_CHASSIS, 0x01): self._get_chassis_status,
+            (NETFN_CHASSIS, 0x02): self._chassis_ctrl,
+            (NETFN_SE, 0x02): self._platform_event,
+            (NETFN_SE, 0x25): self._get_sensor_hys,
+            (NETFN_SE, 0x27): self._get_sensor_thres,
+            (NETFN_SE, 0x2d): self._get_sensor_reading,
+            (NETFN_APP, 0x01): self._get_device_id,
+            (NETFN_APP, 0x04): self._get_self_test,
+            (NETFN_APP, 0x08): self._get_device_guid,
+            (NETFN_APP, 0x44): self._get_user_access,
+            (NETFN_APP, 0x46): self._get_user_name,
+            (NETFN_STORAGE, 0x10): self._get_fru_area_info,
+            (NETFN_STORAGE, 0x11): self._read_fru,
+            (NETFN_STORAGE, 0x20): self._get_sdr_repo_info,
+            (NETFN_STORAGE, 0x22): self._reserve_sdr,
+            (NETFN_STORAGE, 0x23): self._get_sdr,
+            (NETFN_STORAGE, 0x40): self._get_sel_info,
+            (NETFN_STORAGE, 0x42): self._reserve_sel,
+            (NETFN_STORAGE, 0x43): self._get_sel_entry,
+            (NETFN_STORAGE, 0x47): self._clear_sel,
+            (NETFN_STORAGE, 0x48): self._get_sel_time,
+            (NETFN_TRANS, 0x02): self._get_lan_config,
+        }
+
+    def handle(self, netfn, cmd, data):
+        # Return (cc, rsp_data)
+        hdl = self.handlers.get((netfn, cmd), None)
+        if hdl is None:
+            return (0xc1, b'')
+
+        try:
+            ret = hdl(data)
+        except (struct.error, IndexError):
+            return (0xc7, b'')
+
+        if type(ret) is int:
+            return (ret, b'')
+        return (0, ret)
+
+    def find_user(self, name):
+        for uid, user in self.users.items():
+            if user[0] == name and user[3]:
+                return (uid, user)
+        return (None, None)
+
+    # SDR repository
+    def add_sdr(self, rec):
+        self.sdrs.append(rec)
+        self.sdr_add_ts = int(time.time())
+        self.sdr_resv = (self.sdr_resv + 1) & 0xffff
+
+    def _get_sdr_repo_info(self, data):
+        return struct.pack('<BHHLLB', 0x51, len(self.sdrs), 0x1000,
+                           self.sdr_add_ts, self.sdr_erase_ts, 0x22)
+
+    def _reserve_sdr(self, data):
+        self.sdr_resv = (self.sdr_resv + 1) & 0xffff
+        if self.sdr_resv == 0:  self.sdr_resv = 1
+        return struct.pack('<H', self.sdr_resv)
+
+    def _find_sdr(self, rec_id):
+        if not self.sdrs:
+            return -1
+        if rec_id == 0:
+            return 0
+        if rec_id == 0xffff:
+            return len(self.sdrs) - 1
+
+        for i in range(len(self.sdrs)):
+            if struct.unpack('<H', self.sdrs[i][:2])[0] == rec_id:
+                return i
+
+        return -1
+
+    def _get_sdr(self, data):
+        resv, rec_id, offset, count = struct.unpack('<HHBB', data)
+        if offset != 0 and resv != self.sdr_resv:
+            return 0xc5
+
+        idx = self._find_sdr(rec_id)
+        if idx < 0:
+            return 0xcb
+
+        rec = self.sdrs[idx]
+        if count == 0xff:
+            count = len(rec) - offset
+        if count > self.sdr_max_read:
+            return 0xca
+        if offset > len(rec):
+            return 0xc9
+
+        if idx + 1 < len(self.sdrs):
+            next_id = self.sdrs[idx + 1][:2]
+        else:
+            next_id = b'\xff\xff'
+
+        return next_id + rec[offset:offset+count]
+
+    # Sensors
+    def _find_sensor(self, sensor_num):
+        for rec in self.sdrs:
+            if rec[3] in (1, 2) and rec[7] == sensor_num:
+                return rec[5:]
+        return None
+
+    def _get_sensor_reading(self, data):
+        sensor_num = data[0]
+        sdr = self._find_sensor(sensor_num)
+        if sdr is None:
+            return 0xcb
+
+        reading = self.readings.get(sensor_num, 0)
+        if sdr[8] != 1:
+            # discrete: the state bits
+            return struct.pack('<BBH', 0, 0x40, reading & 0x7fff)
+
+        # threshold: compare to the thresholds
+        stat = 0
+        if reading <= sdr[36]:  stat |= 1
+        if reading <= sdr[35]:  stat |= 2
+        if reading <= sdr[34]:  stat |= 4
+        if reading >= sdr[33]:  stat |= 8
+        if reading >= sdr[32]:  stat |= 0x10
+        if reading >= sdr[31]:  stat |= 0x20
+
+        return struct.pack('BBBB', reading & 0xff, 0x40, 0xc0 | stat, 0x80)
+
+    def _get_sensor_thres(self, data):
+        sdr = self._find_sensor(data[0])
+        if sdr is None or sdr[8] != 1:
+            return 0xcb
+
+        return struct.pack('B' * 7, sdr[13] & 0x3f, sdr[36], sdr[35], sdr[34],
+                           sdr[33], sdr[32], sdr[31])
+
+    def _get_sensor_hys(self, data):
+        sdr = self._find_sensor(data[0])
+        if sdr is None or sdr[8] != 1:
+            return 0xcb
+
+        return struct.pack('BB', sdr[37], sdr[38])
+
+    # SEL
+    def add_sel(self, rec):
+        rec_id = len(self.sel) + 1
+        ts = int(time.time())
+        self.sel.append(struct.pack('<HBL', rec_id, 2, ts) + rec)
+        self.sel_add_ts = ts
+
+    def _platform_event(self, data):
+        # Generator ID is the software ID when issued over LAN
+        if len(data) == 7:  data = b'\x81' + data
+        if len(data) != 8:  return 0xc7
+        self.add_sel(struct.pack('<H', data[0]) + data[1:])
+        return b''
+
+    def _get_sel_info(self, data):
+        return struct.pack('<BHHLLB', 0x51, len(self.sel), 0x1000,
+                           self.sel_add_ts, self.sel_erase_ts, 0x0a)
+
+    def _reserve_sel(self, data):
+        self.sel_resv = (self.sel_resv + 1) & 0xffff
+        if self.sel_resv == 0:  self.sel_resv = 1
+        return struct.pack('<H', self.sel_resv)
+
+    def _get_sel_entry(self, data):
+        resv, rec_id, offset, count = struct.unpack('<HHBB', data)
+        if not self.sel:
+            return 0xcb
+
+        if rec_id == 0:
+            idx = 0
+        elif rec_id == 0xffff:
+            idx = len(self.sel) - 1
+        else:
+            idx = rec_id - 1
+            if idx >= len(self.sel):
+                return 0xcb
+
+        if idx + 1 < len(self.sel):
+            next_id = struct.pack('<H', idx + 2)
+        else:
+            next_id = b'\xff\xff'
+
+        return next_id + self.sel[idx]
+
+    def _clear_sel(self, data):
+        resv = struct.unpack('<H', data[:2])[0]
+        if resv != self.sel_resv:
+            return 0xc5
+
+        if data[5] == 0xaa:
+            self.sel = []
+            self.sel_erase_ts = int(time.time())
+
+        return b'\x01'
+
+    def _get_sel_time(self, data):
+        return struct.pack('<L', int(time.time()))
+
+    # FRU
+    def _get_fru_area_info(self, data):
+        fru = self.frus.get(data[0], None)
+        if fru is None:
+            return 0xcb
+        return struct.pack('<HB', len(fru), 0)
+
+    def _read_fru(self, data):
+        fru_id, offset, count = struct.unpack('<BHB', data)
+        fru = self.frus.get(fru_id, None)
+        if fru is None:
+            return 0xcb
+
+        ret = fru[offset:offset+count]
+        return struct.pack('B', len(ret)) + ret
+
+    # Application
+    def _get_device_id(self, data):
+        return struct.pack('<BBBBBB3sH4s', *self.dev_id)
+
+    def _get_device_guid(self, data):
+        return self.guid
+
+    def _get_self_test(self, data):
+        return b'\x55\x00'
+
+    def _get_user_access(self, data):
+        uid = data[1] & 0x3f
+        user = self.users.get(uid, None)
+        if user is None:
+            return 0xcc
+
+        enabled = len([u for u in self.users.values() if u[3]])
+        state = 1 if user[3] else 2
+        return struct.pack('BBBB', len(self.users), (state << 6) | enabled, 1,
+                           0x10 | user[2])
+
+    def _get_user_name(self, data):
+        user = self.users.get(data[0] & 0x3f, None)
+        if user is None:
+            return 0xcc
+        return struct.pack('16s', user[0].encode('latin_1'))
+
+    # Chassis
+    def _get_chassis_status(self, data):
+        return b'\x01\x00\x40\x00'
+
+    def _chassis_ctrl(self, data):
+        return b''
+
+    # Transport
+    def _get_lan_config(self, data):
+        chnl, param, s_sel, b_sel = struct.unpack('BBBB', data)
+        if param not in self.lan_params:
+            return 0x80
+
+        return b'\x11' + self.lan_params[param]
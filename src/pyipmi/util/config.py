@@ -40,6 +40,13 @@ class PyConfig:
             'interface': (('lan', 'lanplus', 'kcs'), 'lanplus'),
             'host': (str, 'localhost'),
             'port': (int, 623),
+            'broker': (str, ''),
+            # Record the responses to the file, or replay the ones recorded
+            'record': (str, ''),
+            'replay': (str, ''),
+            'replay_speed': (int, 1),
+            # Keep the SDR repositories in ~/.config/pyipmi/sdr
+            'sdr_cache': (bool, True),
         },
 
         'lan': {
@@ -47,6 +54,13 @@ class PyConfig:
             'password': (str,  'root123'),
             'auth': (('none', 'md2', 'md5', 'password', 'oem'), 'md5'),
             'no_ping': (bool, True),
+            'window': (int, 1),
+            # Retransmission timeouts in milliseconds
+            'timeout': (int, 1500),
+            'timeout_min': (int, 1000),
+            'timeout_max': (int, 6000),
+            # pcap file of the datagrams sent and received
+            'capture': (str, ''),
         },
 
         'lanplus': {
@@ -56,11 +70,24 @@ class PyConfig:
             'priv': (int, 4),
             'kg': (str, ''),
             'no_ping': (bool, True),
+            'window': (int, 1),
+            # Retransmission timeouts in milliseconds
+            'timeout': (int, 1500),
+            'timeout_min': (int, 1000),
+            'timeout_max': (int, 6000),
+            # pcap files of the datagrams, and of the decrypted messages
+            'capture': (str, ''),
+            'capture_clear': (str, ''),
         },
 
         'kcs': {
             'bmc_addr': (int, 0x20),
             'dev_num': (int, 0),
+            'window': (int, 1),
+            # Response timeouts in milliseconds
+            'timeout': (int, 3000),
+            'timeout_min': (int, 1000),
+            'timeout_max': (int, 10000),
         },
     }
 
@@ -150,7 +177,10 @@ class PyConfig:
                 if opt not in vopts[key][0]:
                     PyConfExcept('Unknown option value: ' + opt)
             elif vopts[key][0] is bool:
-                opt = bool(opt)
+                if isinstance(opt, str):
+                    opt = opt.lower() in ('1', 'yes', 'true', 'on')
+                else:
+                    opt = bool(opt)
             elif vopts[key][0] is int: 
                 if opt[:2] == '0x' or opt[:2] == '0X':
                     opt = int(opt[2:], base=16)
@@ -208,6 +238,28 @@ to use for IPMI v2.0 RMCP+ connections.  The default value is 3.''')
 Supported types are none, md2, md5 (default), password, and oem.''')
         self.parser.add_option('-L', '--priv', dest='priv', 
                   help='Force session privilege level.  The default level is 4 (=Administrator).')
+        self.parser.add_option('-w', '--window', dest='window', 
+                  help='''Max number of requests in flight per RMCP/RMCP+ session or KCS device.  
+The default value is 1, i.e. no pipelining.  Up to 8 for lan and 16 for lanplus and kcs.''')
+        self.parser.add_option('-B', '--broker', dest='broker', 
+                  help='''Forward lan/lanplus commands to the session broker (pybroker) listening 
+on this unix socket path, so the warm sessions are reused.''')
+        self.parser.add_option('-c', '--capture', dest='capture', 
+                  help='''Write the RMCP/RMCP+ datagrams of the session to this pcap file, e.g. 
+for analysis by Wireshark.''')
+        self.parser.add_option('--capture_clear', dest='capture_clear', 
+                  help='''Write the RMCP+ messages of the session to this pcap file with the payloads 
+decrypted.''')
+        self.parser.add_option('--record', dest='record', 
+                  help='Record the requests and responses of the session to this file.')
+        self.parser.add_option('--replay', dest='replay', 
+                  help='Replay the responses recorded in this file instead of connecting to the BMC.')
+        self.parser.add_option('--replay_speed', dest='replay_speed', 
+                  help='''Replay at the recorded latencies (1, default), N times faster, or without 
+delay (0).''')
+        self.parser.add_option('--sdr_cache', dest='sdr_cache', 
+                  help='''Keep the SDR repositories in ~/.config/pyipmi/sdr across the runs, on 
+(default) or off.  Always off when recording or replaying.''')
         self.parser.add_option('-f', '--force', action='store_true', dest='force',
                   help='Force to overwrite the config file with the options given from the command line.')
 
@@ -44,6 +44,10 @@ class PyIntfExcept(PyExcept):
 class PyIntfSeqExcept(PyIntfExcept):
     pass 
 
+# The exceptions when the host has no response in time
+class PyIntfTimeoutExcept(PyIntfExcept):
+    pass 
+
 # The exceptions of reading config
 class PyConfExcept(PyExcept):
     pass
@@ -0,0 +1,92 @@
+#
+# Copyright (c) 2021, Hyve Design Solutions Corporation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are 
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright 
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright 
+#    notice, this list of conditions and the following disclaimer in the 
+#    documentation and/or other materials provided with the distribution.
+#
+# 3. Neither the name of Hyve Design Solutions Corporation nor the names 
+#    of its contributors may be used to endorse or promote products 
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY HYVE DESIGN SOLUTIONS CORPORATION AND 
+# CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, 
+# BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND 
+# FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL 
+# HYVE DESIGN SOLUTIONS CORPORATION OR CONTRIBUTORS BE LIABLE FOR ANY 
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL 
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS 
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) 
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, 
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING 
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+#
+import sys, os, pytest
+from os.path import dirname, join
+
+mylib = join(dirname(__file__), '../src')
+if not mylib in sys.path:
+    sys.path.insert(0, mylib)
+
+from pyipmi.sim import BMCSim
+from pyipmi.cmds import PyCmds, StrEx
+from pyipmi.util.config import PyOpts
+
+# Sim-backed regression tests.  Each test runs against the BMC simulators on
+# the ephemeral ports of localhost.
+
+LANPLUS_OPTS = {'user': 'admin', 'password': 'admin123', 'cipher_suite': 3}
+LAN_OPTS = {'user': 'root', 'password': 'root123', 'auth': 'md5'}
+
+@pytest.fixture(autouse=True)
+def home(tmp_path, monkeypatch):
+    # Keep the SDR cache of the tests out of the real home
+    monkeypatch.setenv('HOME', str(tmp_path))
+    return tmp_path
+
+@pytest.fixture
+def make_sim():
+    # make_sim(**opts) returns a started simulator, stopped at the teardown
+    sims = []
+    def _make_sim(**opts):
+        opts.setdefault('port', 0)
+        sim = BMCSim(opts)
+        sim.start()
+        sims.append(sim)
+        return sim
+
+    yield _make_sim
+    for sim in sims:
+        sim.close()
+
+@pytest.fixture
+def sim(make_sim):
+    return make_sim()
+
+def new_cmds(sim, xopts='', print_file=None):
+    # PyCmds of lanplus to the simulator by the command line options
+    os.makedirs(os.path.join(os.getenv('HOME'), '.config'), exist_ok=True)
+    pyopts = PyOpts()
+    pyopts.add_options()
+    opts = pyopts.parse_options('-H 127.0.0.1 -p {0} -I lanplus -U admin -P admin123 -C 3 {1}'
+                                .format(sim.port, xopts))
+    return PyCmds(opts, StrEx() if print_file is None else print_file)
+
+def run_cmd(sim, cmd, xopts=''):
+    # Run cmd and return its output
+    out = StrEx()
+    cmds = new_cmds(sim, xopts, out)
+    try:
+        cmds.exec_command(cmd)
+    finally:
+        cmds.intf.close()
+    return out.get_str()
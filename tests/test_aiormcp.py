@@ -0,0 +1,78 @@
+#
+# Copyright (c) 2021, Hyve Design Solutions Corporation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are 
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright 
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright 
+#    notice, this list of conditions and the following disclaimer in the 
+#    documentation and/or other materials provided with the distribution.
+#
+# 3. Neither the name of Hyve Design Solutions Corporation nor the names 
+#    of its contributors may be used to endorse or promote products 
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY HYVE DESIGN SOLUTIONS CORPORATION AND 
+# CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, 
+# BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND 
+# FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL 
+# HYVE DESIGN SOLUTIONS CORPORATION OR CONTRIBUTORS BE LIABLE FOR ANY 
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL 
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS 
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) 
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, 
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING 
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+#
+import asyncio, pytest
+from conftest import LANPLUS_OPTS, LAN_OPTS
+from pyipmi.intf.aiormcp import AsyncRMCP, AsyncRMCPP
+from pyipmi.mesg.ipmi_app import GetDeviceID
+from pyipmi.mesg.ipmi_se import GetSensorReading
+
+def _open_and_issue(intf_cls, sim, opts):
+    async def run():
+        intf = intf_cls({'host': '127.0.0.1', 'port': sim.port})
+        await intf.open(dict(opts, window=8))
+        try:
+            dev = await intf.issue_cmd(GetDeviceID)
+            readings = await asyncio.gather(*[intf.issue_cmd(GetSensorReading, n) 
+                                              for n in range(1, 9)])
+            bridged = await intf.issue_bridging_cmd(6, 0x2c, [6, 1])
+        finally:
+            await intf.close()
+        return dev, readings, bridged
+
+    return asyncio.run(run())
+
+@pytest.mark.parametrize('intf_cls, opts', [(AsyncRMCP, LAN_OPTS), 
+                                            (AsyncRMCPP, LANPLUS_OPTS)])
+def test_async_open_issue(sim, intf_cls, opts):
+    dev, readings, bridged = _open_and_issue(intf_cls, sim, opts)
+    assert len(dev) >= 8
+    assert len(readings) == 8
+    assert bridged[0] == 0      # completion code
+
+def test_async_stats(sim):
+    async def run():
+        intf = AsyncRMCPP({'host': '127.0.0.1', 'port': sim.port})
+        await intf.open(dict(LANPLUS_OPTS, window=8))
+        intf.enable_stats()
+        try:
+            await asyncio.gather(*[intf.issue_cmd(GetSensorReading, n) for n in range(1, 9)])
+            await intf.issue_cmd(GetDeviceID)
+            await intf.issue_bridging_cmd(6, 0x2c, [6, 1])
+        finally:
+            await intf.close()
+        return intf.get_stats()
+
+    stats = asyncio.run(run())
+    assert stats[(4, 0x2d)]['count'] == 8
+    assert stats[(4, 0x2d)]['ccs'] == {0: 8}
+    assert stats[(6, 1)]['count'] == 2
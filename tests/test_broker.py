@@ -0,0 +1,100 @@
+#
+# Copyright (c) 2021, Hyve Design Solutions Corporation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are 
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright 
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright 
+#    notice, this list of conditions and the following disclaimer in the 
+#    documentation and/or other materials provided with the distribution.
+#
+# 3. Neither the name of Hyve Design Solutions Corporation nor the names 
+#    of its contributors may be used to endorse or promote products 
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY HYVE DESIGN SOLUTIONS CORPORATION AND 
+# CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, 
+# BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND 
+# FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL 
+# HYVE DESIGN SOLUTIONS CORPORATION OR CONTRIBUTORS BE LIABLE FOR ANY 
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL 
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS 
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) 
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, 
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING 
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+#
+import os, stat, threading, pytest
+from conftest import LANPLUS_OPTS
+from pyipmi.intf.broker import BrokerServer, BrokerClient, SESS_MAX_TIMEOUTS
+from pyipmi.intf._rtt import RTT_Estimator
+from pyipmi.mesg.ipmi_app import GetDeviceID
+from pyipmi.util.exception import PyIntfTimeoutExcept
+
+@pytest.fixture
+def broker(tmp_path):
+    server = BrokerServer(str(tmp_path / 'broker.sock'))
+    th = threading.Thread(target=server.serve_forever)
+    th.daemon = True
+    th.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def _client(broker, sim):
+    intf = BrokerClient({'broker': broker.path, 'interface': 'lanplus', 
+                         'host': '127.0.0.1', 'port': sim.port})
+    assert intf.connect()
+    intf.open(LANPLUS_OPTS)
+    return intf
+
+def test_broker_socket_mode(broker):
+    assert stat.S_IMODE(os.stat(broker.path).st_mode) == 0o600
+
+def test_broker_recovery_after_timeout(broker, sim):
+    intf = _client(broker, sim)
+    try:
+        assert len(intf.issue_cmd(GetDeviceID)) >= 8
+        sess = list(broker.sessions.values())[0]
+
+        # Short timeouts, as the requests below to the lossy BMC time out
+        sess.intf.rtt = RTT_Estimator(100, 100, 400)
+
+        # A single timeout keeps the session and the binding
+        sim.loss = 100
+        with pytest.raises(PyIntfTimeoutExcept):
+            intf.issue_cmd(GetDeviceID)
+        sim.loss = 0
+        assert len(intf.issue_cmd(GetDeviceID)) >= 8
+        assert list(broker.sessions.values()) == [sess]
+
+        # Timeouts in a row drop the session, and the next request opens a new one
+        sim.loss = 100
+        for _ in range(SESS_MAX_TIMEOUTS):
+            with pytest.raises(PyIntfTimeoutExcept):
+                intf.issue_cmd(GetDeviceID)
+        sim.loss = 0
+        assert not broker.sessions
+        assert len(intf.issue_cmd(GetDeviceID)) >= 8
+        assert list(broker.sessions.values()) != [sess]
+    finally:
+        intf.close()
+
+def test_broker_client_stats(broker, sim):
+    intf = _client(broker, sim)
+    intf.enable_stats()
+    try:
+        for _ in range(3):  intf.issue_cmd(GetDeviceID)
+        intf.issue_bridging_cmd(6, 0x2c, [6, 1])
+    finally:
+        intf.close()
+
+    stats = intf.get_stats()
+    assert stats[(6, 1)]['count'] == 4
+    assert stats[(6, 1)]['ccs'] == {0: 4}
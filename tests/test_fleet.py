@@ -0,0 +1,128 @@
+#
+# Copyright (c) 2021, Hyve Design Solutions Corporation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are 
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright 
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright 
+#    notice, this list of conditions and the following disclaimer in the 
+#    documentation and/or other materials provided with the distribution.
+#
+# 3. Neither the name of Hyve Design Solutions Corporation nor the names 
+#    of its contributors may be used to endorse or promote products 
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY HYVE DESIGN SOLUTIONS CORPORATION AND 
+# CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, 
+# BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND 
+# FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL 
+# HYVE DESIGN SOLUTIONS CORPORATION OR CONTRIBUTORS BE LIABLE FOR ANY 
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL 
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS 
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) 
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, 
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING 
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+#
+import asyncio
+from conftest import LANPLUS_OPTS
+from pyipmi.fleet import Fleet
+from pyipmi.fleet.load import LoadGen, _Stats
+from pyipmi.intf._stats import HIST_BUCKETS, hist_percentile
+from pyipmi.intf.aiormcp import AsyncRMCPP
+from pyipmi.mesg.ipmi_app import GetDeviceID
+from pyipmi.mesg.ipmi_se import GetSensorReading
+
+class _BrokenRMCPP(AsyncRMCPP):
+    # Fail to open with an exception other than PyExcept
+    async def open(self, opts):
+        raise OSError('broken')
+
+class _FlakyRMCPP(AsyncRMCPP):
+    # Fail to open until the BMC is back
+    down = True
+
+    async def open(self, opts):
+        if _FlakyRMCPP.down:  raise OSError('down')
+        await super(_FlakyRMCPP, self).open(opts)
+
+def _run(fleet):
+    async def run():
+        return [x async for x in fleet.stream()]
+    return asyncio.run(asyncio.wait_for(run(), 20))
+
+def test_fleet_hosts_on_one_ip(make_sim):
+    sims = [make_sim() for _ in range(3)]
+    fleet = Fleet(dict(LANPLUS_OPTS, window=4))
+    keys = [fleet.add_host('127.0.0.1', s.port) for s in sims]
+    assert len(fleet.hosts) == 3
+
+    fleet.submit_all(GetDeviceID)
+    for n in range(1, 5):  fleet.submit_all(GetSensorReading, n)
+    res = _run(fleet)
+
+    assert len(res) == 15
+    assert not [r for r in res if isinstance(r[2], Exception)]
+    assert sorted(set(r[0] for r in res)) == sorted(keys)
+
+def test_fleet_open_failure(sim):
+    fleet = Fleet(LANPLUS_OPTS)
+    fleet.intf_cls = _BrokenRMCPP
+    key = fleet.add_host('127.0.0.1', sim.port)
+    for n in range(1, 5):  fleet.submit(key, GetSensorReading, n)
+    res = _run(fleet)
+
+    assert len(res) == 4
+    assert all(isinstance(r[2], OSError) for r in res)
+
+def test_fleet_host_recovers(sim, monkeypatch):
+    fleet = Fleet(LANPLUS_OPTS)
+    fleet.intf_cls = _FlakyRMCPP
+    key = fleet.add_host('127.0.0.1', sim.port)
+    fleet.submit(key, GetDeviceID)
+    res = _run(fleet)
+    assert isinstance(res[0][2], OSError)
+
+    monkeypatch.setattr(_FlakyRMCPP, 'down', False)
+    fleet.submit(key, GetDeviceID)
+    res = _run(fleet)
+    assert not isinstance(res[0][2], Exception)
+
+def test_load_open_failure(sim):
+    gen = LoadGen([('127.0.0.1', sim.port)], LANPLUS_OPTS, duration=0.1)
+    gen.intf_cls = _BrokenRMCPP
+    assert asyncio.run(gen.run()) is None
+    assert len(gen.failed) == 1
+    assert isinstance(gen.failed[0][2], OSError)
+
+def test_load_stats_bounded():
+    st = _Stats()
+    for n in range(1, 100001):  st.add_latency(n / 1000000)   # 1 us to 100 ms
+    summary = st.summary(1)
+
+    # The counts only, not the samples
+    assert st.done == 100000 and sum(st.hist) == 100000
+    assert len(st.hist) == HIST_BUCKETS
+    # Within the bucket of 2x of the exact ones
+    for p, exact in ((50, 50), (90, 90), (99, 99)):
+        assert exact / 2 <= summary['p{0}'.format(p)] <= exact * 2
+    assert summary['max'] == 100
+
+def test_hist_percentile():
+    assert hist_percentile([0] * 32, 50) == 0
+    hist = [0] * 32
+    hist[10] = 4        # [512, 1024) us
+    assert hist_percentile(hist, 100) == 1024 / 1000000
+    assert 512 / 1000000 < hist_percentile(hist, 50) < 1024 / 1000000
+
+def test_load_run(sim):
+    gen = LoadGen([('127.0.0.1', sim.port)], dict(LANPLUS_OPTS, window=4), duration=0.5)
+    summary = asyncio.run(gen.run())
+    assert summary['done'] > 0 and not summary['errors'] and not summary['timeouts']
+    assert summary['p50'] <= summary['p90'] <= summary['p99'] <= summary['max']
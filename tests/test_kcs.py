@@ -0,0 +1,231 @@
+#
+# Copyright (c) 2021, Hyve Design Solutions Corporation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are 
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright 
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright 
+#    notice, this list of conditions and the following disclaimer in the 
+#    documentation and/or other materials provided with the distribution.
+#
+# 3. Neither the name of Hyve Design Solutions Corporation nor the names 
+#    of its contributors may be used to endorse or promote products 
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY HYVE DESIGN SOLUTIONS CORPORATION AND 
+# CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, 
+# BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND 
+# FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL 
+# HYVE DESIGN SOLUTIONS CORPORATION OR CONTRIBUTORS BE LIABLE FOR ANY 
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL 
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS 
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) 
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, 
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING 
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+#
+import asyncio, collections, ctypes, os, random, struct, threading, time, types, pytest
+from pyipmi.intf import kcs
+from pyipmi.intf.kcs import KCS
+from pyipmi.util.exception import PyIntfTimeoutExcept
+
+# The OEM NetFn echoed by the driver stub
+NETFN_ECHO = 0x30
+
+def _data_addr(msg):
+    # The address in ipmi_msg.data, not the bytes it points to
+    return ctypes.c_void_p.from_buffer(msg, kcs.ipmi_msg.data.offset).value
+
+class _Driver:
+    # Stub of the IPMI driver behind the fd and fcntl.ioctl.  A pipe signals
+    # the messages to receive.  Each request is answered with its own data,
+    # at once, after a random delay, or when the test releases it.
+    def __init__(self, monkeypatch):
+        self.rfd, self.wfd = os.pipe()
+        self.lock = threading.Lock()
+        self.msgs = collections.deque()     # (recv_type, msgid, netfn, cmd, data)
+        self.held = []
+        self.hold = False
+        self.delay = 0
+        self.sent = 0
+
+        monkeypatch.setattr(kcs, 'fcntl', types.SimpleNamespace(ioctl=self.ioctl))
+        monkeypatch.setattr(kcs, 'os', types.SimpleNamespace(open=lambda path, flags: self.rfd,
+                                                            close=os.close, O_RDWR=os.O_RDWR))
+
+    def close(self):
+        os.close(self.wfd)
+
+    def ioctl(self, fd, code, arg):
+        if code == kcs.IPMICTL_SEND_COMMAND:
+            msg = arg.msg
+            data = ctypes.string_at(_data_addr(msg), msg.data_len)
+            rsp = (kcs.IPMI_RESPONSE_RECV_TYPE, arg.msgid, msg.netfn + 1, msg.cmd, b'\0' + data)
+            with self.lock:
+                self.sent += 1
+                if self.hold:
+                    self.held.append(rsp)
+                    return
+
+            if self.delay:
+                threading.Timer(random.random() * self.delay, self.put, rsp).start()
+            else:
+                self.put(*rsp)
+
+        elif code == kcs.IPMICTL_RECEIVE_MSG_TRUNC:
+            os.read(self.rfd, 1)
+            with self.lock:
+                recv_type, msgid, netfn, cmd, data = self.msgs.popleft()
+            arg.recv_type = recv_type
+            arg.msgid = msgid
+            arg.msg.netfn = netfn
+            arg.msg.cmd = cmd
+            arg.msg.data_len = len(data)
+            ctypes.memmove(_data_addr(arg.msg), data, len(data))
+
+    def put(self, recv_type, msgid, netfn, cmd, data):
+        with self.lock:
+            self.msgs.append((recv_type, msgid, netfn, cmd, data))
+        os.write(self.wfd, b'x')
+
+    def release(self):
+        # Answer the requests held, the last one first
+        with self.lock:
+            held, self.held = self.held, []
+        for rsp in reversed(held):  self.put(*rsp)
+
+    def put_event(self, sel):
+        self.put(kcs.IPMI_ASYNC_EVENT_RECV_TYPE, 0, 0, 0, sel)
+
+@pytest.fixture
+def driver(monkeypatch):
+    drv = _Driver(monkeypatch)
+    yield drv
+    drv.close()
+
+def _open(**opts):
+    intf = KCS(opts)
+    assert intf.open() == 0
+    return intf
+
+def _echo(*data):
+    return [NETFN_ECHO, 1] + list(data)
+
+def test_kcs_buffers_reused(driver):
+    intf = _open()
+    try:
+        # A long request and response, then short ones in the same buffers
+        assert intf.issue_raw_cmd(_echo(*range(200))) == [0] + list(range(200))
+        assert intf.issue_raw_cmd(_echo(7)) == [0, 7]
+        assert intf.issue_raw_cmd(_echo()) == [0]
+    finally:
+        intf.close()
+
+def test_kcs_out_of_order(driver):
+    intf = _open(window=8)
+    driver.hold = True
+    def release():
+        # Answer each window of 8 requests in the reverse order
+        while driver.sent < 16 or driver.held:
+            if len(driver.held) == 8 or driver.sent == 16:  driver.release()
+            time.sleep(0.01)
+    th = threading.Thread(target=release)
+    th.start()
+    try:
+        rsps = intf.issue_batch([_echo(n) for n in range(16)])
+    finally:
+        th.join()
+        intf.close()
+
+    assert rsps == [[0, n] for n in range(16)]
+
+def test_kcs_late_response(driver):
+    intf = _open(timeout=50, timeout_min=50, timeout_max=100)
+    try:
+        driver.hold = True
+        with pytest.raises(PyIntfTimeoutExcept):
+            intf.issue_raw_cmd(_echo(1))
+        assert not intf.pending
+
+        # The late response of the request timed out goes to nobody
+        driver.hold = False
+        driver.release()
+        assert intf.issue_raw_cmd(_echo(2)) == [0, 2]
+        assert not intf.pending
+    finally:
+        intf.close()
+
+def test_kcs_threads(driver):
+    intf = _open()
+    driver.delay = 0.005
+    errs = []
+    def worker(n):
+        for j in range(30):
+            rsp = intf.issue_raw_cmd(_echo(n, j))
+            if rsp != [0, n, j]:  errs.append(rsp)
+
+    ths = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    try:
+        for th in ths:  th.start()
+        for th in ths:  th.join()
+    finally:
+        intf.close()
+
+    assert not errs
+    assert not intf.pending
+
+def test_kcs_asyncio(driver):
+    intf = _open()
+    driver.delay = 0.005
+    async def run():
+        loop = asyncio.get_event_loop()
+        return await asyncio.gather(*[loop.run_in_executor(None, intf.issue_raw_cmd, _echo(n)) 
+                                      for n in range(32)])
+    try:
+        rsps = asyncio.run(run())
+    finally:
+        intf.close()
+
+    assert rsps == [[0, n] for n in range(32)]
+
+def _sel(rec_id, sensor_num):
+    return struct.pack('<HBLHBBBBBBB', rec_id, 2, int(time.time()), 0x20, 4, 1, 
+                       sensor_num, 0x01, 0x59, 0xff, 0xff)
+
+def test_kcs_events(driver):
+    intf = _open()
+    try:
+        # Events between the responses, and a short one dropped
+        driver.put_event(_sel(1, 0x10))
+        assert intf.issue_raw_cmd(_echo(1)) == [0, 1]
+        driver.put_event(b'\0' * 8)
+        driver.put_event(_sel(2, 0x11))
+        events = list(intf.events(timeout=0.5))
+
+        driver.put_event(_sel(3, 0x12))
+        async def run():
+            return [x async for x in intf.async_events(timeout=0.5)]
+        events += asyncio.run(run())
+    finally:
+        intf.close()
+
+    assert [x[0][0] for x in events] == [1, 2, 3]
+    assert [x[1][5] for x in events] == ['#10h', '#11h', '#12h']
+
+def test_kcs_events_sensor_map(driver):
+    # A plain dict of sensor number => [(sensor name, ...)]
+    intf = _open()
+    try:
+        driver.put_event(_sel(1, 0x10))
+        driver.put_event(_sel(2, 0x11))
+        events = list(intf.events(timeout=0.5, sensor_map={0x10: [('CPU0_Temp', 1)]}))
+    finally:
+        intf.close()
+
+    assert [x[1][5] for x in events] == ['CPU0_Temp', '#11h']
@@ -0,0 +1,124 @@
+#
+# Copyright (c) 2021, Hyve Design Solutions Corporation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are 
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright 
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright 
+#    notice, this list of conditions and the following disclaimer in the 
+#    documentation and/or other materials provided with the distribution.
+#
+# 3. Neither the name of Hyve Design Solutions Corporation nor the names 
+#    of its contributors may be used to endorse or promote products 
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY HYVE DESIGN SOLUTIONS CORPORATION AND 
+# CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, 
+# BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND 
+# FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL 
+# HYVE DESIGN SOLUTIONS CORPORATION OR CONTRIBUTORS BE LIABLE FOR ANY 
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL 
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS 
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) 
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, 
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING 
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+#
+import os, struct, time, pytest
+from conftest import LANPLUS_OPTS
+from pyipmi.intf import _pcap
+from pyipmi.intf._pcap import Pcap_Writer
+from pyipmi.intf.rmcpp import RMCPP
+from pyipmi.mesg.ipmi_app import GetDeviceID
+from pyipmi.mesg.ipmi_se import GetSensorReading
+from pyipmi.util.exception import PyIntfExcept
+
+def _read_pcap(path):
+    # Return [(ip header, udp header, payload)] of the records
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    magic, major, minor, _, _, snaplen, linktype = struct.unpack('<LHHlLLL', data[:24])
+    assert (magic, major, minor, linktype) == (0xa1b2c3d4, 2, 4, _pcap.LINKTYPE_RAW)
+
+    pkts = []
+    pos = 24
+    while pos < len(data):
+        _, _, incl_len, orig_len = struct.unpack('<LLLL', data[pos:pos + 16])
+        pos += 16
+        assert incl_len == orig_len
+        pkt = data[pos:pos + incl_len]
+        pos += incl_len
+
+        ip = struct.unpack('!BBHHHBBH4s4s', pkt[:20])
+        udp = struct.unpack('!HHHH', pkt[20:28])
+        assert ip[0] == 0x45 and ip[6] == 17 and ip[2] == len(pkt) and udp[2] == len(pkt) - 20
+        # The IPv4 header checksum verifies to 0
+        csum = sum(struct.unpack('!10H', pkt[:20]))
+        csum = (csum & 0xffff) + (csum >> 16)
+        assert (csum & 0xffff) + (csum >> 16) == 0xffff
+        pkts.append((ip, udp, pkt[28:]))
+
+    return pkts
+
+def test_capture_lanplus(sim, tmp_path):
+    cap, cap_clear = str(tmp_path / 'cap.pcap'), str(tmp_path / 'clear.pcap')
+    intf = RMCPP({'host': '127.0.0.1', 'port': sim.port}, False)
+    intf.open(dict(LANPLUS_OPTS, capture=cap, capture_clear=cap_clear))
+    try:
+        intf.issue_cmd(GetDeviceID)
+        for n in range(1, 4):  intf.issue_cmd(GetSensorReading, n)
+    finally:
+        intf.close()
+
+    # All the datagrams of the session, RMCP of the ports of both ends.  The
+    # messages of the active session are encrypted and authenticated.
+    pkts = _read_pcap(cap)
+    assert all(x[2][0] == 6 for x in pkts)
+    assert all(sim.port in x[1][:2] for x in pkts)
+    pkts = [x for x in pkts if x[2][3] == 7]    # not the ASF ping
+    assert [x[2][5] for x in pkts[-10:]] == [0xc0] * 10
+
+    # The same messages decrypted, unprotected
+    clear = _read_pcap(cap_clear)
+    assert len(clear) == len(pkts)
+    msgs = []
+    for ip, udp, payload in clear:
+        assert payload[4] == 6      # RMCP+
+        msg = payload[16:]
+        if payload[5] == 0:
+            msgs.append((udp[1] == sim.port, msg[1] >> 2, msg[5]))
+        else:
+            msgs.append((udp[1] == sim.port, payload[5]))
+
+    req, rsp = True, False
+    assert msgs == [(req, 6, 0x38), (rsp, 7, 0x38),     # Get Channel Auth Caps
+                    (req, 16), (rsp, 17), (req, 18), (rsp, 19), (req, 20), (rsp, 21),
+                    (req, 6, 0x3b), (rsp, 7, 0x3b),     # Set Session Privilege
+                    (req, 6, 1), (rsp, 7, 1)] + \
+                   [(req, 4, 0x2d), (rsp, 5, 0x2d)] * 3 + \
+                   [(req, 6, 0x3c), (rsp, 7, 0x3c)]     # Close Session
+
+def test_capture_idle_flush(tmp_path, monkeypatch):
+    monkeypatch.setattr(_pcap, 'FLUSH_INTERVAL', 0.1)
+    path = str(tmp_path / 'idle.pcap')
+    cap = Pcap_Writer(path, ('127.0.0.1', 10000), ('127.0.0.1', 623))
+    try:
+        cap.write(b'\x06\x00\xff\x07', True)
+        time.sleep(0.5)
+        # Flushed with nothing written after
+        assert os.path.getsize(path) == 24 + 16 + 28 + 4
+    finally:
+        cap.close()
+
+def test_capture_ipv6(tmp_path):
+    path = str(tmp_path / 'v6.pcap')
+    with pytest.raises(PyIntfExcept):
+        Pcap_Writer(path, ('::1', 10000, 0, 0), ('::1', 623, 0, 0))
+    assert not os.path.exists(path)
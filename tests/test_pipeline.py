@@ -0,0 +1,68 @@
+#
+# Copyright (c) 2021, Hyve Design Solutions Corporation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are 
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright 
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright 
+#    notice, this list of conditions and the following disclaimer in the 
+#    documentation and/or other materials provided with the distribution.
+#
+# 3. Neither the name of Hyve Design Solutions Corporation nor the names 
+#    of its contributors may be used to endorse or promote products 
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY HYVE DESIGN SOLUTIONS CORPORATION AND 
+# CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, 
+# BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND 
+# FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL 
+# HYVE DESIGN SOLUTIONS CORPORATION OR CONTRIBUTORS BE LIABLE FOR ANY 
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL 
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS 
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) 
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, 
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING 
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+#
+import pytest
+from conftest import LANPLUS_OPTS, LAN_OPTS
+from pyipmi.intf.rmcp import RMCP
+from pyipmi.intf.rmcpp import RMCPP
+from pyipmi.mesg.ipmi_app import GetDeviceID
+from pyipmi.mesg.ipmi_se import GetSensorReading, GetSensorThres
+from pyipmi.util.exception import PyIntfTimeoutExcept
+
+REQS = [(GetDeviceID, ())] + [(GetSensorReading, (n,)) for n in range(1, 41)] + \
+       [(GetSensorThres, (n,)) for n in range(1, 41)]
+
+@pytest.mark.parametrize('intf_cls, opts', [(RMCP, LAN_OPTS), (RMCPP, LANPLUS_OPTS)])
+def test_batch_impaired(make_sim, intf_cls, opts):
+    sim = make_sim(seed=1)
+    intf = intf_cls({'host': '127.0.0.1', 'port': sim.port}, False)
+    intf.open(dict(opts, window=16, timeout=200, timeout_min=50))
+    try:
+        expected = intf.issue_batch(REQS)
+
+        # Impair the network only after the session is activated
+        sim.loss, sim.dup, sim.reorder = 3, 10, 20
+        rsps = intf.issue_batch(REQS)
+    finally:
+        intf.close()
+
+    assert sim.stats['dropped'] and sim.stats['duplicated'] and sim.stats['reordered']
+
+    # Every response goes to its own request.  A request may time out after 
+    # all its retransmissions are lost, but only a few.
+    timeouts = 0
+    for rsp, exp in zip(rsps, expected):
+        if isinstance(rsp, PyIntfTimeoutExcept):
+            timeouts += 1
+        else:
+            assert rsp == exp
+    assert timeouts <= 2
@@ -0,0 +1,128 @@
+#
+# Copyright (c) 2021, Hyve Design Solutions Corporation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are 
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright 
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright 
+#    notice, this list of conditions and the following disclaimer in the 
+#    documentation and/or other materials provided with the distribution.
+#
+# 3. Neither the name of Hyve Design Solutions Corporation nor the names 
+#    of its contributors may be used to endorse or promote products 
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY HYVE DESIGN SOLUTIONS CORPORATION AND 
+# CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, 
+# BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND 
+# FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL 
+# HYVE DESIGN SOLUTIONS CORPORATION OR CONTRIBUTORS BE LIABLE FOR ANY 
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL 
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS 
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) 
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, 
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING 
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+#
+import pytest
+from conftest import LANPLUS_OPTS, run_cmd
+from pyipmi.intf.rmcpp import RMCPP
+from pyipmi.intf.replay import Record_Intf, Replay_Intf
+from pyipmi.mesg.ipmi_app import GetDeviceID
+from pyipmi.mesg.ipmi_se import GetSensorReading
+from pyipmi.util.exception import PyExcept, PyIntfExcept, PyMesgCCExcept
+
+def _record(sim, path, cmds):
+    # Issue cmds, a list of (cmd_cls, args), and return the responses
+    intf = RMCPP({'host': '127.0.0.1', 'port': sim.port}, False)
+    intf.open(LANPLUS_OPTS)
+    rec = Record_Intf(intf, path)
+    try:
+        return [rec.issue_cmd(cmd_cls, *args) for cmd_cls, args in cmds]
+    finally:
+        rec.close()
+
+def test_replay_stats(sim, tmp_path):
+    path = str(tmp_path / 'r.rec')
+    _record(sim, path, [(GetDeviceID, ())] + [(GetSensorReading, (n,)) for n in range(1, 4)])
+
+    intf = Replay_Intf(path, 0)
+    intf.enable_stats()
+    intf.issue_cmd(GetDeviceID)
+    for n in range(1, 4):  intf.issue_cmd(GetSensorReading, n)
+
+    stats = intf.get_stats()
+    assert stats[(6, 1)]['count'] == 1
+    assert stats[(4, 0x2d)]['ccs'] == {0: 3}
+
+@pytest.mark.parametrize('name', ['r.rec', 'r.rec.gz'])
+def test_record_replay(sim, tmp_path, name):
+    path = str(tmp_path / name)
+    intf = RMCPP({'host': '127.0.0.1', 'port': sim.port}, False)
+    intf.open(dict(LANPLUS_OPTS, window=8))
+    rec = Record_Intf(intf, path)
+    try:
+        expected = [rec.issue_cmd(GetDeviceID), rec.issue_raw_cmd([6, 1]),
+                    rec.issue_bridging_cmd(6, 0x2c, [6, 1]),
+                    rec.issue_batch([(GetSensorReading, (n,)) for n in range(1, 9)])]
+        with pytest.raises(PyExcept):
+            rec.issue_cmd(GetSensorReading, 0xfe)     # no such sensor
+    finally:
+        rec.close()
+
+    intf = Replay_Intf(path, 0)
+    assert [intf.issue_cmd(GetDeviceID), intf.issue_raw_cmd([6, 1]),
+            intf.issue_bridging_cmd(6, 0x2c, [6, 1]),
+            intf.issue_batch([(GetSensorReading, (n,)) for n in range(1, 9)])] == expected
+    with pytest.raises(PyExcept):
+        intf.issue_cmd(GetSensorReading, 0xfe)
+
+@pytest.mark.parametrize('cmd', ['mc info', 'sdr elist', 'sensor list', 'fru print', 
+                                 'sel list', 'chassis status', 'lan print 1'])
+def test_record_replay_cmds(sim, tmp_path, cmd):
+    path = str(tmp_path / 'cmd.rec')
+    out = run_cmd(sim, cmd, '--record ' + path)
+    assert out
+    sim.close()     # nothing but the file answers the replay
+    assert run_cmd(sim, cmd, '--replay {0} --replay_speed 0'.format(path)) == out
+
+class _FailingIntf:
+    # Raise the exceptions given instead of issuing the requests
+    def __init__(self, excs):
+        self.excs = list(excs)
+
+    def issue_raw_cmd(self, req, lun=0):
+        raise self.excs.pop(0)
+
+    def close(self):
+        pass
+
+def test_record_except_args(tmp_path):
+    path = str(tmp_path / 'e.rec')
+    e1 = PyIntfExcept(b'\x01\x02', {'state': object()})     # not JSON
+    e2 = PyMesgCCExcept(6, 1, 0xc1)
+    rec = Record_Intf(_FailingIntf([e1, e2]), path)
+    try:
+        # The original exceptions reach the caller, and both are recorded
+        with pytest.raises(PyIntfExcept) as e:
+            rec.issue_raw_cmd([6, 1])
+        assert e.value is e1
+        with pytest.raises(PyMesgCCExcept) as e:
+            rec.issue_raw_cmd([6, 1, 0])
+        assert e.value is e2
+    finally:
+        rec.close()
+
+    intf = Replay_Intf(path, 0)
+    with pytest.raises(PyIntfExcept) as e:
+        intf.issue_raw_cmd([6, 1])
+    assert str(e1) in str(e.value)
+    with pytest.raises(PyMesgCCExcept) as e:
+        intf.issue_raw_cmd([6, 1, 0])
+    assert e.value.cc == 0xc1
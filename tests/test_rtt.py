@@ -0,0 +1,76 @@
+#
+# Copyright (c) 2021, Hyve Design Solutions Corporation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are 
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright 
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright 
+#    notice, this list of conditions and the following disclaimer in the 
+#    documentation and/or other materials provided with the distribution.
+#
+# 3. Neither the name of Hyve Design Solutions Corporation nor the names 
+#    of its contributors may be used to endorse or promote products 
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY HYVE DESIGN SOLUTIONS CORPORATION AND 
+# CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, 
+# BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND 
+# FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL 
+# HYVE DESIGN SOLUTIONS CORPORATION OR CONTRIBUTORS BE LIABLE FOR ANY 
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL 
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS 
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) 
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, 
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING 
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+#
+import asyncio
+from conftest import LANPLUS_OPTS
+from pyipmi.intf._rtt import RTT_Estimator
+from pyipmi.intf.rmcpp import RMCPP
+from pyipmi.intf.aiormcp import AsyncRMCPP
+from pyipmi.mesg.ipmi_app import GetDeviceID
+from pyipmi.mesg.ipmi_se import GetSensorReading
+
+SLOW_DELAY = 1200   # ms, above the RTO learned from the fast replies
+
+def test_rtt_floor():
+    rtt = RTT_Estimator()
+    for _ in range(50):  rtt.update(0.001)
+    assert rtt.timeout() == 1.0
+    assert rtt.timeout(1) + rtt.timeout(2) > 4.5
+
+def test_slow_reply(sim):
+    intf = RMCPP({'host': '127.0.0.1', 'port': sim.port}, False)
+    intf.open(dict(LANPLUS_OPTS, window=4))
+    try:
+        for n in range(1, 21):  intf.issue_cmd(GetSensorReading, n)
+
+        sim.delay = SLOW_DELAY
+        assert len(intf.issue_cmd(GetDeviceID)) >= 8
+        rsps = intf.issue_batch([(GetSensorReading, (n,)) for n in range(1, 5)])
+        assert not [x for x in rsps if isinstance(x, Exception)]
+    finally:
+        sim.delay = 0
+        intf.close()
+
+def test_async_slow_reply(sim):
+    async def run():
+        intf = AsyncRMCPP({'host': '127.0.0.1', 'port': sim.port})
+        await intf.open(dict(LANPLUS_OPTS, window=4))
+        try:
+            for n in range(1, 21):  await intf.issue_cmd(GetSensorReading, n)
+
+            sim.delay = SLOW_DELAY
+            return await intf.issue_cmd(GetDeviceID)
+        finally:
+            sim.delay = 0
+            await intf.close()
+
+    assert len(asyncio.run(run())) >= 8
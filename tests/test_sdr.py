@@ -0,0 +1,154 @@
+#
+# Copyright (c) 2021, Hyve Design Solutions Corporation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are 
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright 
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright 
+#    notice, this list of conditions and the following disclaimer in the 
+#    documentation and/or other materials provided with the distribution.
+#
+# 3. Neither the name of Hyve Design Solutions Corporation nor the names 
+#    of its contributors may be used to endorse or promote products 
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY HYVE DESIGN SOLUTIONS CORPORATION AND 
+# CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, 
+# BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND 
+# FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL 
+# HYVE DESIGN SOLUTIONS CORPORATION OR CONTRIBUTORS BE LIABLE FOR ANY 
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL 
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS 
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) 
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, 
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING 
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+#
+import os, struct
+from conftest import new_cmds, run_cmd
+from pyipmi.cmds._common import SensorMap, get_sdr_repository, load_sdr_repo
+from pyipmi.sim._bmc import gen_full_sdr, gen_compact_sdr
+
+def _log_sdr_cmds(sim, cancel_at=None):
+    # Log the Reserve SDR Repository and Get SDR requests to the simulator
+    # cancel_at: the record ID whose first partial read finds the reservation
+    # cancelled, as if another software reserved the repository
+    log = []
+    reserve, get_sdr = sim.bmc.handlers[(0x0a, 0x22)], sim.bmc.handlers[(0x0a, 0x23)]
+
+    def _reserve(data):
+        log.append(('reserve',))
+        return reserve(data)
+
+    def _get_sdr(data):
+        _, rec_id, offset, _ = struct.unpack('<HHBB', data)
+        log.append(('get', rec_id, offset))
+        if rec_id == cancel_at and offset and ('cancel',) not in log:
+            log.append(('cancel',))
+            reserve(b'')
+        return get_sdr(data)
+
+    sim.bmc.handlers[(0x0a, 0x22)] = _reserve
+    sim.bmc.handlers[(0x0a, 0x23)] = _get_sdr
+    return log
+
+def test_sdr_cache_off(sim, home):
+    out = run_cmd(sim, 'sdr list', '--sdr_cache off')
+    assert out
+    assert not os.path.exists(os.path.join(str(home), '.config', 'pyipmi', 'sdr'))
+
+def test_record_bypasses_sdr_cache(sim, tmp_path):
+    # Warm the cache, so only the replay would walk the repository
+    out = run_cmd(sim, 'sdr list')
+    path = str(tmp_path / 'sdr.rec')
+    assert run_cmd(sim, 'sdr list', '--record ' + path) == out
+    assert run_cmd(sim, 'sdr list', '--replay {0} --replay_speed 0'.format(path)) == out
+
+def test_sdr_model_without_device_id(make_sim):
+    # Another BMC of the same model is known, but GetDeviceID fails
+    sim1 = make_sim()
+    out = run_cmd(sim1, 'sdr list')
+    sim2 = make_sim()
+    del sim2.bmc.handlers[(6, 1)]
+    assert run_cmd(sim2, 'sdr list') == out
+
+def test_sdr_short_read(make_sim):
+    # The BMC takes no more than 24 bytes a read, so the records are read in parts
+    out = run_cmd(make_sim(), 'sdr elist', '--sdr_cache off')
+    sim = make_sim(sdr_max_read=24)
+    assert run_cmd(sim, 'sdr elist', '--sdr_cache off') == out
+    assert run_cmd(sim, 'sensor list', '--sdr_cache off') == \
+           run_cmd(make_sim(), 'sensor list', '--sdr_cache off')
+
+def test_sdr_resv_cancelled(make_sim):
+    out = run_cmd(make_sim(), 'sdr elist', '--sdr_cache off')
+    sim = make_sim(sdr_max_read=24)
+    rec_id, = struct.unpack('<H', sim.bmc.sdrs[5][:2])
+    log = _log_sdr_cmds(sim, rec_id)
+    assert run_cmd(sim, 'sdr elist', '--sdr_cache off') == out
+
+    # Reserved again once, and resumed at the record cancelled
+    resvs = [i for i, x in enumerate(log) if x == ('reserve',)]
+    assert len(resvs) == 2 and log.index(('cancel',)) < resvs[1]
+    assert log[resvs[1] + 1] == ('get', rec_id, 0)
+    assert not [x for x in log[resvs[1]:] if x[0] == 'get' and x[1] < rec_id]
+
+def test_sdr_incremental_refresh(make_sim):
+    sim = make_sim(sdr_max_read=24)
+    run_cmd(sim, 'sdr elist')
+
+    # Rename a sensor, so its length changes, and add another one
+    bmc = sim.bmc
+    bmc.sdrs[3] = gen_full_sdr(4, 4, 'FAN_RENAMED', 4, 18, 100, 0, (3, 5, 7, 200, 210, 220))
+    new_id = len(bmc.sdrs) + 1
+    bmc.sdrs.append(gen_compact_sdr(new_id, 0x60, 'NEW_Status', 8, 0x6f))
+    bmc.readings[0x60] = 1
+    bmc.sdr_add_ts += 1
+
+    log = _log_sdr_cmds(sim)
+    out = run_cmd(sim, 'sdr elist')
+    # Only the bodies of the records changed or added are read
+    assert {x[1] for x in log if x[0] == 'get' and x[2] > 0} == {4, new_id}
+    assert len([x for x in log if x[0] == 'get' and x[2] == 0]) == len(bmc.sdrs)
+
+    assert 'FAN_RENAMED' in out and 'NEW_Status' in out
+    assert out == run_cmd(sim, 'sdr elist', '--sdr_cache off')
+
+def test_sdr_hosts_differ_in_body(make_sim):
+    # Two BMCs of the same model, whose records differ only in one name
+    sim1, sim2 = make_sim(sdr_max_read=24), make_sim(sdr_max_read=24)
+    rec = gen_full_sdr(1, 1, 'Temp_CPX0', 1, 1, 1, 0, (0, 5, 10, 85, 90, 95))
+    assert rec[:5] == sim2.bmc.sdrs[0][:5] and rec != sim2.bmc.sdrs[0]
+    sim2.bmc.sdrs[0] = rec
+
+    assert 'Temp_CPU0' in run_cmd(sim1, 'sdr list')
+    out = run_cmd(sim2, 'sdr list')
+    assert 'Temp_CPX0' in out and 'Temp_CPU0' not in out
+
+def test_sdr_table_shared(make_sim):
+    # The BMCs of the same records share one decoded table
+    sims = [make_sim() for _ in range(3)]
+    sims[2].bmc.sdrs[0] = gen_full_sdr(1, 1, 'Temp_CPX0', 1, 1, 1, 0, (0, 5, 10, 85, 90, 95))
+
+    cmds = [new_cmds(sim) for sim in sims]
+    try:
+        for x in cmds:  load_sdr_repo(x)
+        tables = [get_sdr_repository(x).table for x in cmds]
+        assert tables[0] is tables[1] and tables[0] is not tables[2]
+    finally:
+        for x in cmds:  x.intf.close()
+
+def test_sel_elist_names(sim, monkeypatch):
+    # The names are looked up per entry, without counting all the sensors
+    def no_len(self):
+        raise AssertionError('len() of the sensor map')
+    monkeypatch.setattr(SensorMap, '__len__', no_len)
+
+    out = run_cmd(sim, 'sel elist')
+    assert 'Temp_CPU0' in out